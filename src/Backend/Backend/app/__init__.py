@@ -1,4 +1,5 @@
 import os
+import click
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
@@ -60,6 +61,11 @@ def create_app():
     def health():
         return {"status": "ok"}, 200
 
+    @app.get("/api/health/db")
+    def health_db():
+        from .database import pool_stats
+        return {"status": "ok", "pool": pool_stats()}, 200
+
     @app.get("/")
     def index():
         return {
@@ -68,6 +74,73 @@ def create_app():
             "health": "/api/health",
         }, 200
 
+    # ---- CLI maintenance commands ----
+    @app.cli.command("rebuild-completion-summary")
+    def rebuild_completion_summary():
+        """Create (first run), backfill and repair dbo.FormCompletionSummary from all submissions."""
+        from .services.completion_summary import rebuild
+        rows = rebuild()
+        print(f"[OK] Completion summary rebuilt ({rows} rows merged)")
+
+    @app.cli.command("send-reminders")
+    def send_reminders():
+        """Queue and send reminders for appointments starting within REMINDER_LEAD_HOURS (one tick)."""
+        from .services.delivery_service import drain_until_empty
+        from .services.reminder_service import REMINDER_DRAIN_SECS, run_tick
+        count = run_tick()
+        sent = drain_until_empty(REMINDER_DRAIN_SECS)
+        print(f"[OK] Reminders queued for {count} appointment(s), {sent} outbox job(s) processed")
+
+    @app.cli.command("compact-uploads")
+    def compact_uploads():
+        """Move uploads still stored in dbo.Uploads.DataJson into compressed chunks."""
+        from .services.upload_store import compact_legacy
+        count = compact_legacy()
+        print(f"[OK] {count} upload(s) moved to chunk storage")
+
+    @app.cli.command("migrate-form-status")
+    def migrate_form_status():
+        """Add the form_status rowversion + change-tracking indexes (locks form_status; run off-peak)."""
+        from .services.form_status_version import migrate
+        column = migrate()
+        print(f"[OK] dbo.form_status.{column} ready for incremental exports and the analytics rollup")
+
+    @app.cli.command("migrate-appointments")
+    def migrate_appointments():
+        """Add the dbo.Appointments key columns, slot + lookup indexes (locks Appointments; run off-peak)."""
+        from .services.appointment_service import migrate
+        schema = migrate()
+        slot = "unique" if schema.slot_unique else "non-unique (duplicate slots in existing data)"
+        print(f"[OK] dbo.Appointments migrated; slot index {slot}")
+
+    @app.cli.command("refresh-analytics-rollup")
+    @click.option("--full", is_flag=True, help="Recompute every day instead of recent / changed days.")
+    def refresh_analytics_rollup(full):
+        """Bring dbo.AnalyticsDailyRollup up to yesterday."""
+        from .services.analytics_rollup import refresh
+        result = refresh(full=full)
+        print(f"[OK] Analytics rollup refreshed through {result['rolledThrough']}")
+
+    # ---- Background threads (web processes only; `flask <command>` runs build the app too) ----
+    if click.get_current_context(silent=True) is None:
+        # outbox workers: drain what a restart left pending (see services/delivery_service.py)
+        try:
+            from .services.delivery_service import start_workers
+            start_workers()
+        except Exception as e:
+            print(f"[WARN] Delivery workers not started: {e}")
+        # opt-in schedulers, see services/reminder_service.py, services/analytics_rollup.py
+        try:
+            from .services.reminder_service import start_scheduler
+            start_scheduler()
+        except Exception as e:
+            print(f"[WARN] Reminder scheduler not started: {e}")
+        try:
+            from .services.analytics_rollup import start_scheduler as start_rollup_scheduler
+            start_rollup_scheduler()
+        except Exception as e:
+            print(f"[WARN] Analytics rollup scheduler not started: {e}")
+
     # ---- Debug Route Map ----
     try:
         print("\n=== ROUTE MAP ===")
@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request
 from .database import get_cursor
+from .services import appointment_service, completion_summary, pdf_cache
+from .routes.Appointment import parse_local_date, parse_time
  
 customer_bp = Blueprint("customer_bp", __name__)
  
@@ -56,6 +58,8 @@ def submit_form():
     if not (customer_id and form_id and answers):
         return jsonify({"error": "Missing required data"}), 400
  
+    # schema / first backfill on its own connection BEFORE our transaction holds row locks
+    completion_summary.prepare()
     conn, cursor = get_cursor()
     try:
         for field_id, value in answers.items():
@@ -63,7 +67,9 @@ def submit_form():
                 INSERT INTO FormResponses (customer_id, form_id, field_id, answer)
                 VALUES (?, ?, ?, ?)
             """, (customer_id, form_id, field_id, value))
+        completion_summary.refresh_pair(customer_id, form_id, cursor)
         conn.commit()
+        pdf_cache.invalidate_patient(customer_id)
         return jsonify({"message": "Form submitted successfully"})
     except Exception as e:
         print("Error submitting form:", e)
@@ -89,17 +95,18 @@ def book_appointment():
     if not all([patient_name, patient_email, phone_number, appointment_date, appointment_time, specialist]):
         return jsonify({"error": "All fields are required"}), 400
  
-    conn, cursor = get_cursor()
     try:
-        cursor.execute("""
-            INSERT INTO Appointments
-            (PatientName, PatientEmail, PhoneNumber, AppointmentDate, AppointmentTime, Specialist)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (patient_name, patient_email, phone_number, appointment_date, appointment_time, specialist))
-        conn.commit()
+        appointment_service.book_slot(
+            patient_name, patient_email, phone_number,
+            parse_local_date(str(appointment_date).strip()),
+            parse_time(str(appointment_time).strip()),
+            specialist, status=None,
+        )
         return jsonify({"message": "Appointment booked successfully!"})
+    except appointment_service.SlotTaken as taken:
+        return jsonify({"error": str(taken)}), 409
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         print("Error booking appointment:", e)
         return jsonify({"error": "Failed to book appointment"}), 500
-    finally:
-        conn.close()
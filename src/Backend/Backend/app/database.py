@@ -1,5 +1,8 @@
 from dotenv import load_dotenv
+from contextlib import contextmanager
 import os
+import threading
+import time
 import pyodbc
 
 # Load environment variables
@@ -16,12 +19,279 @@ database = (
     f"PWD={os.getenv('DB_PASSWORD')}"
 )
 
+# Pool tuning (all optional, seconds unless noted)
+POOL_SIZE         = int(os.getenv("DB_POOL_SIZE", "10"))          # max open connections per process
+POOL_WAIT_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "15"))     # how long a borrower waits for a free slot
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+POOL_PING_AFTER   = float(os.getenv("DB_POOL_PING_AFTER", "30"))  # health-check idle connections older than this
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no pooled connection becomes available within the wait timeout."""
+
+
+# --------------------------------------------------
+# Connection Pool
+# --------------------------------------------------
+class _PooledConnection:
+    """
+    Thin proxy around a pyodbc connection.
+    Behaves like the raw connection, except close() hands it back to the pool
+    instead of tearing down the TCP/TLS session.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise pyodbc.ProgrammingError("Attempt to use a connection that has been returned to the pool")
+        return getattr(raw, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw, name, value)
+
+    # pyodbc semantics: `with conn:` commits on success, rolls back on error
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._raw is None:
+            return False
+        if exc_type is None:
+            self._raw.commit()
+        else:
+            self._raw.rollback()
+        return False
+
+    @property
+    def closed(self):
+        return self._raw is None
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw, self._created_at)
+
+    def discard(self):
+        """Close the underlying connection for good (e.g. after a fatal driver error)."""
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._discard(raw)
+
+    def __del__(self):
+        # Borrower forgot to close (early return / exception) -> don't leak the slot
+        try:
+            if self.__dict__.get("_raw") is not None:
+                self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of pyodbc connections.
+    - at most `max_size` connections open at once; borrowers wait up to `wait_timeout`
+    - connections idle longer than `ping_after` are health-checked before reuse
+    - connections older than `max_lifetime` or idle longer than `idle_timeout` are evicted
+    - returned connections are rolled back so no transaction leaks to the next borrower
+    """
+
+    def __init__(self, conn_str, max_size=POOL_SIZE, wait_timeout=POOL_WAIT_TIMEOUT,
+                 max_lifetime=POOL_MAX_LIFETIME, idle_timeout=POOL_IDLE_TIMEOUT,
+                 ping_after=POOL_PING_AFTER, connect=None):
+        self.conn_str = conn_str
+        self.max_size = max(1, int(max_size))
+        self.wait_timeout = wait_timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self._connect = connect or pyodbc.connect
+
+        self._cond = threading.Condition(threading.RLock())
+        self._idle = []          # [(raw, created_at, returned_at)] - most recently returned last
+        self._open = 0           # idle + borrowed
+        self._stats = {
+            "created": 0, "reused": 0, "discarded": 0,
+            "health_failures": 0, "timeouts": 0, "waits": 0,
+        }
+
+    # ---------- borrowing ----------
+    def acquire(self, timeout=None):
+        timeout = self.wait_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        with self._cond:
+            while True:
+                self._evict_expired()
+
+                if self._idle:
+                    raw, created_at, returned_at = self._idle.pop()
+                    self._stats["reused"] += 1
+                    break
+
+                if self._open < self.max_size:
+                    self._open += 1
+                    raw = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available after {timeout:.1f}s "
+                        f"(pool size {self.max_size})"
+                    )
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+        # Network work happens outside the lock
+        if raw is None:
+            return self._new_connection()
+
+        if time.monotonic() - returned_at >= self.ping_after and not self._ping(raw):
+            # Dead socket: replace it in the same slot
+            try:
+                raw.close()
+            except Exception:
+                pass
+            with self._cond:
+                self._stats["discarded"] += 1
+                self._stats["health_failures"] += 1
+            return self._new_connection()
+
+        return _PooledConnection(self, raw, created_at)
+
+    def _new_connection(self):
+        try:
+            raw = self._connect(self.conn_str)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return _PooledConnection(self, raw, time.monotonic())
+
+    # ---------- returning ----------
+    def _release(self, raw, created_at):
+        now = time.monotonic()
+        try:
+            if raw.autocommit:
+                raw.autocommit = False
+            raw.rollback()                  # reset: drop any uncommitted work
+        except Exception:
+            self._discard(raw)
+            return
+
+        if now - created_at >= self.max_lifetime:
+            self._discard(raw)
+            return
+
+        with self._cond:
+            self._idle.append((raw, created_at, now))
+            self._cond.notify()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+
+    # ---------- maintenance ----------
+    def _ping(self, raw):
+        try:
+            cur = raw.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _evict_expired(self):
+        """Drop idle connections past max lifetime / idle timeout (caller holds the lock)."""
+        now = time.monotonic()
+        keep = []
+        for raw, created_at, returned_at in self._idle:
+            if now - created_at >= self.max_lifetime or now - returned_at >= self.idle_timeout:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+                self._open -= 1
+                self._stats["discarded"] += 1
+            else:
+                keep.append((raw, created_at, returned_at))
+        self._idle = keep
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            for raw, _, _ in idle:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+                self._open -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.max_size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                **self._stats,
+            }
+
+
+_pool = ConnectionPool(database)
+
+
+def _reset_pool_after_fork():
+    # Never share sockets with the parent process (gunicorn --preload, process pools)
+    global _pool
+    _pool = ConnectionPool(
+        database,
+        max_size=_pool.max_size,
+        wait_timeout=_pool.wait_timeout,
+        max_lifetime=_pool.max_lifetime,
+        idle_timeout=_pool.idle_timeout,
+        ping_after=_pool.ping_after,
+    )
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def pool_stats():
+    """Snapshot of the connection pool counters (for health/diagnostics)."""
+    return _pool.stats()
+
+
 # --------------------------------------------------
 # Core Connection Helper
 # --------------------------------------------------
 def get_connection():
-    """Returns a live pyodbc connection."""
-    return pyodbc.connect(database)
+    """Returns a live pyodbc connection borrowed from the pool. close() returns it."""
+    return _pool.acquire()
 
 
 def get_cursor():
@@ -29,6 +299,50 @@ def get_cursor():
     conn = get_connection()
     return conn, conn.cursor()
 
+
+@contextmanager
+def db_connection(commit=False):
+    """
+    Borrow a pooled connection for the duration of a `with` block.
+    Always returned to the pool, even on early return or exception.
+    With commit=True the block's work is committed on success and rolled back on error.
+
+        with db_connection(commit=True) as conn:
+            conn.cursor().execute("UPDATE ...")
+    """
+    conn = get_connection()
+    try:
+        yield conn
+        if commit:
+            conn.commit()
+    except BaseException:
+        try:
+            conn.rollback()
+        except Exception:
+            conn.discard()
+        raise
+    finally:
+        conn.close()
+
+
+@contextmanager
+def db_cursor(commit=False):
+    """
+    Same as db_connection() but yields the familiar (conn, cursor) pair.
+
+        with db_cursor() as (conn, cursor):
+            cursor.execute("SELECT ...")
+    """
+    with db_connection(commit=commit) as conn:
+        cursor = conn.cursor()
+        try:
+            yield conn, cursor
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
 # --------------------------------------------------
 #Universal DB helpers — required by export_service/fetch_forms
 # --------------------------------------------------
@@ -37,16 +351,11 @@ def fetch_all(sql, params=()):
     Executes a SELECT query and returns list of dicts.
     Example: rows = fetch_all("SELECT * FROM patients WHERE id=?", (5,))
     """
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
+    with db_cursor() as (conn, cur):
         cur.execute(sql, params)
         columns = [column[0] for column in cur.description]
         results = [dict(zip(columns, row)) for row in cur.fetchall()]
         return results
-    finally:
-        cur.close()
-        conn.close()
 
 
 def execute_query(sql, params=(), commit=False):
@@ -55,9 +364,7 @@ def execute_query(sql, params=(), commit=False):
     - SELECT → returns list of dicts
     - INSERT/UPDATE/DELETE → commits if commit=True
     """
-    conn = get_connection()
-    try:
-        cur = conn.cursor()
+    with db_cursor() as (conn, cur):
         cur.execute(sql, params)
 
         if commit:
@@ -70,6 +377,194 @@ def execute_query(sql, params=(), commit=False):
             return [dict(zip(columns, row)) for row in cur.fetchall()]
 
         return None
-    finally:
-        cur.close()
-        conn.close()
+
+# --------------------------------------------------
+# Bulk keys: IN lists that stay under SQL Server's 2100-parameter cap
+# --------------------------------------------------
+MAX_PARAMS = 2100
+IN_CHUNK_SIZE = int(os.getenv("DB_IN_CHUNK_SIZE", "1000"))
+
+
+def chunked(values, size=IN_CHUNK_SIZE):
+    """Yield de-duplicated keys in lists of at most `size`, preserving first-seen order."""
+    keys = list(dict.fromkeys(values or []))
+    for i in range(0, len(keys), size):
+        yield keys[i:i + size]
+
+
+def in_clause(values):
+    """('(?,?,?)', (a, b, c)); '(NULL)' for an empty list so the predicate matches nothing."""
+    vals = tuple(values or [])
+    if not vals:
+        return "(NULL)", tuple()
+    return "(" + ",".join("?" * len(vals)) + ")", vals
+
+
+def _chunk_size(sql, size, params_before, params_after):
+    # Shrink chunks when "{keys}" repeats or other parameters share the statement
+    room = MAX_PARAMS - 1 - len(tuple(params_before)) - len(tuple(params_after))
+    return max(1, min(size, room // max(1, sql.count("{keys}"))))
+
+
+def _expand(sql, chunk, params_before, params_after):
+    # Every "{keys}" in the statement gets the same chunk (e.g. a CTE and the outer WHERE)
+    frag, vals = in_clause(chunk)
+    repeat = sql.count("{keys}")
+    return sql.replace("{keys}", frag), tuple(params_before) + vals * repeat + tuple(params_after)
+
+
+def fetch_in(cur, sql, keys, params_before=(), params_after=(), size=IN_CHUNK_SIZE):
+    """
+    Run a SELECT whose IN list is written as `{keys}` once per chunk of keys and
+    return all rows as dicts (chunk order, then the statement's own ORDER BY).
+
+        rows = fetch_in(cur, "SELECT * FROM dbo.Forms WHERE form_id IN {keys}", form_ids)
+    """
+    rows = []
+    for chunk in chunked(keys, _chunk_size(sql, size, params_before, params_after)):
+        stmt, params = _expand(sql, chunk, params_before, params_after)
+        cur.execute(stmt, params)
+        cols = [c[0] for c in cur.description]
+        rows.extend(dict(zip(cols, r)) for r in cur.fetchall())
+    return rows
+
+
+def execute_in(cur, sql, keys, params_before=(), params_after=(), size=IN_CHUNK_SIZE):
+    """
+    UPDATE/DELETE counterpart of fetch_in(). All chunks run on the caller's cursor,
+    so they commit (or roll back) together. Returns the total rowcount.
+    """
+    total = 0
+    for chunk in chunked(keys, _chunk_size(sql, size, params_before, params_after)):
+        stmt, params = _expand(sql, chunk, params_before, params_after)
+        cur.execute(stmt, params)
+        total += max(cur.rowcount, 0)
+    return total
+
+
+def _int_key(k):
+    if isinstance(k, bool):
+        raise ValueError(k)
+    if isinstance(k, int):
+        return k
+    if isinstance(k, float) and k.is_integer():
+        return int(k)
+    if isinstance(k, str) and k.strip().lstrip("-").isdigit():
+        return int(k)
+    raise ValueError(k)
+
+
+def uniform_keys(values):
+    """
+    De-duplicated keys of ONE type, Nones dropped (they never match an IN list). Ints mixed
+    with numeric strings / whole floats (5, "5", 5.0) become ints, so they neither stage as
+    two rows of the same key nor fail the staging table's primary key. Any other mix of
+    types raises ValueError.
+    """
+    keys = [k for k in dict.fromkeys(values or []) if k is not None]
+    types = {type(k) for k in keys}
+    if len(types) <= 1 and float not in types:
+        return keys
+    try:
+        return list(dict.fromkeys(_int_key(k) for k in keys))
+    except ValueError:
+        names = ", ".join(sorted(t.__name__ for t in types))
+        raise ValueError(f"Key list mixes types ({names}); pass keys of one type")
+
+
+class KeyStage:
+    """
+    Key lists used as a predicate inside ONE larger statement can't be chunked, so
+    long lists are shipped into a session temp table and joined instead:
+
+        with KeyStage(cur) as stage:
+            frag, params = stage.predicate("p.id", patient_ids)
+            cur.execute(f"SELECT ... WHERE {frag}", params)
+
+    Short lists stay plain IN lists. Keys go through uniform_keys() first, so the temp
+    table gets one column type. Temp tables are dropped on close, because pooled
+    sessions outlive the request.
+    """
+
+    def __init__(self, cur, threshold=IN_CHUNK_SIZE):
+        self.cur = cur
+        self.threshold = threshold
+        self._tables = []
+
+    def predicate(self, column, values):
+        keys = uniform_keys(values)
+        if len(keys) <= self.threshold:
+            frag, vals = in_clause(keys)
+            return f"{column} IN {frag}", vals
+
+        is_int = all(isinstance(k, int) and not isinstance(k, bool) for k in keys)
+        table = f"#keys_{len(self._tables)}"
+        self.cur.execute(
+            f"IF OBJECT_ID('tempdb..{table}') IS NOT NULL DROP TABLE {table}; "
+            f"CREATE TABLE {table} (k {'BIGINT' if is_int else 'NVARCHAR(450)'} NOT NULL PRIMARY KEY);"
+        )
+        self._tables.append(table)
+        self.cur.fast_executemany = True
+        try:
+            self.cur.executemany(f"INSERT INTO {table} (k) VALUES (?)", [(k,) for k in keys])
+        finally:
+            self.cur.fast_executemany = False
+        return f"{column} IN (SELECT k FROM {table})", tuple()
+
+    def close(self):
+        tables, self._tables = self._tables, []
+        for table in tables:
+            try:
+                self.cur.execute(f"IF OBJECT_ID('tempdb..{table}') IS NOT NULL DROP TABLE {table};")
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# --------------------------------------------------
+# Keyset cursors on date/time columns
+# --------------------------------------------------
+# A cursor value must go back to SQL Server in the column's own type: a DATETIME bound as
+# DATETIME2 (pyodbc's default for datetime) compares against the exact 1/300 s value
+# (.1233333 vs .1230000), so rows tied on the column get skipped or repeated between pages.
+# Values travel as CONVERT(VARCHAR(27), col, 121) text and come back through
+# CONVERT(<type>, ?, 121), which round-trips every date/time type exactly.
+_TEMPORAL_TYPES = {}
+_TEMPORAL_LOCK = threading.Lock()
+
+
+def temporal_type(table, column, cur=None):
+    """SQL type of a date/time column ('datetime', 'datetime2(7)', ...); cached per process."""
+    key = (table.lower(), column.lower())
+    cached = _TEMPORAL_TYPES.get(key)
+    if cached:
+        return cached
+
+    def load(c):
+        c.execute(
+            """
+            SELECT t.name, c.scale
+            FROM sys.columns c
+            JOIN sys.types t ON t.user_type_id = c.user_type_id
+            WHERE c.object_id = OBJECT_ID(?) AND c.name = ?
+            """,
+            (f"dbo.{table}", column),
+        )
+        return c.fetchone()
+
+    if cur is not None:
+        row = load(cur)
+    else:
+        with db_cursor() as (_conn, own):
+            row = load(own)
+    name = str(row[0]).lower() if row else "datetime2"
+    sql_type = f"{name}({row[1]})" if row and name in ("datetime2", "datetimeoffset", "time") else name
+    with _TEMPORAL_LOCK:
+        _TEMPORAL_TYPES[key] = sql_type
+    return sql_type
@@ -1,7 +1,10 @@
 from flask import Flask, request, jsonify, Blueprint
 import pyodbc
+import base64
 import datetime
-from app.database import get_cursor
+import json
+from app.database import db_cursor
+from app.services import appointment_service
 
 Appointment_bp = Blueprint('Appointment', __name__)
 app = Flask(__name__)
@@ -10,14 +13,10 @@ app = Flask(__name__)
 
 def fetch_all(query, params=None):
     """Helper to fetch rows from DB and return as list of dicts"""
-    conn, cursor = get_cursor()
-    try:
+    with db_cursor() as (conn, cursor):
         cursor.execute(query, params or [])
         columns = [col[0] for col in cursor.description]
         return [dict(zip(columns, row)) for row in cursor.fetchall()]
-    finally:
-        cursor.close()
-        conn.close()
 
 #Helper: parse and normalize date correctly (no timezone shift)
 def parse_local_date(date_str):
@@ -49,6 +48,35 @@ def parse_time(time_str):
     except Exception:
         raise ValueError(f"Invalid time format: {time_str}")
 
+# Keyset paging for GET /appointment: cursor = (StartsAt, AppointmentID) of the last row
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 500
+
+
+def _encode_cursor(starts_at, appointment_id):
+    raw = json.dumps([starts_at.isoformat(), int(appointment_id)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _page_args(args):
+    """Parse ?limit=&after= -> (limit, (StartsAt, AppointmentID)|None). Raises ValueError on bad input."""
+    try:
+        limit = int(args.get("limit") or PAGE_DEFAULT_LIMIT)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    limit = max(1, min(limit, PAGE_MAX_LIMIT))
+
+    after = None
+    token = (args.get("after") or "").strip()
+    if token:
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            starts_at, appointment_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            after = (datetime.datetime.fromisoformat(starts_at), int(appointment_id))
+        except Exception:
+            raise ValueError("Invalid cursor")
+    return limit, after
+
 # ---------------------- ROUTES ----------------------
 #Add new appointment (with slot-level uniqueness)
 @Appointment_bp.route('/book_appointment', methods=['POST'])
@@ -74,73 +102,18 @@ def book_appointment():
         if not appointment_date or not appointment_time:
             return jsonify({'error': 'Invalid date or time format'}), 400
 
-        # ---- Open DB ----
-        conn, cursor = get_cursor()
-
-        # ---- Uniqueness: block slot already taken for this specialist ----
-        # If you want clinic-wide uniqueness (ignore specialist), drop the last line in WHERE.
-        cursor.execute("""
-            SELECT COUNT(1)
-            FROM Appointments
-            WHERE AppointmentDate = ?
-              AND AppointmentTime = ?
-              AND LOWER(ISNULL(Specialist,'')) = LOWER(?)
-        """, (appointment_date, appointment_time, specialist))
-        (slot_count,) = cursor.fetchone()
-
-        if slot_count > 0:
-            cursor.close(); conn.close()
-            # Friendly message with the exact slot
-            return jsonify({
-                'error': f"No availability for {appointment_time.strftime('%H:%M')} on {appointment_date} ({specialist})."
-            }), 409  # Conflict
-
-        # (Optional) Also prevent same-patient duplicates on that slot
-        cursor.execute("""
-            SELECT COUNT(1)
-            FROM Appointments
-            WHERE AppointmentDate = ?
-              AND AppointmentTime = ?
-              AND LOWER(ISNULL(Specialist,'')) = LOWER(?)
-              AND LOWER(PatientEmail) = LOWER(?)
-        """, (appointment_date, appointment_time, specialist, patient_email))
-        (patient_dup_count,) = cursor.fetchone()
-
-        if patient_dup_count > 0:
-            cursor.close(); conn.close()
-            return jsonify({
-                'error': 'You already have an appointment at that time.'
-            }), 409
-
-        # ---- Insert appointment ----
+        # ---- Insert; the unique slot index rejects a taken slot atomically ----
         try:
-            cursor.execute("""
-                INSERT INTO Appointments 
-                (PatientName, PatientEmail, PhoneNumber,
-                 AppointmentDate, AppointmentTime, Specialist,
-                 Status, SubmittedAt)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                patient_name,
-                patient_email,
-                phone_number,
+            appointment_id = appointment_service.book_slot(
+                patient_name, patient_email, phone_number,
                 appointment_date,     # exact local date
                 appointment_time,     # exact local time
                 specialist,
-                "Pending",            # default status
-                datetime.datetime.now()
-            ))
-            conn.commit()
-        except pyodbc.Error as ex:
-            # If a unique index exists in DB, catch it here too (race-condition safe)
-            msg = str(ex)
-            if "2627" in msg or "2601" in msg:  # unique constraint violations
-                cursor.close(); conn.close()
-                return jsonify({'error': 'No availability for that slot.'}), 409
-            raise
+            )
+        except appointment_service.SlotTaken as taken:
+            return jsonify({'error': str(taken)}), 409  # Conflict
 
-        cursor.close(); conn.close()
-        return jsonify({'message': 'Appointment booked successfully!'}), 201
+        return jsonify({'message': 'Appointment booked successfully!', 'id': appointment_id}), 201
 
     except ValueError as ve:
         print("❌ ValueError:", ve)
@@ -152,57 +125,74 @@ def book_appointment():
         print("❌ Exception:", e)
         return jsonify({'error': str(e)}), 500
 
+
+
+#Free slots of a specialist, computed from location opening hours
+@Appointment_bp.route('/availability', methods=['GET'])
+def get_availability():
+    """
+    GET /api/availability?specialist=&from=YYYY-MM-DD&to=YYYY-MM-DD[&location=<id>][&slotMinutes=30]
+    -> {specialist, from, to, slotMinutes, days: [{date, free: ["HH:MM", ...]}]}
+    """
+    try:
+        specialist = (request.args.get('specialist') or '').strip()
+        if not specialist:
+            return jsonify({'error': 'specialist is required'}), 400
+
+        date_from = parse_local_date((request.args.get('from') or '').strip()) or datetime.date.today()
+        date_to = parse_local_date((request.args.get('to') or '').strip()) or date_from
+        location = request.args.get('location', type=int)
+        slot_minutes = request.args.get('slotMinutes', appointment_service.SLOT_MINUTES, type=int)
+
+        days = appointment_service.free_slots(specialist, date_from, date_to,
+                                              location_id=location, slot_minutes=slot_minutes)
+        return jsonify({
+            'specialist': specialist,
+            'from': date_from.isoformat(),
+            'to': date_to.isoformat(),
+            'slotMinutes': slot_minutes,
+            'days': days,
+        }), 200
+
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+    except LookupError as le:
+        return jsonify({'error': str(le)}), 404
+    except pyodbc.Error as ex:
+        return jsonify({'error': f'Database error: {ex}'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
     
 @Appointment_bp.route('/appointment', methods=['GET'])
 def get_appointment():
+    """
+    ?email=&phone=&name= (any match), ?upcoming=0 to include past ones.
+    Without ?limit= / ?after= the full list is returned as before; with them the result is
+    keyset-paged: {"items": [...], "nextCursor": <token|null>, "limit": n}.
+    """
     try:
         name  = (request.args.get('name')  or '').strip()
         email = (request.args.get('email') or '').strip().lower()
         phone = (request.args.get('phone') or '').strip()
         upcoming = request.args.get('upcoming', '1').strip() != '0'
 
-        conn, cursor = get_cursor()
-
-        clauses = []
-        params = []
-
-        # Build an OR group from whatever was provided
-        or_parts = []
-        if email:
-            or_parts.append("LOWER(PatientEmail) = LOWER(?)")
-            params.append(email)
-        if phone:
-            or_parts.append("PhoneNumber = ?")
-            params.append(phone)
-        if name:
-            # allow exact match OR starts-with to be forgiving
-            or_parts.append("(LOWER(PatientName) = LOWER(?) OR LOWER(PatientName) LIKE LOWER(?))")
-            params.extend([name, name + '%'])
-
-        where_sql = ""
-        if or_parts:
-            where_sql = "WHERE (" + " OR ".join(or_parts) + ")"
-
-        # Only future appointments if requested
-        if upcoming:
-            where_sql += (" AND " if where_sql else "WHERE ") + \
-                "(CAST(AppointmentDate AS DATETIME) + CAST(AppointmentTime AS DATETIME)) >= GETDATE()"
-
-        sql = f"""
-            SELECT AppointmentID, PatientName, PatientEmail, PhoneNumber,
-                   AppointmentDate, AppointmentTime, Specialist, Status, SubmittedAt
-              FROM Appointments
-              {where_sql}
-            ORDER BY AppointmentDate ASC, AppointmentTime ASC
-        """
+        paged = 'limit' in request.args or 'after' in request.args
+        limit, after = _page_args(request.args) if paged else (None, None)
 
-        cursor.execute(sql, params)
-        cols = [c[0] for c in cursor.description]
-        rows = cursor.fetchall()
+        rows = appointment_service.find_appointments(
+            email=email, phone=phone, name=name, upcoming=upcoming,
+            limit=limit + 1 if paged else None, after=after,
+        )
+
+        next_cursor = None
+        if paged and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = _encode_cursor(last["StartsAt"], last["AppointmentID"])
 
         out = []
-        for row in rows:
-            r = dict(zip(cols, row))
+        for r in rows:
             # serialize
             if isinstance(r.get("AppointmentDate"), (datetime.date, datetime.datetime)):
                 r["AppointmentDate"] = r["AppointmentDate"].strftime("%Y-%m-%d")
@@ -216,11 +206,16 @@ def get_appointment():
             r["time"]   = r["AppointmentTime"]
             r["doctor"] = r.get("Specialist") or ""
             r["status"] = r.get("Status") or "Pending"
+            r.pop("StartsAt", None)
             out.append(r)
 
-        cursor.close(); conn.close()
+        if paged:
+            return jsonify({"items": out, "nextCursor": next_cursor, "limit": limit}), 200
         return jsonify(out), 200
 
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
     except pyodbc.Error as ex:
         return jsonify({"error": f"Database error: {ex}"}), 500
     except Exception as e:
@@ -245,44 +240,43 @@ def postpone_appointment(appointment_id):
         new_date = parse_local_date(new_date_raw)
         new_time = parse_time(new_time_raw)
 
-        conn, cursor = get_cursor()
+        with db_cursor() as (conn, cursor):
+            schema = appointment_service.schema(cursor)
+
+            # Ensure the record exists
+            cursor.execute("SELECT COUNT(1) FROM Appointments WHERE AppointmentID = ?", (appointment_id,))
+            if cursor.fetchone()[0] == 0:
+                return jsonify({'error': f'Appointment {appointment_id} not found'}), 404
+
+            # Update date/time (keep Status as-is; set to Pending if NULL); the new slot gets a new reminder
+            cursor.execute(f"""
+                UPDATE Appointments
+                   SET AppointmentDate = ?,
+                       AppointmentTime = ?,
+                       Status = COALESCE(Status, 'Pending')
+                       {", ReminderSentAt = NULL" if schema.has("ReminderSentAt") else ""}
+                 WHERE AppointmentID = ?
+            """, (new_date, new_time, appointment_id))
+
+            # (Optional) if you have a Notes column, you could append the reason:
+            # cursor.execute("""
+            #     UPDATE Appointments
+            #        SET Notes = CONCAT(COALESCE(Notes, ''), ?)
+            #      WHERE AppointmentID = ?
+            # """, (f"\n[Postponed {datetime.datetime.now():%Y-%m-%d %H:%M}] {reason or ''}", appointment_id))
 
-        # Ensure the record exists
-        cursor.execute("SELECT COUNT(1) FROM Appointments WHERE AppointmentID = ?", (appointment_id,))
-        if cursor.fetchone()[0] == 0:
-            cursor.close(); conn.close()
-            return jsonify({'error': f'Appointment {appointment_id} not found'}), 404
-
-        # Update date/time (keep Status as-is; set to Pending if NULL)
-        cursor.execute("""
-            UPDATE Appointments
-               SET AppointmentDate = ?,
-                   AppointmentTime = ?,
-                   Status = COALESCE(Status, 'Pending')
-             WHERE AppointmentID = ?
-        """, (new_date, new_time, appointment_id))
-
-        # (Optional) if you have a Notes column, you could append the reason:
-        # cursor.execute("""
-        #     UPDATE Appointments
-        #        SET Notes = CONCAT(COALESCE(Notes, ''), ?)
-        #      WHERE AppointmentID = ?
-        # """, (f"\n[Postponed {datetime.datetime.now():%Y-%m-%d %H:%M}] {reason or ''}", appointment_id))
-
-        conn.commit()
-
-        # Return fresh record in the same shape you use elsewhere
-        cursor.execute("""
-            SELECT AppointmentID, PatientName, PatientEmail, PhoneNumber,
-                   AppointmentDate, AppointmentTime, Specialist, Status, SubmittedAt
-              FROM Appointments
-             WHERE AppointmentID = ?
-        """, (appointment_id,))
-        row = cursor.fetchone()
-        columns = [c[0] for c in cursor.description] if row else []
-        record = dict(zip(columns, row)) if row else None
+            conn.commit()
 
-        cursor.close(); conn.close()
+            # Return fresh record in the same shape you use elsewhere
+            cursor.execute("""
+                SELECT AppointmentID, PatientName, PatientEmail, PhoneNumber,
+                       AppointmentDate, AppointmentTime, Specialist, Status, SubmittedAt
+                  FROM Appointments
+                 WHERE AppointmentID = ?
+            """, (appointment_id,))
+            row = cursor.fetchone()
+            columns = [c[0] for c in cursor.description] if row else []
+            record = dict(zip(columns, row)) if row else None
 
         if not record:
             return jsonify({'error': 'Updated record not found'}), 404
@@ -302,6 +296,47 @@ def postpone_appointment(appointment_id):
 
         return jsonify(record), 200
 
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+    except pyodbc.Error as ex:
+        if appointment_service.is_duplicate_key(ex):
+            return jsonify({'error': 'No availability for that slot.'}), 409
+        return jsonify({'error': f'Database error: {ex}'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+
+#Bulk reschedule: many appointments, one transaction
+@Appointment_bp.route('/appointments/bulk/postpone', methods=['POST'])
+def bulk_postpone_appointments():
+    """
+    Body: {"ids": [...]}  or  {"specialist": "...", "date": "YYYY-MM-DD"}   (which appointments)
+    plus the target:
+          {"appointmentDate": "YYYY-MM-DD"[, "appointmentTime": "HH:MM"]}  (time only for one appointment)
+       or {"shiftDays": n, "shiftMinutes": m}
+    -> 200 {"updated": n, "appointments": [...]}, or 409 {"error", "conflicts": [...]} with nothing changed.
+    """
+    try:
+        data = request.get_json() or {}
+        ids = data.get('ids') or []
+        if not isinstance(ids, list):
+            return jsonify({'error': 'ids must be a list'}), 400
+
+        to_date = parse_local_date((data.get('appointmentDate') or '').strip())
+        to_time = parse_time((data.get('appointmentTime') or '').strip())
+        shift = int(data.get('shiftDays') or 0) * 1440 + int(data.get('shiftMinutes') or 0)
+
+        rows = appointment_service.bulk_reschedule(
+            ids=ids,
+            specialist=(data.get('specialist') or '').strip() or None,
+            on_date=parse_local_date((data.get('date') or '').strip()),
+            to_date=to_date, to_time=to_time, shift_minutes=shift,
+        )
+        return jsonify({'updated': len(rows), 'appointments': rows}), 200
+
+    except appointment_service.RescheduleConflict as conflict:
+        return jsonify({'error': str(conflict), 'conflicts': conflict.conflicts}), 409
     except ValueError as ve:
         return jsonify({'error': str(ve)}), 400
     except pyodbc.Error as ex:
@@ -310,16 +345,38 @@ def postpone_appointment(appointment_id):
         return jsonify({'error': str(e)}), 500
 
 
+#Bulk cancel (hard delete) in one statement
+@Appointment_bp.route('/appointments/bulk/cancel', methods=['POST'])
+def bulk_cancel_appointments():
+    """Body: {"ids": [...]} or {"specialist": "...", "date": "YYYY-MM-DD"} -> {"deleted": n, "appointments": [...]}"""
+    try:
+        data = request.get_json() or {}
+        ids = data.get('ids') or []
+        if not isinstance(ids, list):
+            return jsonify({'error': 'ids must be a list'}), 400
+
+        rows = appointment_service.bulk_cancel(
+            ids=ids,
+            specialist=(data.get('specialist') or '').strip() or None,
+            on_date=parse_local_date((data.get('date') or '').strip()),
+        )
+        return jsonify({'deleted': len(rows), 'appointments': rows}), 200
+
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
+    except pyodbc.Error as ex:
+        return jsonify({'error': f'Database error: {ex}'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 
 #Cancel appointment (hard delete)
 @Appointment_bp.route('/appointment/<int:appointment_id>', methods=['DELETE'])
 def cancel_appointment(appointment_id):
     try:
-        conn, cursor = get_cursor()
-        cursor.execute("DELETE FROM Appointments WHERE AppointmentID = ?", (appointment_id,))
-        rows = cursor.rowcount
-        conn.commit()
-        cursor.close(); conn.close()
+        with db_cursor(commit=True) as (conn, cursor):
+            cursor.execute("DELETE FROM Appointments WHERE AppointmentID = ?", (appointment_id,))
+            rows = cursor.rowcount
 
         if rows == 0:
             return jsonify({'error': f'Appointment {appointment_id} not found'}), 404
@@ -337,8 +394,6 @@ def get_customer_appointments(patient_id):
     Fetch all appointments for a given patient_id or name.
     """
     try:
-        conn, cursor = get_cursor()
-
         # Try matching either by ID or by name/email if you store those.
         sql_query = """
             SELECT AppointmentID, PatientName, PatientEmail, PhoneNumber,
@@ -362,13 +417,12 @@ def get_customer_appointments(patient_id):
         #      ORDER BY AppointmentDate ASC, AppointmentTime ASC
         # """
 
-        cursor.execute(sql_query, (patient_id, patient_id))
-        columns = [col[0] for col in cursor.description]
-        rows = cursor.fetchall()
+        with db_cursor() as (conn, cursor):
+            cursor.execute(sql_query, (patient_id, patient_id))
+            columns = [col[0] for col in cursor.description]
+            rows = cursor.fetchall()
 
         if not rows:
-            cursor.close()
-            conn.close()
             return jsonify([]), 200  # no appointments yet
 
         appointments = []
@@ -389,9 +443,6 @@ def get_customer_appointments(patient_id):
             record["status"] = record["Status"] or "Pending"
             appointments.append(record)
 
-        cursor.close()
-        conn.close()
-
         return jsonify(appointments), 200
 
     except Exception as e:
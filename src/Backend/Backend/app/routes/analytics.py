@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from app.database import get_cursor
+from app.services import analytics_rollup
 from datetime import datetime, timedelta
 
 analytics_bp = Blueprint("analytics", __name__)
@@ -28,36 +29,22 @@ def get_form_analytics():
         return jsonify({"error": "Missing date range"}), 400
 
     start_dt, end_dt = adjust_date_range(start_date, end_date)
+    if not start_dt:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
 
     conn, cursor = get_cursor()
 
     def run_query(s, e):
         s_dt, e_dt = adjust_date_range(s, e)
-        cursor.execute("""
-            SELECT 
-                COUNT(*) AS total_forms,
-                SUM(CASE WHEN status IN ('Active','Not Started') THEN 1 ELSE 0 END) AS assigned,
-                SUM(CASE WHEN status = 'Completed' THEN 1 ELSE 0 END) AS completed,
-                SUM(CASE WHEN status = 'Completed' 
-                         AND DATEDIFF(HOUR, created, due_date) <= 24 THEN 1 ELSE 0 END) AS within24_completed
-            FROM dbo.form_status
-            WHERE created >= ? AND created < ?
-        """, (s_dt, e_dt))
-        row = cursor.fetchone()
-
-        if not row:
-            return {
-                "Assigned": 0,
-                "Completed": 0,
-                "CompletionRate": "0%",
-                "Within24_Completed": 0,
-                "Within24_CompletionRate": "0%"
-            }
-
-        total = row.total_forms or 0
-        assigned = row.assigned or 0
-        completed = row.completed or 0
-        within24_completed = row.within24_completed or 0
+        if not s_dt:
+            raise ValueError("Dates must be YYYY-MM-DD")
+        # daily rollup for past days + live counts for today
+        row = analytics_rollup.form_totals(cursor, s_dt.date(), e_dt.date())
+
+        total = row["total_forms"]
+        assigned = row["assigned"]
+        completed = row["completed"]
+        within24_completed = row["within24_completed"]
 
         completion_rate = f"{int((completed * 100) / total) if total else 0}%"
         within24_rate = f"{int((within24_completed * 100) / completed) if completed else 0}%"
@@ -71,15 +58,41 @@ def get_form_analytics():
         }
 
     # run for current + comparison
-    current = run_query(start_date, end_date)
-    compare = run_query(compare_start, compare_end) if compare_start and compare_end else None
-
-    cursor.close()
-    conn.close()
+    try:
+        current = run_query(start_date, end_date)
+        compare = run_query(compare_start, compare_end) if compare_start and compare_end else None
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    finally:
+        cursor.close()
+        conn.close()
 
     return jsonify({"current": current, "compare": compare})
 
 
+@analytics_bp.route("/forms/series", methods=["GET"])
+def get_form_series():
+    """
+    ?startDate=&endDate=&granularity=day|week|month&groupBy=location|form
+    Whole chart in one request: {"granularity", "groupBy", "buckets", "series": [{key, label, points}]}
+    """
+    start_dt, end_dt = adjust_date_range(request.args.get("startDate"), request.args.get("endDate"))
+    if not start_dt:
+        return jsonify({"error": "startDate and endDate (YYYY-MM-DD) are required"}), 400
+    granularity = (request.args.get("granularity") or "day").lower()
+    group_by = (request.args.get("groupBy") or "").lower() or None
+
+    conn, cursor = get_cursor()
+    try:
+        series = analytics_rollup.form_series(cursor, start_dt.date(), end_dt.date(), granularity, group_by)
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    finally:
+        cursor.close()
+        conn.close()
+    return jsonify(series)
+
+
 # ------------------ Patients Analytics ------------------ #
 @analytics_bp.route("/patients", methods=["GET"])
 def get_patient_analytics():
@@ -93,16 +106,15 @@ def get_patient_analytics():
     def run_query(s, e):
         if s and e:
             s_dt, e_dt = adjust_date_range(s, e)
-            cursor.execute("""
-                SELECT COUNT(*) AS patient_count
-                FROM dbo.patients
-                WHERE created_on >= ? AND created_on < ?
-            """, (s_dt, e_dt))
+            if not s_dt:
+                raise ValueError("Dates must be YYYY-MM-DD")
+            total = analytics_rollup.new_patients(cursor, s_dt.date(), e_dt.date())
         else:
             cursor.execute("SELECT COUNT(*) AS patient_count FROM dbo.patients")
-        row = cursor.fetchone()
+            row = cursor.fetchone()
+            total = row.patient_count if row else 0
         return {
-            "Total": row.patient_count if row else 0,
+            "Total": total,
             # intake_method not in schema → returning only total
             "Bulk_Import": 0,
             "Integration": 0,
@@ -113,10 +125,13 @@ def get_patient_analytics():
             "Static_Anonymous_Link": 0
         }
 
-    current = run_query(start_date, end_date)
-    compare = run_query(compare_start, compare_end) if compare_start and compare_end else None
-
-    cursor.close()
-    conn.close()
+    try:
+        current = run_query(start_date, end_date)
+        compare = run_query(compare_start, compare_end) if compare_start and compare_end else None
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    finally:
+        cursor.close()
+        conn.close()
 
     return jsonify({"current": current, "compare": compare})
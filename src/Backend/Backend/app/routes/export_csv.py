@@ -1,15 +1,50 @@
-from flask import Blueprint, request, send_file, jsonify
+from flask import Blueprint, Response, request, send_file, jsonify
 from flask_cors import cross_origin
 from io import BytesIO
+import os
 import traceback
 
+from ..services import incremental_export
+from ..services.columnar_export import ExportFormatUnavailable
+from ..services.form_status_version import MissingRowVersion
+
+# Stream exports by default; body {"stream": false} or EXPORT_CSV_STREAM=0 restores the buffered path
+STREAM_DEFAULT = os.getenv("EXPORT_CSV_STREAM", "1").lower() not in ("0", "false", "no", "off")
+
 # Blueprint has no prefix — it’s mounted in __init__.py at /api/exports/forms
 bp_export_csv = Blueprint("export_csv", __name__)
 
+EXPOSED_HEADERS = "Content-Disposition, X-Export-Watermark, X-Export-Since"
+
+
+def _incremental_window(filters):
+    """
+    Incremental mode: {"since": <watermark>} and/or {"consumer": "<name>"} (body or query string).
+    A consumer without an explicit `since` resumes from its stored watermark; no watermark at
+    all means a full export that starts the chain. Returns (window|None, since, consumer).
+    """
+    since = filters.get("since") or request.args.get("since") or None
+    consumer = str(filters.get("consumer") or request.args.get("consumer") or "").strip() or None
+    if not (since or consumer or filters.get("incremental")):
+        return None, None, None
+    if consumer and not since:
+        saved = incremental_export.get_watermark(consumer)
+        since = saved["watermark"] if saved else None
+    return incremental_export.open_window(since), since, consumer
+
+
+def _watermark_headers(resp, window, since):
+    resp.headers["Access-Control-Expose-Headers"] = EXPOSED_HEADERS
+    if window is not None:
+        resp.headers["X-Export-Watermark"] = window.token()
+        resp.headers["X-Export-Since"] = since or ""
+    return resp
+
+
 @bp_export_csv.route("/csv", methods=["POST", "OPTIONS"])
 @cross_origin(
     origins=["http://localhost:5173", "http://127.0.0.1:5173", "*"],
-    expose_headers=["Content-Disposition"]
+    expose_headers=["Content-Disposition", "X-Export-Watermark", "X-Export-Since"]
 )
 def export_forms_csv():
     if request.method == "OPTIONS":
@@ -17,8 +52,28 @@ def export_forms_csv():
 
     try:
         filters = request.get_json(force=True) or {}
+        fmt = str(filters.get("format") or request.args.get("format") or "csv").lower()
+        filters["format"] = fmt
+        stream = filters.get("stream", STREAM_DEFAULT) and fmt == "csv"
+        if str(request.args.get("stream", "")).lower() in ("0", "false"):
+            stream = False
+        window, since, consumer = _incremental_window(filters)
+
+        if stream:
+            from ..services.export_csv_service import stream_csv_export
+            chunks, filename, mimetype = stream_csv_export(filters, window=window)
+            if consumer:
+                # the stored watermark only advances once the whole body was sent
+                chunks = incremental_export.save_when_done(chunks, consumer, window)
+            resp = Response(chunks, mimetype=mimetype)
+            resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+            resp.headers["X-Accel-Buffering"] = "no"   # don't let a proxy re-buffer the stream
+            return _watermark_headers(resp, window, since)
+
         from ..services.export_csv_service import generate_csv_export
-        file_bytes, filename, mimetype = generate_csv_export(filters)
+        file_bytes, filename, mimetype = generate_csv_export(filters, window=window)
+        if consumer:
+            incremental_export.save_watermark(consumer, window.token())
 
         resp = send_file(
             BytesIO(file_bytes),
@@ -26,8 +81,16 @@ def export_forms_csv():
             as_attachment=True,
             download_name=filename,
         )
-        resp.headers["Access-Control-Expose-Headers"] = "Content-Disposition"
-        return resp
+        return _watermark_headers(resp, window, since)
+
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    except ExportFormatUnavailable as e:
+        return jsonify({"message": str(e)}), 501
+
+    except MissingRowVersion as e:
+        return jsonify({"message": str(e)}), 503
 
     except Exception as e:
         print("\n--- CSV EXPORT ERROR ---")
@@ -36,6 +99,22 @@ def export_forms_csv():
         return jsonify({"message": f"CSV export failed: {e}"}), 500
 
 
+@bp_export_csv.route("/watermarks/<consumer>", methods=["GET", "DELETE"])
+def export_watermark(consumer):
+    """Inspect or reset (DELETE -> next export is full) a consumer's stored watermark."""
+    try:
+        if request.method == "DELETE":
+            removed = incremental_export.reset_watermark(consumer)
+            return jsonify({"consumer": consumer, "reset": removed}), 200
+        saved = incremental_export.get_watermark(consumer)
+        if not saved:
+            return jsonify({"message": "No watermark for this consumer"}), 404
+        return jsonify(saved), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"message": f"Watermark lookup failed: {e}"}), 500
+
+
 #Optional test route to confirm frontend-download works
 @bp_export_csv.route("/testcsv", methods=["GET"])
 @cross_origin(
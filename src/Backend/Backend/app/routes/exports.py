@@ -2,7 +2,8 @@ from flask import Blueprint, request, jsonify, send_file
 from werkzeug.exceptions import BadRequest
 from ..services.export_service import (
     start_export_job,
-    get_job_state,
+    start_batch_export_job,
+    get_job,
     get_job_file_path,
 )
 
@@ -11,6 +12,7 @@ from ..services.export_service import (
 # (mounted under url_prefix="/api" in app factory)
 # Final paths:
 #   POST /api/exports
+#   POST /api/exports/batch
 #   GET  /api/exports/<export_id>
 #   GET  /api/exports/<export_id>/file
 # --------------------------
@@ -39,18 +41,56 @@ def start_export():
     return jsonify({"exportId": export_id})
 
 
+@bp_exports.route("/batch", methods=["POST", "OPTIONS"])
+def start_batch_export():
+    """
+    Body: { "patientIds": [<int>, ...] | "filters": { ...same as /exports/forms/csv... },
+            "view": "staff" | "patient", "format": "zip" | "pdf" }
+    Returns 202: { "exportId": "<id>", "total": <patients> }
+    Poll GET /api/exports/<id>: "detail" carries per-patient status.
+    """
+    if request.method == "OPTIONS":
+        return ("", 200)
+
+    data = request.get_json(silent=True) or {}
+    view = data.get("view") or "staff"
+    fmt = (data.get("format") or "zip").lower()
+    if view not in ("staff", "patient"):
+        raise BadRequest("view must be staff or patient")
+
+    patient_ids = data.get("patientIds")
+    if patient_ids is None and isinstance(data.get("filters"), dict):
+        from ..services.export_csv_service import resolve_patient_ids
+        patient_ids = resolve_patient_ids(data["filters"])
+    if not isinstance(patient_ids, list):
+        raise BadRequest("patientIds (list) or filters (object) is required")
+
+    try:
+        ids = list(dict.fromkeys(int(p) for p in patient_ids))
+        export_id = start_batch_export_job(ids, view=view, fmt=fmt)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"exportId": export_id, "total": len(ids)}), 202
+
+
 @bp_exports.route("/<export_id>", methods=["GET"])
 def poll_export(export_id):
     """
-    Returns: { "status": "pending" | "ready" | "error", "url"?: string }
+    Returns: { "status": "pending" | "running" | "ready" | "error",
+               "progress": 0-100, "error"?: string, "url"?: string }
     """
-    status = get_job_state(export_id)
-    if not status:
+    job = get_job(export_id)
+    if not job:
         return jsonify({"status": "error"}), 404
 
-    if status == "ready":
-        return jsonify({"status": "ready", "url": f"/api/exports/{export_id}/file"})
-    return jsonify({"status": status})
+    body = {"status": job["status"], "progress": job.get("progress") or 0}
+    if job.get("detail"):
+        body["detail"] = job["detail"]
+    if job["status"] == "error":
+        body["error"] = job.get("error")
+    if job["status"] == "ready":
+        body["url"] = f"/api/exports/{export_id}/file"
+    return jsonify(body)
 
 
 @bp_exports.route("/<export_id>/file", methods=["GET"])
@@ -59,6 +99,9 @@ def download_export(export_id):
     if not path:
         return "Not found", 404
 
+    if path.endswith(".zip"):
+        return send_file(path, mimetype="application/zip", as_attachment=True,
+                         download_name=f"patients-{export_id}.zip")
     return send_file(
         path,
         mimetype="application/pdf",
@@ -1,13 +1,15 @@
 from flask import Blueprint, jsonify, request, url_for, redirect
 from app.database import get_cursor
 from datetime import datetime, date
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from twilio.rest import Client
 import os
+import json
+import base64
 import traceback
-from ..database import get_cursor
+from ..database import get_cursor, db_cursor, execute_in, temporal_type
+from ..services import completion_summary
+from ..services import delivery_service
+from ..services import form_assignment
+from ..services import pdf_cache
  
 
 homepage_bp = Blueprint("homepage", __name__)
@@ -41,6 +43,22 @@ def _sanitize_params(params):
     return tuple(safe)
 
 
+def _norm_due(v):
+    """Accept 'YYYY-MM-DD', 'MM/DD/YYYY' or an ISO timestamp; return 'YYYY-MM-DD' or None."""
+    if not v:
+        return None
+    s = str(v).strip()
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(s[:10], fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(s.replace("Z", "+00:00")).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
 def fetch_all(query, params=None):
     conn, cursor = get_cursor()
     try:
@@ -73,20 +91,401 @@ def execute_query(query, params=None, commit=False):
         conn.close()
 
 
+# ------------------ Dashboard paging helpers ------------------ #
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 500
+
+# Keyset order: (k_group, created DESC, id DESC, ...). k_group 0 holds rows with a timestamp,
+# read newest-first through the index on the raw column; k_group 1 holds the undated rest
+# (patients with no assignment, NULL timestamps), read by id. Each group is its own TOP (n)
+# branch of a UNION ALL so both stay index seeks; cursor timestamps are compared in the
+# column's own type (database.temporal_type).
+_K_TIME = "CONVERT(VARCHAR(27), {col}, 121)"
+
+
+def _encode_cursor(values):
+    """Opaque, URL-safe cursor token from the last row's sort key."""
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token):
+    padded = token + "=" * (-len(token) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+
+
+def _wants_page(args):
+    return "limit" in args or "after" in args
+
+
+def _page_args(args, key_len):
+    """Parse ?limit=&after= -> (limit, after_values|None). Raises ValueError on bad input."""
+    try:
+        limit = int(args.get("limit") or PAGE_DEFAULT_LIMIT)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    limit = max(1, min(limit, PAGE_MAX_LIMIT))
+
+    after = None
+    token = (args.get("after") or "").strip()
+    if token:
+        try:
+            after = _decode_cursor(token)
+        except Exception:
+            raise ValueError("Invalid cursor")
+        if not isinstance(after, list) or len(after) != key_len:
+            raise ValueError("Invalid cursor")
+    return limit, after
+
+
+def _split_list(v):
+    return [x.strip() for x in str(v or "").split(",") if x.strip()]
+
+
+def _dashboard_filters(args):
+    """
+    Server-side filters shared by the paged dashboard endpoints.
+      ?status=Active,Completed  ?location=GIA HR  ?formId=3,7
+      ?dueFrom=YYYY-MM-DD  ?dueTo=YYYY-MM-DD (inclusive)
+    Returns (list of SQL predicates on fs/f, params).
+    """
+    parts, params = [], []
+
+    statuses = _split_list(args.get("status"))
+    if statuses:
+        parts.append("fs.status IN (" + ",".join("?" * len(statuses)) + ")")
+        params.extend(statuses)
+
+    location = (args.get("location") or "").strip()
+    if location:
+        parts.append("fs.location = ?")
+        params.append(location)
+
+    form_ids = _split_list(args.get("formId"))
+    if form_ids:
+        parts.append("fs.form_id IN (" + ",".join("?" * len(form_ids)) + ")")
+        params.extend(form_ids)
+
+    for key, op in (("dueFrom", "fs.due_date >= ?"), ("dueTo", "fs.due_date < DATEADD(day, 1, ?)")):
+        val = (args.get(key) or "").strip()
+        if val:
+            try:
+                datetime.strptime(val, "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"{key} must be YYYY-MM-DD")
+            parts.append(op)
+            params.append(val)
+
+    return parts, params
+
+
+def _wants_total(args):
+    return str(args.get("includeTotal", "")).lower() in ("1", "true", "yes")
+
+
+def _paged_response(items, next_cursor, limit, total):
+    body = {"items": items, "nextCursor": next_cursor, "limit": limit}
+    headers = {}
+    if total is not None:
+        body["total"] = total
+        headers["X-Total-Count"] = str(total)
+    return jsonify(body), 200, headers
+
+
+# Completion % comes from the materialized summary, or live counts until it exists
+# (see services/completion_summary.py)
+_PAGE_COMPLETION_COLS = """
+            cs.total_fields,
+            cs.answered_fields,
+            cs.completion AS completion_percentage
+"""
+
+
+def _keyset_branches(after, dated, undated):
+    """
+    UNION ALL branches for the page after cursor `after` ([k_group, created, id, ...]):
+    the dated group unless the cursor is already past it, then the undated group.
+    `dated(created_id_...)` / `undated(id_...)` get the cursor values to seek past (None =
+    from the top) and return (sql, params).
+    """
+    if after and after[0] == 1:
+        return [undated(after[2:])]
+    return [dated(after[1:] if after else None), undated(None)]
+
+
+def _home_data_page():
+    """Keyset-paged variant of /home/data ordered by (fs.created, p.id, fs.form_id) DESC."""
+    args = request.args
+    try:
+        limit, after = _page_args(args, 4)
+        filter_parts, filter_params = _dashboard_filters(args)
+        if after and after[0] not in (0, 1):
+            raise ValueError("Invalid cursor")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    created_type = temporal_type("form_status", "created")
+    select_cols = """
+                p.id AS patient_id,
+                p.first_name + ' ' + p.last_name AS patient_name,
+                f.form_id,
+                f.form_name,
+                fs.status,
+                fs.due_date,
+                fs.email_sent,
+                fs.sms_sent,
+                fs.created AS form_created,
+                fs.location,"""
+
+    def dated(cursor):
+        parts = ["fs.created IS NOT NULL"] + filter_parts
+        params = [limit + 1] + filter_params
+        if cursor:
+            parts.append(f"""
+                (fs.created < CONVERT({created_type}, ?, 121)
+                 OR (fs.created = CONVERT({created_type}, ?, 121)
+                     AND (fs.patient_id < ? OR (fs.patient_id = ? AND ISNULL(fs.form_id, 0) < ?))))
+            """)
+            params.extend([cursor[0], cursor[0], cursor[1], cursor[1], cursor[2]])
+        return f"""
+            SELECT * FROM (
+                SELECT TOP (?) 0 AS k_group, {select_cols}
+                    {_K_TIME.format(col="fs.created")} AS k_created,
+                    ISNULL(fs.form_id, 0) AS k_form
+                FROM form_status fs
+                JOIN patients p ON p.id = fs.patient_id
+                LEFT JOIN forms f ON fs.form_id = f.form_id
+                WHERE {" AND ".join(parts)}
+                ORDER BY fs.created DESC, fs.patient_id DESC, ISNULL(fs.form_id, 0) DESC
+            ) dated""", params
+
+    def undated(cursor):
+        parts = ["fs.created IS NULL"] + filter_parts
+        params = [limit + 1] + filter_params
+        if cursor:
+            parts.append("(p.id < ? OR (p.id = ? AND ISNULL(fs.form_id, 0) < ?))")
+            params.extend([cursor[0], cursor[0], cursor[1]])
+        return f"""
+            SELECT * FROM (
+                SELECT TOP (?) 1 AS k_group, {select_cols}
+                    CAST(NULL AS VARCHAR(27)) AS k_created,
+                    ISNULL(fs.form_id, 0) AS k_form
+                FROM patients p
+                LEFT JOIN form_status fs ON p.id = fs.patient_id
+                LEFT JOIN forms f ON fs.form_id = f.form_id
+                WHERE {" AND ".join(parts)}
+                ORDER BY p.id DESC, ISNULL(fs.form_id, 0) DESC
+            ) undated""", params
+
+    branches = _keyset_branches(after, dated, undated)
+    params = [limit + 1]
+    for _sql, branch_params in branches:
+        params.extend(branch_params)
+    query = f"""
+        WITH page AS (
+            SELECT TOP (?) * FROM (
+                {" UNION ALL ".join(sql for sql, _params in branches)}
+            ) keyed
+            ORDER BY k_group, k_created DESC, patient_id DESC, k_form DESC
+        )
+        SELECT page.*,
+            {_PAGE_COMPLETION_COLS}
+        FROM page
+        {completion_summary.completion_source("page.patient_id", "page.form_id")}
+        ORDER BY page.k_group, page.k_created DESC, page.patient_id DESC, page.k_form DESC;
+    """
+    rows = fetch_all(query, params)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor([last["k_group"], last["k_created"], last["patient_id"], last["k_form"]])
+
+    total = None
+    if _wants_total(args):
+        count_where = ("WHERE " + " AND ".join(filter_parts)) if filter_parts else ""
+        total = fetch_all(f"""
+            SELECT COUNT(*) AS total
+            FROM patients p
+            LEFT JOIN form_status fs ON p.id = fs.patient_id
+            LEFT JOIN forms f ON fs.form_id = f.form_id
+            {count_where}
+        """, filter_params)[0]["total"]
+
+    items = [{
+        "patientId": row.get("patient_id"),
+        "patient": row.get("patient_name"),
+        "formId": row.get("form_id"),
+        "form": row.get("form_name") or "No Form Assigned",
+        "status": row.get("status") or "Not Started",
+        "dueDate": row.get("due_date"),
+        "emailSent": row.get("email_sent") or "—",
+        "smsSent": row.get("sms_sent") or "—",
+        "created": row.get("form_created"),
+        "location": row.get("location"),
+        "completion": float(row.get("completion_percentage") or 0)
+    } for row in rows]
+
+    return _paged_response(items, next_cursor, limit, total)
+
+
+def _home_data_grouped_page():
+    """
+    Keyset-paged variant of /home/data_grouped.
+    Pages over patients ordered by (p.created_on, p.id) DESC so a patient's forms never
+    straddle two pages; the form filters restrict both which patients and which forms appear.
+    """
+    args = request.args
+    try:
+        limit, after = _page_args(args, 3)
+        filter_parts, filter_params = _dashboard_filters(args)
+        if after and after[0] not in (0, 1):
+            raise ValueError("Invalid cursor")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    created_type = temporal_type("patients", "created_on")
+    patient_parts, patient_params = [], []
+    if filter_parts:
+        patient_parts.append(f"""
+            EXISTS (
+                SELECT 1 FROM form_status fs
+                LEFT JOIN forms f ON fs.form_id = f.form_id
+                WHERE fs.patient_id = p.id AND {" AND ".join(filter_parts)}
+            )
+        """)
+        patient_params.extend(filter_params)
+    form_join_filter = ("AND " + " AND ".join(filter_parts)) if filter_parts else ""
+
+    def dated(cursor):
+        parts = ["p.created_on IS NOT NULL"] + patient_parts
+        params = [limit + 1] + patient_params
+        if cursor:
+            parts.append(f"""
+                (p.created_on < CONVERT({created_type}, ?, 121)
+                 OR (p.created_on = CONVERT({created_type}, ?, 121) AND p.id < ?))
+            """)
+            params.extend([cursor[0], cursor[0], cursor[1]])
+        return f"""
+            SELECT * FROM (
+                SELECT TOP (?) 0 AS k_group,
+                    p.id AS patient_id,
+                    p.first_name + ' ' + p.last_name AS patient_name,
+                    p.created_on,
+                    {_K_TIME.format(col="p.created_on")} AS k_created
+                FROM patients p
+                WHERE {" AND ".join(parts)}
+                ORDER BY p.created_on DESC, p.id DESC
+            ) dated""", params
+
+    def undated(cursor):
+        parts = ["p.created_on IS NULL"] + patient_parts
+        params = [limit + 1] + patient_params
+        if cursor:
+            parts.append("p.id < ?")
+            params.append(cursor[0])
+        return f"""
+            SELECT * FROM (
+                SELECT TOP (?) 1 AS k_group,
+                    p.id AS patient_id,
+                    p.first_name + ' ' + p.last_name AS patient_name,
+                    p.created_on,
+                    CAST(NULL AS VARCHAR(27)) AS k_created
+                FROM patients p
+                WHERE {" AND ".join(parts)}
+                ORDER BY p.id DESC
+            ) undated""", params
+
+    branches = _keyset_branches(after, dated, undated)
+    pat_params = [limit + 1]
+    for _sql, branch_params in branches:
+        pat_params.extend(branch_params)
+
+    query = f"""
+        WITH pat AS (
+            SELECT TOP (?) * FROM (
+                {" UNION ALL ".join(sql for sql, _params in branches)}
+            ) keyed
+            ORDER BY k_group, k_created DESC, patient_id DESC
+        ),
+        page AS (
+            SELECT
+                pat.patient_id, pat.patient_name, pat.created_on, pat.k_group, pat.k_created,
+                f.form_id,
+                f.form_name,
+                fs.status,
+                fs.due_date,
+                fs.email_sent,
+                fs.sms_sent,
+                fs.created AS form_created,
+                fs.location
+            FROM pat
+            LEFT JOIN form_status fs ON fs.patient_id = pat.patient_id {form_join_filter}
+            LEFT JOIN forms f ON fs.form_id = f.form_id
+        )
+        SELECT page.*,
+            {_PAGE_COMPLETION_COLS}
+        FROM page
+        {completion_summary.completion_source("page.patient_id", "page.form_id")}
+        ORDER BY page.k_group, page.k_created DESC, page.patient_id DESC;
+    """
+    rows = fetch_all(query, pat_params + filter_params)
+
+    patients_map = {}
+    for row in rows:
+        pid = row.get("patient_id")
+        if pid not in patients_map:
+            patients_map[pid] = {
+                "patientId": pid,
+                "patient": row.get("patient_name"),
+                "createdOn": row.get("created_on"),
+                "forms": [],
+                "_key": [row.get("k_group"), row.get("k_created"), pid],
+            }
+
+        if row.get("form_id"):
+            patients_map[pid]["forms"].append({
+                "formId": row.get("form_id"),
+                "form": row.get("form_name"),
+                "status": row.get("status") or "Not Assigned",
+                "dueDate": row.get("due_date"),
+                "emailSent": row.get("email_sent"),
+                "smsSent": row.get("sms_sent"),
+                "created": row.get("form_created"),
+                "location": row.get("location"),
+                "completion": float(row.get("completion_percentage") or 0)
+            })
+
+    items = list(patients_map.values())
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = _encode_cursor(items[-1]["_key"])
+    for item in items:
+        item.pop("_key", None)
+
+    total = None
+    if _wants_total(args):
+        count_where = ("WHERE " + patient_parts[0]) if filter_parts else ""
+        total = fetch_all(
+            f"SELECT COUNT(*) AS total FROM patients p {count_where}",
+            filter_params,
+        )[0]["total"]
+
+    return _paged_response(items, next_cursor, limit, total)
+
+
 # ------------------ Routes ------------------ #
 
 #GET /home/data (flat rows for dashboard, with completion % using latest submission)
 @homepage_bp.route("/home/data", methods=["GET"])
 def get_home_data_flat():
-    query = """
-        WITH LatestSubmission AS (
-            SELECT
-                submission_id,
-                form_id,
-                patient_id,
-                ROW_NUMBER() OVER (PARTITION BY form_id, patient_id ORDER BY submitted_at DESC) AS rn
-            FROM FormSubmissions
-        )
+    # ?limit=&after= -> keyset-paged envelope; no paging params keeps the legacy full list
+    if _wants_page(request.args):
+        return _home_data_page()
+
+    query = f"""
         SELECT 
             p.id AS patient_id,
             p.first_name + ' ' + p.last_name AS patient_name,
@@ -98,28 +497,13 @@ def get_home_data_flat():
             fs.sms_sent,
             fs.created AS form_created,
             fs.location,
-            CAST(
-                (100.0 * COUNT(
-                    CASE 
-                        WHEN fr.response_value IS NOT NULL AND LTRIM(RTRIM(fr.response_value)) <> '' 
-                        THEN 1 END
-                )) / NULLIF(COUNT(ff.field_id), 0) AS DECIMAL(5,2)
-            ) AS completion_percentage
+            cs.completion AS completion_percentage
         FROM patients p
         LEFT JOIN form_status fs 
             ON p.id = fs.patient_id
         LEFT JOIN forms f 
             ON fs.form_id = f.form_id
-        LEFT JOIN LatestSubmission ls 
-            ON ls.form_id = f.form_id AND ls.patient_id = p.id AND ls.rn = 1
-        LEFT JOIN FormFields ff 
-            ON ff.form_id = f.form_id
-        LEFT JOIN FormResponses fr 
-            ON fr.submission_id = ls.submission_id AND fr.field_id = ff.field_id
-        GROUP BY 
-            p.id, p.first_name, p.last_name,
-            f.form_id, f.form_name,
-            fs.status, fs.due_date, fs.email_sent, fs.sms_sent, fs.created, fs.location
+        {completion_summary.completion_source("p.id", "f.form_id")}
         ORDER BY fs.created DESC, p.created_on DESC;
     """
     results = fetch_all(query)
@@ -146,15 +530,10 @@ def get_home_data_flat():
 #GET /home/data_grouped (patient -> forms[])
 @homepage_bp.route("/home/data_grouped", methods=["GET"])
 def get_home_data_grouped():
-    query = """
-        WITH LatestSubmission AS (
-            SELECT
-                submission_id,
-                form_id,
-                patient_id,
-                ROW_NUMBER() OVER (PARTITION BY form_id, patient_id ORDER BY submitted_at DESC) AS rn
-            FROM FormSubmissions
-        )
+    if _wants_page(request.args):
+        return _home_data_grouped_page()
+
+    query = f"""
         SELECT
             p.id AS patient_id,
             p.first_name + ' ' + p.last_name AS patient_name,
@@ -167,29 +546,13 @@ def get_home_data_grouped():
             fs.sms_sent,
             fs.created AS form_created,
             fs.location,
-            COUNT(ff.field_id) AS total_fields,
-            COUNT(
-                CASE
-                    WHEN fr.response_value IS NOT NULL AND LTRIM(RTRIM(fr.response_value)) <> ''
-                    THEN 1 END
-            ) AS answered_fields,
-            CAST(
-                (100.0 * COUNT(
-                    CASE
-                        WHEN fr.response_value IS NOT NULL AND LTRIM(RTRIM(fr.response_value)) <> ''
-                        THEN 1 END
-                )) / NULLIF(COUNT(ff.field_id), 0) AS DECIMAL(5,2)
-            ) AS completion_percentage
+            cs.total_fields,
+            cs.answered_fields,
+            cs.completion AS completion_percentage
         FROM patients p
         LEFT JOIN form_status fs ON p.id = fs.patient_id
         LEFT JOIN forms f ON fs.form_id = f.form_id
-        LEFT JOIN LatestSubmission ls ON ls.form_id = f.form_id AND ls.patient_id = p.id AND ls.rn = 1
-        LEFT JOIN FormFields ff ON ff.form_id = f.form_id
-        LEFT JOIN FormResponses fr ON fr.submission_id = ls.submission_id AND fr.field_id = ff.field_id
-        GROUP BY
-            p.id, p.first_name, p.last_name, p.created_on,
-            f.form_id, f.form_name,
-            fs.status, fs.due_date, fs.email_sent, fs.sms_sent, fs.created, fs.location
+        {completion_summary.completion_source("p.id", "f.form_id")}
         ORDER BY p.created_on DESC;
     """
     results = fetch_all(query)
@@ -246,6 +609,8 @@ def create_form():
     if not name or not fields:
         return jsonify({"error": "Template name and fields required"}), 400
  
+    # schema / first backfill on its own connection BEFORE our transaction holds row locks
+    completion_summary.prepare()
     conn, cursor = get_cursor()
     try:
         # Insert form and get new form_id
@@ -271,6 +636,7 @@ def create_form():
                 (field_id, new_form_id, field_label, field_type)
             )
  
+        completion_summary.refresh_form(new_form_id, cursor)
         conn.commit()
         return jsonify({
             "message": "Template and fields saved successfully",
@@ -296,33 +662,15 @@ def assign_forms():
     if not patient_id or not form_ids:
         return jsonify({"error": "Missing patientId or formIds"}), 400
 
-    for fid in form_ids:
-        execute_query(
-            """
-            MERGE form_status AS target
-            USING (SELECT ? AS patient_id, ? AS form_id) AS source
-            ON (target.patient_id = source.patient_id AND target.form_id = source.form_id)
-            WHEN MATCHED THEN
-                UPDATE SET 
-                    status = ?, 
-                    due_date = ?, 
-                    location = ?
-            WHEN NOT MATCHED THEN
-                INSERT (patient_id, form_id, status, due_date, created, location)
-                VALUES (source.patient_id, source.form_id, ?, ?, GETDATE(), ?);
-            """,
-            (
-                patient_id,
-                fid,
-                "Active",
-                data.get("dueDate"),
-                data.get("location", "GIA HR"),
-                "Active",
-                data.get("dueDate"),
-                data.get("location", "GIA HR"),
-            ),
-            commit=True,
-        )
+    # One staged MERGE for all forms (status/due_date/location overwritten on existing rows)
+    form_assignment.bulk_assign(
+        form_assignment.pairs(
+            [patient_id], form_ids,
+            due_date=data.get("dueDate"),
+            location=data.get("location", "GIA HR"),
+        ),
+        on_match=("status", "due_date", "location"),
+    )
 
     return jsonify({"message": "Forms assigned successfully"})
 
@@ -418,40 +766,23 @@ def get_form_details(form_id):
 #GET /home/patient_forms/<patient_id>
 @homepage_bp.route("/home/patient_forms/<int:patient_id>", methods=["GET"])
 def get_patient_forms(patient_id):
-    query = """
-        WITH LatestSubmission AS (
-            SELECT 
-                submission_id,
-                form_id,
-                patient_id,
-                ROW_NUMBER() OVER (PARTITION BY form_id, patient_id ORDER BY submitted_at DESC) AS rn
-            FROM FormSubmissions
-        )
+    # Pairs never submitted have no summary row yet: 0 answered out of the form's field count
+    query = f"""
         SELECT 
             f.form_id,
             f.form_name,
             fs.status,
             fs.due_date,
             fs.location,
-            COUNT(ff.field_id) AS total_fields,
-            COUNT(
-                CASE 
-                    WHEN fr.response_value IS NOT NULL AND LTRIM(RTRIM(fr.response_value)) <> '' 
-                    THEN 1 END
-            ) AS answered_fields,
-            CAST(
-                (100.0 * COUNT(
-                    CASE 
-                        WHEN fr.response_value IS NOT NULL AND LTRIM(RTRIM(fr.response_value)) <> '' 
-                        THEN 1 END
-                )) / NULLIF(COUNT(ff.field_id), 0) AS DECIMAL(5,2)
-            ) AS completion_percentage
+            COALESCE(
+                cs.total_fields,
+                (SELECT COUNT(*) FROM FormFields ff WHERE ff.form_id = f.form_id)
+            ) AS total_fields,
+            ISNULL(cs.answered_fields, 0) AS answered_fields,
+            cs.completion AS completion_percentage
         FROM forms f
         JOIN form_status fs ON fs.form_id = f.form_id AND fs.patient_id = ?
-        LEFT JOIN LatestSubmission ls ON ls.form_id = f.form_id AND ls.patient_id = fs.patient_id AND ls.rn = 1
-        LEFT JOIN FormFields ff ON ff.form_id = f.form_id
-        LEFT JOIN FormResponses fr ON fr.submission_id = ls.submission_id AND fr.field_id = ff.field_id
-        GROUP BY f.form_id, f.form_name, fs.status, fs.due_date, fs.location;
+        {completion_summary.completion_source("fs.patient_id", "f.form_id")};
     """
     rows = fetch_all(query, (patient_id,))
     for r in rows:
@@ -569,6 +900,9 @@ def update_form(form_id):
                     commit=True,
                 )
 
+        completion_summary.refresh_pair(patient_id, form_id)
+        pdf_cache.invalidate_patient(patient_id)
+
         #Recalculate completion
         completion = 0
         comp = fetch_all(
@@ -615,6 +949,8 @@ def send_forms():
     form_ids = [str(f.get("id") or f.get("formId") or f.get("form_id")) for f in forms]
     qr_tokens = {}
     updated_recipients = []
+    jobs = []
+    assignments = []
 
     for rec in recipients:
         patient_id = rec.get("patientId")
@@ -640,157 +976,68 @@ def send_forms():
         qr_url = url_for("homepage.fill_form_qr", token=qr_token, _external=True)
         qr_tokens[patient_id] = qr_url
 
-        # Ensure record exists
-        for fid in form_ids:
-            fid_int = int(float(fid))
-            rows_updated = execute_query(
-                "UPDATE form_status SET qr = ? WHERE patient_id = ? AND form_id = ?",
-                (qr_token, patient_id, fid_int),
-                commit=True,
-            )
-            if rows_updated == 0:
-                execute_query(
-                    """
-                    INSERT INTO form_status
-                      (patient_id, form_id, status, due_date, qr, created, location)
-                    VALUES (?, ?, 'Active', ?, ?, GETDATE(), ?)
-                    """,
-                    (patient_id, fid_int, due_iso, qr_token, loc),
-                    commit=True,
-                )
+        # Ensure record exists (applied for all recipients at once below)
+        assignments.extend(form_assignment.pairs(
+            [patient_id], form_ids, due_date=due_iso, location=loc, qr=qr_token))
 
-        recipient_log = {"name": name, "emailSent": None, "smsSent": None, "error": None, "hint": None}
+        recipient_log = {
+            "name": name, "emailSent": None, "smsSent": None,
+            "error": None, "hint": None, "status": "skipped",
+        }
 
-        # ---------------- EMAIL DELIVERY ----------------
+        # ---------------- EMAIL / SMS: queued for the delivery workers ----------------
         if delivery == "patient" and email:
-            try:
-                html_body = f"""
-                <div>
-                    <h2>GIA HR</h2>
-                    <p>Hello <b>{name}</b>,<br>
-                    You have been assigned {len(forms)} forms:</p>
-                    <p><a href="{qr_url}">Click here to fill your forms</a></p>
-                </div>
-                """
-                sender_email = os.getenv("SMTP_EMAIL", "vakashyamsundar8@gmail.com")
-                sender_password = os.getenv("SMTP_PASS", "jiss tsmp agkr aqdr")
-
-                msg = MIMEMultipart("alternative")
-                msg["From"] = sender_email
-                msg["To"] = email
-                msg["Subject"] = "Forms from GIA HR"
-                msg.attach(MIMEText(html_body, "html"))
-
-                with smtplib.SMTP("smtp.gmail.com", 587) as server:
-                    server.starttls()
-                    server.login(sender_email, sender_password)
-                    server.sendmail(sender_email, email, msg.as_string())
-
-                for fid in form_ids:
-                    fid_int = int(float(fid))
-                    execute_query(
-                        """
-                        UPDATE form_status
-                        SET email_sent = GETDATE(),
-                            due_date   = ?,
-                            location   = ?,
-                            status     = 'Active'
-                        WHERE patient_id = ? AND form_id = ?
-                        """,
-                        (due_iso, loc, patient_id, fid_int),
-                        commit=True,
-                    )
-
-                recipient_log["emailSent"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            except Exception as e:
-                recipient_log["error"] = "EMAIL_FAILED"
-                recipient_log["hint"] = str(e)
-                print(f"❌ Email failed for {email}: {e}")
-
-        # ---------------- SMS DELIVERY ----------------
+            jobs.append(delivery_service.build_email_job(
+                patient_id, name, email, qr_url, form_ids, due_iso, loc))
+            recipient_log["status"] = "queued"
+
         elif delivery == "sms" and phone:
-            try:
-                # Lazy import Twilio
-                try:
-                    from twilio.rest import Client
-                    from twilio.base.exceptions import TwilioRestException
-                except ImportError as e:
-                    current_app.logger.error("Twilio not installed: %s", e)
-                    abort(500, description="Twilio dependency missing.")
-
-                account_sid = os.getenv("TWILIO_ACCOUNT_SID", "")
-                auth_token = os.getenv("TWILIO_AUTH_TOKEN", "")
-                messaging_sid = os.getenv("TWILIO_MESSAGING_SERVICE_SID", "")
-                from_number = os.getenv("TWILIO_FROM", "+19786198530")
-
-                if not account_sid or not auth_token:
-                    abort(500, description="Twilio credentials not configured.")
-
-                message_body = f"""
-Hello {name},
-You have been assigned {len(forms)} forms by GIA HR.
-
-Open here: {qr_url}
-"""
-                client = Client(account_sid, auth_token)
-                to_number = to_e164(phone)
-
-                send_kwargs = {"body": message_body.strip(), "to": to_number}
-                if messaging_sid:
-                    send_kwargs["messaging_service_sid"] = messaging_sid
-                else:
-                    send_kwargs["from_"] = from_number
-
-                msg = client.messages.create(**send_kwargs)
-                print("✅ Twilio SID:", msg.sid, "Status:", msg.status)
-
-                for fid in form_ids:
-                    fid_int = int(float(fid))
-                    execute_query(
-                        """
-                        UPDATE form_status
-                        SET sms_sent = GETDATE(),
-                            due_date = ?,
-                            location = ?,
-                            status = 'Active'
-                        WHERE patient_id = ? AND form_id = ?
-                        """,
-                        (due_iso, loc, patient_id, fid_int),
-                        commit=True,
-                    )
-
-                recipient_log["smsSent"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            except Exception as e:
-                recipient_log["error"] = "SMS_FAILED"
-                recipient_log["hint"] = str(e)
-                print(f"❌ SMS failed for {phone}: {e}")
+            jobs.append(delivery_service.build_sms_job(
+                patient_id, name, phone, qr_url, form_ids, due_iso, loc))
+            recipient_log["status"] = "queued"
 
         # ---------------- OFFICE DELIVERY ----------------
+        # (due date / location / status are set by the MERGE below)
         elif delivery == "office":
-            for fid in form_ids:
-                fid_int = int(float(fid))
-                execute_query(
-                    """
-                    UPDATE form_status
-                    SET due_date = ?,
-                        location = ?,
-                        status = 'Active'
-                    WHERE patient_id = ? AND form_id = ?
-                    """,
-                    (due_iso, loc, patient_id, fid_int),
-                    commit=True,
-                )
+            recipient_log["status"] = "done"
 
         updated_recipients.append(recipient_log)
 
+    # One staged MERGE for every (recipient, form): new rows inserted, existing rows get the
+    # new QR token (plus due date / location / status for office delivery, which has no
+    # post-send update).
+    on_match = ("qr", "status", "due_date", "location") if delivery == "office" else ("qr",)
+    try:
+        form_assignment.bulk_assign(assignments, on_match=on_match)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"Could not assign forms: {e}"}), 500
+
+    batch_id = None
+    if jobs:
+        try:
+            batch_id = delivery_service.enqueue_batch(jobs)
+        except Exception as e:
+            traceback.print_exc()
+            return jsonify({"error": f"Could not queue deliveries: {e}"}), 500
+
     return jsonify({
-        "message": "Forms processed successfully",
+        "message": "Forms queued for delivery" if batch_id else "Forms processed successfully",
         "qr_tokens": qr_tokens,
         "delivery_method": delivery,
-        "recipients": updated_recipients
-    })
+        "recipients": updated_recipients,
+        "batchId": batch_id,
+        "statusUrl": url_for("homepage.send_forms_status", batch_id=batch_id) if batch_id else None,
+    }), 202 if batch_id else 200
+
+
+#GET /home/send_forms/<batch_id> (delivery progress for one send)
+@homepage_bp.route("/home/send_forms/<string:batch_id>", methods=["GET"])
+def send_forms_status(batch_id):
+    status = delivery_service.get_batch_status(batch_id)
+    if not status:
+        return jsonify({"error": "Batch not found"}), 404
+    return jsonify(status)
 
 
 # ========== QR REDIRECT ==========
@@ -847,12 +1094,9 @@ def archive_patients():
     if not patient_ids:
         return jsonify({"error": "No patientIds provided"}), 400
 
-    placeholders = ",".join(["?"] * len(patient_ids))
-    execute_query(
-        f"UPDATE form_status SET status = 'Archived' WHERE patient_id IN ({placeholders})",
-        tuple(patient_ids),
-        commit=True,
-    )
+    # chunked under the 2100-parameter cap, all chunks in one transaction
+    with db_cursor(commit=True) as (_conn, cur):
+        execute_in(cur, "UPDATE form_status SET status = 'Archived' WHERE patient_id IN {keys}", patient_ids)
     return jsonify({"message": f"{len(patient_ids)} patients archived"})
 
 
@@ -925,10 +1169,7 @@ def unarchive_patients():
     if not patient_ids:
         return jsonify({"error": "No patientIds provided"}), 400
 
-    placeholders = ",".join(["?"] * len(patient_ids))
-    execute_query(
-        f"UPDATE form_status SET status = 'Active' WHERE patient_id IN ({placeholders})",
-        tuple(patient_ids),
-        commit=True,
-    )
+    # chunked under the 2100-parameter cap, all chunks in one transaction
+    with db_cursor(commit=True) as (_conn, cur):
+        execute_in(cur, "UPDATE form_status SET status = 'Active' WHERE patient_id IN {keys}", patient_ids)
     return jsonify({"message": f"{len(patient_ids)} patients unarchived"})
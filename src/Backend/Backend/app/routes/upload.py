@@ -1,8 +1,10 @@
 # Backend/app/routes/upload.py
 from flask import Blueprint, request, jsonify
-from app.database import get_cursor
+from app.database import get_cursor, db_cursor, execute_in
+from app.services import upload_ingest, upload_store
 from datetime import datetime
 from uuid import UUID, uuid4
+import base64
 import json
 
 uploads_bp = Blueprint("uploads", __name__)  # register with url_prefix="/api"
@@ -25,68 +27,69 @@ def is_guid(s: str) -> bool:
     except Exception:
         return False
 
+# Paging for the metadata listing / row slices
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 500
+ROWS_DEFAULT_LIMIT = 200
+ROWS_MAX_LIMIT = 5000
+
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(token):
+    padded = token + "=" * (-len(token) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+
+def _int_arg(args, name, default, lo, hi):
+    try:
+        value = int(args.get(name) or default)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    return max(lo, min(value, hi))
+
 # ---------- core upsert routine (used by POST and PUT) ----------
 def _do_upsert(uid: str, payload: dict):
     """
     Executes an UPSERT for a single upload row.
-    Returns (ok: bool, id: str, err: str|None)
+    Returns (ok: bool, id: str, err: str|None, version: int|None)
     """
     # Validate required fields
     required = ["name", "source", "uploadedAt", "data"]
     missing = [k for k in required if k not in payload]
     if missing:
-        return False, uid, f"missing fields: {', '.join(missing)}"
+        return False, uid, f"missing fields: {', '.join(missing)}", None
 
     # Ensure GUID id
     use_uid = uid if is_guid(uid) else str(uuid4())
 
-    name      = payload["name"]
-    source    = payload["source"]
-    original  = payload.get("original")
-    uploaded  = parse_iso_dt(payload["uploadedAt"])
-    data      = payload["data"]
-    row_count = int(payload.get("rowCount", len(data) if isinstance(data, list) else 0) or 0)
-    data_json = json.dumps(data, ensure_ascii=False)
-
-    upsert_sql = """
-IF EXISTS (SELECT 1 FROM dbo.Uploads WHERE [UploadId] = ?)
-BEGIN
-  UPDATE dbo.Uploads
-     SET [Name] = ?, [Source] = ?, [Original] = ?, [UploadedAt] = ?, [RowCount] = ?, [IsSaved] = 1, [DataJson] = ?, [IsDeleted] = 0
-   WHERE [UploadId] = ?;
-END
-ELSE
-BEGIN
-  INSERT dbo.Uploads ([UploadId],[Name],[Source],[Original],[UploadedAt],[RowCount],[IsSaved],[DataJson])
-  VALUES (?,?,?,?,?,?,1,?);
-END
-"""
-
-    conn, cursor = get_cursor()
     try:
-        cursor.execute(
-            upsert_sql,
-            (
-                use_uid,                                # UPDATE check
-                name, source, original, uploaded, row_count, data_json, use_uid,  # UPDATE set
-                use_uid, name, source, original, uploaded, row_count, data_json   # INSERT values
-            ),
-        )
-        conn.commit()
-        return True, use_uid, None
+        with db_cursor(commit=True) as (_conn, cursor):
+            version = upload_store.save_upload(
+                cursor, use_uid,
+                payload["name"], payload["source"], payload.get("original"),
+                parse_iso_dt(payload["uploadedAt"]), payload["data"],
+            )
+        return True, use_uid, None, version
     except Exception as e:
-        return False, use_uid, str(e)
-    finally:
-        cursor.close()
-        conn.close()
+        return False, use_uid, str(e), None
 
 # ---------- routes ----------
 @uploads_bp.route("/uploads", methods=["GET"])
 def list_uploads():
+    """
+    Legacy: full rows including DataJson, as a JSON array.
+    With ?limit= / ?after= / ?meta=1: metadata only, keyset-paged:
+      {"items": [{id, name, source, original, uploadedAt, rowCount, isSaved}], "nextCursor", "limit"}
+    Rows are then fetched per upload from /uploads/<id>/rows.
+    """
     q_date = request.args.get("date")
     sort = (request.args.get("sort") or "desc").lower()
     include_deleted = (request.args.get("includeDeleted") or "false").lower() == "true"
 
+    if any(k in request.args for k in ("limit", "after", "meta")):
+        return _list_uploads_meta(q_date, sort, include_deleted)
+
     where = []
     params = []
 
@@ -105,38 +108,87 @@ def list_uploads():
     where_sql = ("WHERE " + " AND ".join(where)) if where else ""
 
     sql = f"""
-      SELECT [UploadId],[Name],[Source],[Original],[UploadedAt],[RowCount],[IsSaved],[DataJson]
+      SELECT [UploadId],[Name],[Source],[Original],[UploadedAt],[RowCount],[IsSaved],[Version],[DataJson],[StorageFormat]
       FROM dbo.Uploads
       {where_sql}
       ORDER BY [UploadedAt] {order}
     """
 
+    upload_store.ensure_schema()
     conn, cursor = get_cursor()
     try:
         cursor.execute(sql, params)
         rows = cursor.fetchall()
+        cols = [c[0] for c in cursor.description]
         out = []
         for r in rows:
-            item = rowify(cursor, r)
+            item = dict(zip(cols, r))
             if isinstance(item.get("UploadedAt"), datetime):
                 item["UploadedAt"] = item["UploadedAt"].isoformat()
-            try:
-                item["DataJson"] = json.loads(item["DataJson"])
-            except Exception:
-                pass
+            item["DataJson"] = upload_store.load_rows(
+                cursor, str(item["UploadId"]), item.pop("StorageFormat"), item["DataJson"])
             out.append(item)
         return jsonify(out)
     finally:
         cursor.close()
         conn.close()
 
+def _list_uploads_meta(q_date, sort, include_deleted):
+    args = request.args
+    try:
+        limit = _int_arg(args, "limit", PAGE_DEFAULT_LIMIT, 1, PAGE_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        on_date = datetime.fromisoformat(q_date) if q_date else None
+    except ValueError:
+        return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+
+    after = None
+    token = (args.get("after") or "").strip()
+    if token:
+        try:
+            after = _decode_cursor(token)
+            if not isinstance(after, list) or len(after) != 2:
+                raise ValueError
+            datetime.fromisoformat(after[0])
+        except Exception:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    items, next_key = upload_store.list_meta(
+        limit, after=after, descending=sort != "asc",
+        on_date=on_date, include_deleted=include_deleted,
+    )
+    return jsonify({
+        "items": items,
+        "nextCursor": _encode_cursor(list(next_key)) if next_key else None,
+        "limit": limit,
+    })
+
+@uploads_bp.route("/uploads/<uid>/rows", methods=["GET"])
+def get_upload_rows(uid):
+    """?offset=&limit= -> {"id", "offset", "limit", "total", "rows": [...]}"""
+    if not is_guid(uid):
+        return jsonify({"error": "not found"}), 404
+    try:
+        offset = _int_arg(request.args, "offset", 0, 0, 2**31 - 1)
+        limit = _int_arg(request.args, "limit", ROWS_DEFAULT_LIMIT, 1, ROWS_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    page = upload_store.read_rows(uid, offset, limit)
+    if page is None:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(page)
+
 @uploads_bp.route("/uploads/<uid>", methods=["GET"])
 def get_upload(uid):
     sql = """
-      SELECT [UploadId],[Name],[Source],[Original],[UploadedAt],[RowCount],[IsSaved],[DataJson]
+      SELECT [UploadId],[Name],[Source],[Original],[UploadedAt],[RowCount],[IsSaved],[Version],[DataJson],[StorageFormat]
       FROM dbo.Uploads
       WHERE [UploadId] = ? AND [IsDeleted] = 0
     """
+    upload_store.ensure_schema()
     conn, cursor = get_cursor()
     try:
         cursor.execute(sql, (uid,))
@@ -146,10 +198,8 @@ def get_upload(uid):
         item = rowify(cursor, row)
         if isinstance(item.get("UploadedAt"), datetime):
             item["UploadedAt"] = item["UploadedAt"].isoformat()
-        try:
-            item["DataJson"] = json.loads(item["DataJson"])
-        except Exception:
-            pass
+        item["DataJson"] = upload_store.load_rows(
+            cursor, str(item["UploadId"]), item.pop("StorageFormat"), item["DataJson"])
         return jsonify(item)
     finally:
         cursor.close()
@@ -168,10 +218,47 @@ def upsert_upload():
     uid_in = str(body.get("id", "")).strip()
     uid = uid_in if is_guid(uid_in) else str(uuid4())
 
-    ok, final_id, err = _do_upsert(uid, body)
+    ok, final_id, err, version = _do_upsert(uid, body)
     if not ok:
         return jsonify({"error": err}), 400
-    return jsonify({"ok": True, "id": final_id})
+    return jsonify({"ok": True, "id": final_id, "version": version})
+
+@uploads_bp.route("/uploads/import", methods=["POST"])
+def import_upload():
+    """
+    Streaming import for large datasets; the body is never buffered whole.
+    Metadata in the query string: ?id=&name=&source=&original=&uploadedAt=
+    Body: NDJSON (application/x-ndjson), CSV with a header row (text/csv) or a JSON array
+    of row objects (application/json); ?format=ndjson|csv|json overrides the Content-Type.
+    Replaces the upload's rows -> {"ok", "id", "version", "rowCount", "bytes"}; 413 past UPLOAD_MAX_BYTES.
+    """
+    args = request.args
+    fmt = upload_ingest.detect_format(request.content_type, args.get("format"))
+    if not fmt:
+        return jsonify({"error": "body must be NDJSON, CSV or a JSON array (see format=)"}), 415
+    missing = [k for k in ("name", "source") if not args.get(k)]
+    if missing:
+        return jsonify({"error": f"missing fields: {', '.join(missing)}"}), 400
+    try:
+        uploaded = parse_iso_dt(args["uploadedAt"]) if args.get("uploadedAt") else datetime.now()
+    except ValueError:
+        return jsonify({"error": "uploadedAt must be an ISO date/time"}), 400
+    uid_in = (args.get("id") or "").strip()
+    uid = uid_in if is_guid(uid_in) else str(uuid4())
+
+    try:
+        result = upload_ingest.ingest(
+            request.stream, fmt, uid, args["name"], args["source"], args.get("original"),
+            uploaded, content_length=request.content_length,
+        )
+    except upload_ingest.PayloadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"[ERROR] POST /api/uploads/import: {e}")
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"ok": True, **result})
 
 @uploads_bp.route("/uploads/<uid>", methods=["PUT"])
 def update_upload(uid):
@@ -185,53 +272,57 @@ def update_upload(uid):
     if missing:
         return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
 
-    # Extract data
-    name = body["name"]
-    source = body["source"]
-    original = body.get("original")
-    uploaded = parse_iso_dt(body["uploadedAt"])
-    data = body["data"]
-    row_count = int(body.get("rowCount", len(data) if isinstance(data, list) else 0) or 0)
-    data_json = json.dumps(data, ensure_ascii=False)
-
-    # SQL UPSERT logic
-    upsert_sql = """
-    IF EXISTS (SELECT 1 FROM dbo.Uploads WHERE [UploadId] = ?)
-    BEGIN
-      UPDATE dbo.Uploads
-         SET [Name] = ?, [Source] = ?, [Original] = ?, [UploadedAt] = ?, 
-             [RowCount] = ?, [IsSaved] = 1, [DataJson] = ?, [IsDeleted] = 0
-       WHERE [UploadId] = ?;
-    END
-    ELSE
-    BEGIN
-      INSERT dbo.Uploads ([UploadId],[Name],[Source],[Original],[UploadedAt],
-                          [RowCount],[IsSaved],[DataJson])
-      VALUES (?,?,?,?,?,?,1,?);
-    END
-    """
-
-    # Execute upsert
-    conn, cursor = get_cursor()
     try:
-        cursor.execute(
-            upsert_sql,
-            (
-                uid_final,  # UPDATE check
-                name, source, original, uploaded, row_count, data_json, uid_final,  # UPDATE set
-                uid_final, name, source, original, uploaded, row_count, data_json   # INSERT values
-            ),
-        )
-        conn.commit()
-        return jsonify({"ok": True, "id": uid_final}), 200
+        with db_cursor(commit=True) as (_conn, cursor):
+            version = upload_store.save_upload(
+                cursor, uid_final,
+                body["name"], body["source"], body.get("original"),
+                parse_iso_dt(body["uploadedAt"]), body["data"],
+            )
+        return jsonify({"ok": True, "id": uid_final, "version": version}), 200
     except Exception as e:
         # Minimal log (safe for prod)
         print(f"[ERROR] PUT /api/uploads/{uid_final}: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
+@uploads_bp.route("/uploads/<uid>", methods=["PATCH"])
+def patch_upload(uid):
+    """
+    Row-level edits instead of re-sending the whole dataset.
+    Body:
+    {
+      "version": 3,                                  # version the edits were made against
+      "updates": [{"index": 5, "set": {"Email": "a@b.c"}}, {"index": 6, "row": {...}}],
+      "deletes": [7, 9],
+      "inserts": [{"row": {...}}, {"at": 2, "row": {...}}]
+    }
+    Indexes are positions at `version`. -> {"ok", "id", "version", "rowCount"};
+    409 with currentVersion when someone saved in between.
+    """
+    if not is_guid(uid):
+        return jsonify({"error": "not found"}), 404
+    body = request.get_json(silent=True) or {}
+    version = body.get("version")
+    if isinstance(version, bool) or not isinstance(version, int):
+        return jsonify({"error": "version (integer) is required"}), 400
+    ops = {}
+    for key in ("updates", "deletes", "inserts"):
+        ops[key] = body.get(key) or []
+        if not isinstance(ops[key], list):
+            return jsonify({"error": f"{key} must be a list"}), 400
+
+    try:
+        result = upload_store.apply_patch(uid, version, **ops)
+    except upload_store.VersionConflict as conflict:
+        return jsonify({"error": str(conflict), "currentVersion": conflict.current}), 409
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        print(f"[ERROR] PATCH /api/uploads/{uid}: {e}")
+        return jsonify({"error": str(e)}), 500
+    if result is None:
+        return jsonify({"error": "not found"}), 404
+    return jsonify({"ok": True, **result})
 
 
 @uploads_bp.route("/uploads", methods=["DELETE"])
@@ -249,14 +340,8 @@ def delete_uploads():
     if not ids:
         return jsonify({"error": "no valid guid ids"}), 400
 
-    placeholders = ",".join(["?"] * len(ids))
-    sql = f"UPDATE dbo.Uploads SET [IsDeleted] = 1 WHERE [UploadId] IN ({placeholders})"
+    sql = "UPDATE dbo.Uploads SET [IsDeleted] = 1 WHERE [UploadId] IN {keys}"
 
-    conn, cursor = get_cursor()
-    try:
-        cursor.execute(sql, ids)
-        conn.commit()
-        return jsonify({"ok": True, "deleted": len(ids)})
-    finally:
-        cursor.close()
-        conn.close()
+    with db_cursor(commit=True) as (_conn, cursor):
+        execute_in(cursor, sql, ids)
+    return jsonify({"ok": True, "deleted": len(ids)})
@@ -0,0 +1,503 @@
+# Backend/app/services/analytics_rollup.py
+# Per-day, per-location counts behind the analytics dashboard.
+# - dbo.AnalyticsDailyRollup: one row per (day, location) with forms assigned / completed /
+#   completed within 24h (keyed on form_status.created) and new patients (patients.created_on;
+#   patients have no location, so they land on location N'')
+# - refresh() materializes every day before today: new days, days whose form_status rows changed
+#   since the last run (rowversion), and a trailing ANALYTICS_ROLLUP_RECHECK_DAYS window that
+#   also picks up deletes; `--full` / rebuild() recomputes everything
+# - readers sum the rollup for materialized days and count the rest (today, or anything not
+#   rolled up yet) live from the base tables, so results never depend on the job having run;
+#   a rollup not refreshed for ANALYTICS_ROLLUP_MAX_AGE_SECS (3 ticks) is ignored altogether,
+#   since changes to already-rolled days would otherwise never show up
+# - form_series(): the same counts bucketed by day / week / month, optionally per location or form
+# Run it in-process (ANALYTICS_ROLLUP_IN_PROCESS=1) or from cron via `flask refresh-analytics-rollup`
+# (then set ANALYTICS_ROLLUP_MAX_AGE_SECS above the cron interval).
+# refresh() needs the form_status rowversion from `flask migrate-form-status` (form_status_version),
+# which also builds the range indexes; until then readers count everything live.
+from __future__ import annotations
+
+import datetime
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..database import db_cursor
+from . import form_status_version
+
+ROLLUP_TICK_SECS = float(os.getenv("ANALYTICS_ROLLUP_TICK_SECS", "300"))
+ROLLUP_MAX_AGE_SECS = float(os.getenv("ANALYTICS_ROLLUP_MAX_AGE_SECS", str(3 * ROLLUP_TICK_SECS)))
+ROLLUP_RECHECK_DAYS = int(os.getenv("ANALYTICS_ROLLUP_RECHECK_DAYS", "7"))
+ROLLUP_IN_PROCESS = os.getenv("ANALYTICS_ROLLUP_IN_PROCESS", "0").lower() in ("1", "true", "yes", "on")
+
+FORM_COUNTS = ("total_forms", "assigned", "completed", "within24_completed")
+
+_DDL = """
+IF OBJECT_ID('dbo.AnalyticsDailyRollup', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.AnalyticsDailyRollup (
+        day                 DATE           NOT NULL,
+        location            NVARCHAR(255)  NOT NULL,
+        total_forms         INT            NOT NULL,
+        assigned            INT            NOT NULL,
+        completed           INT            NOT NULL,
+        within24_completed  INT            NOT NULL,
+        new_patients        INT            NOT NULL,
+        refreshed_at        DATETIME2      NOT NULL CONSTRAINT DF_ADR_refreshed DEFAULT SYSUTCDATETIME(),
+        CONSTRAINT PK_AnalyticsDailyRollup PRIMARY KEY (day, location)
+    );
+END
+
+IF OBJECT_ID('dbo.AnalyticsRollupState', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.AnalyticsRollupState (
+        id              TINYINT    NOT NULL CONSTRAINT PK_AnalyticsRollupState PRIMARY KEY
+                                   CONSTRAINT CK_AnalyticsRollupState_single CHECK (id = 1),
+        rolled_through  DATE       NULL,
+        status_version  BINARY(8)  NULL,
+        refreshed_at    DATETIME2  NULL
+    );
+    INSERT INTO dbo.AnalyticsRollupState (id) VALUES (1);
+END
+"""
+
+# range indexes on the base tables; built by form_status_version.migrate()
+_INDEX_DDL = """
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE name = 'IX_form_status_created' AND object_id = OBJECT_ID('dbo.form_status'))
+    CREATE INDEX IX_form_status_created ON dbo.form_status (created) INCLUDE (status, due_date, location);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE name = 'IX_patients_created_on' AND object_id = OBJECT_ID('dbo.patients'))
+    CREATE INDEX IX_patients_created_on ON dbo.patients (created_on);
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE name = 'IX_form_status_version_created' AND object_id = OBJECT_ID('dbo.form_status'))
+    CREATE INDEX IX_form_status_version_created ON dbo.form_status ({version_col}) INCLUDE (created);
+"""
+
+_SCHEMA_READY = False
+_SCHEMA_LOCK = threading.Lock()
+
+# {form_days} / {patient_days} / {rollup_days} optionally narrow the [lo, hi) range to #rollup_days
+_MERGE_TEMPLATE = """
+WITH forms_by_day AS (
+    SELECT CAST(fs.created AS DATE) AS day, ISNULL(fs.location, N'') AS location,
+           COUNT(*) AS total_forms,
+           SUM(CASE WHEN fs.status IN ('Active','Not Started') THEN 1 ELSE 0 END) AS assigned,
+           SUM(CASE WHEN fs.status = 'Completed' THEN 1 ELSE 0 END) AS completed,
+           SUM(CASE WHEN fs.status = 'Completed'
+                     AND DATEDIFF(HOUR, fs.created, fs.due_date) <= 24 THEN 1 ELSE 0 END) AS within24_completed
+    FROM dbo.form_status AS fs
+    WHERE fs.created >= ? AND fs.created < ? {form_days}
+    GROUP BY CAST(fs.created AS DATE), ISNULL(fs.location, N'')
+), patients_by_day AS (
+    SELECT CAST(pt.created_on AS DATE) AS day, N'' AS location, COUNT(*) AS new_patients
+    FROM dbo.patients AS pt
+    WHERE pt.created_on >= ? AND pt.created_on < ? {patient_days}
+    GROUP BY CAST(pt.created_on AS DATE)
+)
+MERGE dbo.AnalyticsDailyRollup WITH (HOLDLOCK) AS t
+USING (
+    SELECT COALESCE(f.day, p.day) AS day,
+           COALESCE(f.location, p.location) AS location,
+           ISNULL(f.total_forms, 0) AS total_forms,
+           ISNULL(f.assigned, 0) AS assigned,
+           ISNULL(f.completed, 0) AS completed,
+           ISNULL(f.within24_completed, 0) AS within24_completed,
+           ISNULL(p.new_patients, 0) AS new_patients
+    FROM forms_by_day AS f
+    FULL JOIN patients_by_day AS p ON p.day = f.day AND p.location = f.location
+) AS src
+ON t.day = src.day AND t.location = src.location
+WHEN MATCHED THEN
+    UPDATE SET total_forms = src.total_forms, assigned = src.assigned, completed = src.completed,
+               within24_completed = src.within24_completed, new_patients = src.new_patients,
+               refreshed_at = SYSUTCDATETIME()
+WHEN NOT MATCHED BY TARGET THEN
+    INSERT (day, location, total_forms, assigned, completed, within24_completed, new_patients)
+    VALUES (src.day, src.location, src.total_forms, src.assigned, src.completed,
+            src.within24_completed, src.new_patients)
+WHEN NOT MATCHED BY SOURCE AND t.day >= ? AND t.day < ? {rollup_days} THEN
+    DELETE;
+"""
+
+_DAY_FILTERS = {
+    "form_days": "AND CAST(fs.created AS DATE) IN (SELECT day FROM #rollup_days)",
+    "patient_days": "AND CAST(pt.created_on AS DATE) IN (SELECT day FROM #rollup_days)",
+    "rollup_days": "AND t.day IN (SELECT day FROM #rollup_days)",
+}
+
+# 1900-01-01: lower bound for full rebuilds
+_EPOCH = datetime.date(1900, 1, 1)
+
+
+def ensure_schema() -> None:
+    """Rollup + state tables; once per process."""
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+    with _SCHEMA_LOCK:
+        if _SCHEMA_READY:
+            return
+        with db_cursor(commit=True) as (_conn, cur):
+            cur.execute(_DDL)
+        _SCHEMA_READY = True
+
+
+def create_indexes(cur, version_col: str) -> None:
+    cur.execute(_INDEX_DDL.format(version_col=version_col))
+
+
+# ---------- refresh ----------
+
+def _as_dt(day: datetime.date) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time())
+
+
+def _merge(cur, lo: datetime.date, hi: datetime.date, staged_days: bool = False) -> int:
+    """Recompute rollup rows for days in [lo, hi) (only #rollup_days of them when staged_days)."""
+    sql = _MERGE_TEMPLATE.format(**{k: (v if staged_days else "") for k, v in _DAY_FILTERS.items()})
+    cur.execute(sql, (_as_dt(lo), _as_dt(hi), _as_dt(lo), _as_dt(hi), lo, hi))
+    return cur.rowcount
+
+
+def _merge_changed_days(cur, version_col: str, since_version: bytes, upper_version: bytes,
+                        before: datetime.date) -> int:
+    """Recompute already-rolled days (< before) holding form_status rows changed in [since, upper)."""
+    # created without parameters so the temp table outlives the statement (sp_executesql scope)
+    cur.execute(
+        "IF OBJECT_ID('tempdb..#rollup_days') IS NOT NULL DROP TABLE #rollup_days; "
+        "CREATE TABLE #rollup_days (day DATE NOT NULL PRIMARY KEY);"
+    )
+    try:
+        cur.execute(f"""
+            INSERT INTO #rollup_days (day)
+            SELECT DISTINCT CAST(created AS DATE)
+            FROM dbo.form_status
+            WHERE {version_col} >= ? AND {version_col} < ? AND created < ?
+        """, (since_version, upper_version, _as_dt(before)))
+        cur.execute("SELECT MIN(day), MAX(day), COUNT(*) FROM #rollup_days")
+        lo, hi, count = cur.fetchone()
+        if not count:
+            return 0
+        _merge(cur, lo, hi + datetime.timedelta(days=1), staged_days=True)
+        return int(count)
+    finally:
+        cur.execute("IF OBJECT_ID('tempdb..#rollup_days') IS NOT NULL DROP TABLE #rollup_days;")
+
+
+def refresh(full: bool = False) -> Dict[str, Any]:
+    """
+    Bring the rollup up to yesterday. Returns {"rolledThrough", "days", "changedDays", "full"}.
+    Concurrent refreshes serialize on the state row.
+    """
+    ensure_schema()
+    with db_cursor(commit=True) as (_conn, cur):
+        version_col = form_status_version.require(cur)
+        cur.execute("""
+            SELECT rolled_through, status_version, CAST(GETDATE() AS DATE), MIN_ACTIVE_ROWVERSION()
+            FROM dbo.AnalyticsRollupState WITH (UPDLOCK, HOLDLOCK)
+            WHERE id = 1
+        """)
+        rolled, since_version, today, upper_version = cur.fetchone()
+        upper_version = bytes(upper_version)
+        full = full or rolled is None or since_version is None
+
+        changed = 0
+        if full:
+            lo = _EPOCH
+        else:
+            changed = _merge_changed_days(cur, version_col, bytes(since_version), upper_version,
+                                          rolled - datetime.timedelta(days=ROLLUP_RECHECK_DAYS - 1))
+            lo = min(rolled + datetime.timedelta(days=1),
+                     rolled - datetime.timedelta(days=ROLLUP_RECHECK_DAYS - 1))
+        if lo < today:
+            _merge(cur, lo, today)
+
+        yesterday = today - datetime.timedelta(days=1)
+        cur.execute("""
+            UPDATE dbo.AnalyticsRollupState
+               SET rolled_through = ?, status_version = ?, refreshed_at = SYSUTCDATETIME()
+             WHERE id = 1
+        """, (yesterday, upper_version))
+
+    days = (today - lo).days if not full else None
+    print(f"[Analytics Rollup] rolled through {yesterday} ({'full rebuild' if full else f'{days} recent day(s)'}"
+          f", {changed} changed day(s))")
+    return {"rolledThrough": yesterday.isoformat(), "days": days, "changedDays": changed, "full": full}
+
+
+def rebuild() -> Dict[str, Any]:
+    return refresh(full=True)
+
+
+# ---------- reads ----------
+
+def rolled_through(cur, max_age_secs: float = ROLLUP_MAX_AGE_SECS) -> Optional[datetime.date]:
+    """Last materialized day, or None when the rollup is missing or older than max_age_secs."""
+    cur.execute("""
+        SELECT rolled_through
+        FROM dbo.AnalyticsRollupState
+        WHERE id = 1 AND refreshed_at >= DATEADD(second, ?, SYSUTCDATETIME())
+    """, (-int(max_age_secs),))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def split_range(cur, start: datetime.date, end: datetime.date) -> Tuple[datetime.date, datetime.date]:
+    """
+    [start, end) -> (start, cut): days in [start, cut) come from the rollup,
+    [cut, end) must be counted live.
+    """
+    ensure_schema()
+    rolled = rolled_through(cur)
+    boundary = rolled + datetime.timedelta(days=1) if rolled else start
+    return start, min(max(boundary, start), end)
+
+
+def form_totals(cur, start: datetime.date, end: datetime.date) -> Dict[str, int]:
+    """total_forms / assigned / completed / within24_completed for forms created in [start, end)."""
+    totals = dict.fromkeys(FORM_COUNTS, 0)
+    start, cut = split_range(cur, start, end)
+    parts = []
+    if start < cut:
+        cur.execute("""
+            SELECT SUM(total_forms), SUM(assigned), SUM(completed), SUM(within24_completed)
+            FROM dbo.AnalyticsDailyRollup
+            WHERE day >= ? AND day < ?
+        """, (start, cut))
+        parts.append(cur.fetchone())
+    if cut < end:
+        cur.execute("""
+            SELECT
+                COUNT(*),
+                SUM(CASE WHEN status IN ('Active','Not Started') THEN 1 ELSE 0 END),
+                SUM(CASE WHEN status = 'Completed' THEN 1 ELSE 0 END),
+                SUM(CASE WHEN status = 'Completed'
+                         AND DATEDIFF(HOUR, created, due_date) <= 24 THEN 1 ELSE 0 END)
+            FROM dbo.form_status
+            WHERE created >= ? AND created < ?
+        """, (_as_dt(cut), _as_dt(end)))
+        parts.append(cur.fetchone())
+    for row in parts:
+        for key, value in zip(FORM_COUNTS, row or ()):
+            totals[key] += int(value or 0)
+    return totals
+
+
+def new_patients(cur, start: datetime.date, end: datetime.date) -> int:
+    """Patients created in [start, end)."""
+    start, cut = split_range(cur, start, end)
+    total = 0
+    if start < cut:
+        cur.execute("SELECT SUM(new_patients) FROM dbo.AnalyticsDailyRollup WHERE day >= ? AND day < ?",
+                    (start, cut))
+        total += int(cur.fetchone()[0] or 0)
+    if cut < end:
+        cur.execute("SELECT COUNT(*) FROM dbo.patients WHERE created_on >= ? AND created_on < ?",
+                    (_as_dt(cut), _as_dt(end)))
+        total += int(cur.fetchone()[0] or 0)
+    return total
+
+
+# ---------- series ----------
+
+GRANULARITIES = ("day", "week", "month")
+GROUP_BYS = ("location", "form")
+SERIES_MAX_BUCKETS = int(os.getenv("ANALYTICS_SERIES_MAX_BUCKETS", "1000"))
+
+# bucket start for a DATE expression; weeks start on Monday whatever @@DATEFIRST is
+_BUCKET_SQL = {
+    "day": "{d}",
+    "week": "DATEADD(day, -((DATEPART(weekday, {d}) + @@DATEFIRST - 2) % 7), {d})",
+    "month": "DATEFROMPARTS(YEAR({d}), MONTH({d}), 1)",
+}
+
+_LIVE_COUNTS = """
+    COUNT(*) AS total_forms,
+    SUM(CASE WHEN fs.status IN ('Active','Not Started') THEN 1 ELSE 0 END) AS assigned,
+    SUM(CASE WHEN fs.status = 'Completed' THEN 1 ELSE 0 END) AS completed,
+    SUM(CASE WHEN fs.status = 'Completed'
+             AND DATEDIFF(HOUR, fs.created, fs.due_date) <= 24 THEN 1 ELSE 0 END) AS within24_completed
+"""
+
+
+def bucket_start(day: datetime.date, granularity: str) -> datetime.date:
+    if granularity == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def buckets(start: datetime.date, end: datetime.date, granularity: str) -> List[datetime.date]:
+    """Every bucket start touching [start, end), in order."""
+    out: List[datetime.date] = []
+    b = bucket_start(start, granularity)
+    while b < end:
+        out.append(b)
+        if granularity == "month":
+            b = (b.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        else:
+            b += datetime.timedelta(days=7 if granularity == "week" else 1)
+    return out
+
+
+def _series_sql(cur, start: datetime.date, end: datetime.date, granularity: str,
+                group_by: Optional[str]) -> Tuple[str, List[Any]]:
+    """One grouped SELECT of (bucket, key, label, counts...) for forms created in [start, end)."""
+    if group_by == "form":
+        # per-form counts are not rolled up: one grouped scan of the created range
+        bucket = _BUCKET_SQL[granularity].format(d="CAST(fs.created AS DATE)")
+        return f"""
+            SELECT {bucket} AS bucket,
+                   CAST(fs.form_id AS NVARCHAR(50)) AS series_key,
+                   MAX(f.form_name) AS label,
+                   {_LIVE_COUNTS}
+            FROM dbo.form_status AS fs
+            LEFT JOIN dbo.forms AS f ON f.form_id = fs.form_id
+            WHERE fs.created >= ? AND fs.created < ?
+            GROUP BY {bucket}, fs.form_id
+        """, [_as_dt(start), _as_dt(end)]
+
+    # rollup days + live rows for the rest, re-bucketed together
+    start, cut = split_range(cur, start, end)
+    key = "location" if group_by == "location" else "N''"
+    bucket = _BUCKET_SQL[granularity].format(d="day")
+    return f"""
+        WITH days AS (
+            SELECT day, location, total_forms, assigned, completed, within24_completed
+            FROM dbo.AnalyticsDailyRollup
+            WHERE day >= ? AND day < ? AND total_forms > 0
+            UNION ALL
+            SELECT CAST(fs.created AS DATE) AS day, ISNULL(fs.location, N'') AS location,
+                   {_LIVE_COUNTS}
+            FROM dbo.form_status AS fs
+            WHERE fs.created >= ? AND fs.created < ?
+            GROUP BY CAST(fs.created AS DATE), ISNULL(fs.location, N'')
+        )
+        SELECT {bucket} AS bucket, {key} AS series_key, {key} AS label,
+               SUM(total_forms) AS total_forms, SUM(assigned) AS assigned,
+               SUM(completed) AS completed, SUM(within24_completed) AS within24_completed
+        FROM days
+        GROUP BY {bucket}, {key}
+    """, [start, cut, _as_dt(cut), _as_dt(end)]
+
+
+def _point(row: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    row = row or {}
+    return {
+        "Total": int(row.get("total_forms") or 0),
+        "Assigned": int(row.get("assigned") or 0),
+        "Completed": int(row.get("completed") or 0),
+        "Within24_Completed": int(row.get("within24_completed") or 0),
+    }
+
+
+def form_series(cur, start: datetime.date, end: datetime.date, granularity: str = "day",
+                group_by: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Bucketed form counts for [start, end) in one query:
+      {"granularity", "groupBy", "buckets": [iso, ...],
+       "series": [{"key", "label", "points": [{"bucket", "Total", "Assigned", "Completed", "Within24_Completed"}]}]}
+    Every series has one point per bucket (zero-filled). Without group_by there is a single series.
+    ValueError for an unknown granularity / groupBy or too many buckets.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if group_by is not None and group_by not in GROUP_BYS:
+        raise ValueError(f"groupBy must be one of {', '.join(GROUP_BYS)}")
+    axis = buckets(start, end, granularity)
+    if len(axis) > SERIES_MAX_BUCKETS:
+        raise ValueError(f"Range has {len(axis)} {granularity} buckets (max {SERIES_MAX_BUCKETS})")
+
+    sql, params = _series_sql(cur, start, end, granularity, group_by)
+    cur.execute(sql, params)
+    cols = [c[0] for c in cur.description]
+
+    by_key: Dict[str, Dict[str, Any]] = {}
+    for r in cur.fetchall():
+        row = dict(zip(cols, r))
+        b = row["bucket"]
+        b = b.date() if isinstance(b, datetime.datetime) else b
+        entry = by_key.setdefault(row["series_key"], {"label": row["label"], "points": {}})
+        entry["points"][b] = row
+    if not by_key and group_by is None:
+        by_key[""] = {"label": "", "points": {}}
+
+    series = []
+    for key in sorted(by_key, key=lambda k: (str(by_key[k]["label"] or ""), k)):
+        entry = by_key[key]
+        label = entry["label"]
+        if group_by is None:
+            label = "All"
+        elif group_by == "location" and not label:
+            label = "Unassigned"
+        series.append({
+            "key": key if group_by else "all",
+            "label": label,
+            "points": [{"bucket": b.isoformat(), **_point(entry["points"].get(b))} for b in axis],
+        })
+    return {
+        "granularity": granularity,
+        "groupBy": group_by,
+        "buckets": [b.isoformat() for b in axis],
+        "series": series,
+    }
+
+
+# ---------- scheduler ----------
+
+class RollupScheduler:
+    """One daemon thread calling refresh() every tick_secs."""
+
+    def __init__(self, tick_secs: float = ROLLUP_TICK_SECS):
+        self.tick_secs = tick_secs
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="analytics-rollup", daemon=True)
+            self._thread.start()
+            print(f"[Analytics Rollup] scheduler started (every {self.tick_secs:.0f}s)")
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                refresh()
+            except Exception as e:
+                print(f"[Analytics Rollup] refresh failed: {e}")
+            self._stop.wait(self.tick_secs)
+
+
+_scheduler = RollupScheduler()
+
+
+def start_scheduler() -> None:
+    """Start this process's rollup thread when ANALYTICS_ROLLUP_IN_PROCESS is on (idempotent)."""
+    if ROLLUP_IN_PROCESS:
+        _scheduler.start()
+
+
+def _reset_after_fork():
+    global _scheduler
+    _scheduler = RollupScheduler()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
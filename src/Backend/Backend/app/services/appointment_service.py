@@ -0,0 +1,585 @@
+# Backend/app/services/appointment_service.py
+# Slot bookkeeping for dbo.Appointments.
+# - SpecialistKey: persisted, normalized (trimmed, lower-case) copy of Specialist
+# - UX_Appointments_Slot: UNIQUE (SpecialistKey, AppointmentDate, AppointmentTime); booking is a
+#   plain INSERT and a duplicate-key error means the slot is taken (no check-then-insert race)
+# - free_slots(): opening hours from dbo.locations, booked slots from ONE index range seek,
+#   folded into a per-day bitmap of slot_minutes-wide slots
+# - PatientEmailKey / PatientNameKey / StartsAt: persisted lookup keys so the patient portal's
+#   "my upcoming appointments" query seeks an index and pages by keyset (StartsAt, AppointmentID)
+# - ReminderSentAt: set when reminder_service queued the reminder; cleared on reschedule
+# - bulk_reschedule() / bulk_cancel(): many appointments in one transaction, conflicts found by
+#   one set-based query instead of a check + UPDATE + re-SELECT per appointment
+# The columns and indexes are added by an explicit migration (`flask migrate-appointments` ->
+# migrate()), never by a request. Until it has run, request paths inline the key expressions
+# (correct, but scans), book through the locked NOT EXISTS insert, and reminders refuse to run.
+from __future__ import annotations
+
+import datetime
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import pyodbc
+
+from ..database import KeyStage, db_cursor
+
+SLOT_MINUTES = int(os.getenv("APPOINTMENT_SLOT_MINUTES", "30"))
+AVAILABILITY_MAX_DAYS = int(os.getenv("AVAILABILITY_MAX_DAYS", "62"))
+DEFAULT_DAY_START = datetime.time(9, 0)
+DEFAULT_DAY_END = datetime.time(17, 0)
+
+MIGRATE_COMMAND = "flask migrate-appointments"
+
+# Persisted computed columns and their definitions; {t} is "" or a table alias + "."
+_COMPUTED = {
+    "SpecialistKey": "CAST(LOWER(LTRIM(RTRIM(ISNULL({t}Specialist, N'')))) AS NVARCHAR(200))",
+    "PatientEmailKey": "CAST(LOWER(LTRIM(RTRIM(ISNULL({t}PatientEmail, N'')))) AS NVARCHAR(320))",
+    "PatientNameKey": "CAST(LOWER(LTRIM(RTRIM(ISNULL({t}PatientName, N'')))) AS NVARCHAR(200))",
+    "StartsAt": "(CAST({t}AppointmentDate AS DATETIME) + CAST({t}AppointmentTime AS DATETIME))",
+}
+_COLUMNS = tuple(_COMPUTED) + ("ReminderSentAt",)
+
+_COLUMNS_DDL = "".join(
+    f"""
+IF COL_LENGTH('dbo.Appointments', '{name}') IS NULL
+    ALTER TABLE dbo.Appointments ADD {name} AS {expr.format(t="")} PERSISTED;"""
+    for name, expr in _COMPUTED.items()
+) + """
+IF COL_LENGTH('dbo.Appointments', 'ReminderSentAt') IS NULL
+    ALTER TABLE dbo.Appointments ADD ReminderSentAt DATETIME2 NULL;
+"""
+
+# Lookup indexes for GET /api/appointment; each key is followed by the keyset order
+_LOOKUP_INDEXES = (
+    ("IX_Appointments_Email", "(PatientEmailKey, StartsAt, AppointmentID)"),
+    ("IX_Appointments_Name", "(PatientNameKey, StartsAt, AppointmentID)"),
+    ("IX_Appointments_Phone", "(PhoneNumber, StartsAt, AppointmentID)"),
+    ("IX_Appointments_StartsAt", "(StartsAt, AppointmentID)"),
+    # reminder_service: only appointments still waiting for their reminder stay in this index
+    ("IX_Appointments_ReminderDue", "(StartsAt) WHERE ReminderSentAt IS NULL"),
+)
+
+# Older data may already hold double-booked slots; the index then stays non-unique
+# and booking falls back to a locked NOT EXISTS insert.
+_INDEX_DDL = """
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE object_id = OBJECT_ID('dbo.Appointments')
+                 AND name IN ('UX_Appointments_Slot', 'IX_Appointments_Slot'))
+BEGIN
+    IF EXISTS (SELECT 1 FROM dbo.Appointments
+               GROUP BY SpecialistKey, AppointmentDate, AppointmentTime
+               HAVING COUNT(*) > 1)
+        CREATE INDEX IX_Appointments_Slot
+            ON dbo.Appointments (SpecialistKey, AppointmentDate, AppointmentTime);
+    ELSE
+        CREATE UNIQUE INDEX UX_Appointments_Slot
+            ON dbo.Appointments (SpecialistKey, AppointmentDate, AppointmentTime);
+END
+SELECT CAST(CASE WHEN EXISTS (SELECT 1 FROM sys.indexes
+                              WHERE object_id = OBJECT_ID('dbo.Appointments')
+                                AND name = 'UX_Appointments_Slot')
+            THEN 1 ELSE 0 END AS BIT);
+"""
+
+_SLOT_INDEXES = ("UX_Appointments_Slot", "IX_Appointments_Slot")
+
+_DETECT_SQL = f"""
+SELECT name FROM sys.columns
+ WHERE object_id = OBJECT_ID('dbo.Appointments') AND name IN ({", ".join("?" * len(_COLUMNS))})
+UNION ALL
+SELECT name FROM sys.indexes
+ WHERE object_id = OBJECT_ID('dbo.Appointments') AND name IN (?, ?)
+"""
+
+_SCHEMA: Optional["AppointmentSchema"] = None
+_SCHEMA_LOCK = threading.Lock()
+_WARNED = False
+
+
+@dataclass(frozen=True)
+class AppointmentSchema:
+    """Which of the migrated columns / slot indexes dbo.Appointments has."""
+    present: FrozenSet[str]
+
+    @property
+    def missing(self) -> List[str]:
+        return [c for c in _COLUMNS if c not in self.present]
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing and any(i in self.present for i in _SLOT_INDEXES)
+
+    @property
+    def slot_unique(self) -> bool:
+        return "UX_Appointments_Slot" in self.present
+
+    def has(self, column: str) -> bool:
+        return column in self.present
+
+    def col(self, name: str, alias: str = "") -> str:
+        """The persisted column, or its defining expression while the column is missing."""
+        if name in self.present:
+            return f"{alias}.{name}" if alias else name
+        return _COMPUTED[name].format(t=f"{alias}." if alias else "")
+
+
+class MissingAppointmentSchema(RuntimeError):
+    """dbo.Appointments lacks columns a feature needs; the migration has not been run."""
+
+    def __init__(self, missing: List[str]):
+        super().__init__(
+            f"dbo.Appointments is missing {', '.join(missing)}; run `{MIGRATE_COMMAND}` first"
+        )
+
+
+def schema(cur=None) -> AppointmentSchema:
+    """
+    Look up the migrated columns / indexes (never creates them). Only a complete schema is
+    cached; until then every call looks again, so the migration takes effect without a restart.
+    """
+    global _SCHEMA, _WARNED
+    if _SCHEMA is not None:
+        return _SCHEMA
+    params = _COLUMNS + _SLOT_INDEXES
+    if cur is None:
+        with db_cursor() as (_conn, own):
+            own.execute(_DETECT_SQL, params)
+            rows = own.fetchall()
+    else:
+        cur.execute(_DETECT_SQL, params)
+        rows = cur.fetchall()
+    found = AppointmentSchema(frozenset(r[0] for r in rows))
+    if found.complete:
+        with _SCHEMA_LOCK:
+            _SCHEMA = found
+    elif not _WARNED:
+        _WARNED = True
+        print(f"[Appointments] schema not migrated (missing {', '.join(found.missing) or 'slot index'}); "
+              f"using unindexed lookups until `{MIGRATE_COMMAND}` runs")
+    return found
+
+
+def require(cur=None) -> AppointmentSchema:
+    """schema() with every migrated column present, or MissingAppointmentSchema."""
+    found = schema(cur)
+    if found.missing:
+        raise MissingAppointmentSchema(found.missing)
+    return found
+
+
+def migrate() -> AppointmentSchema:
+    """
+    Add the persisted key columns, ReminderSentAt, the slot index and the lookup indexes.
+    Idempotent. Rebuilding a persisted column / index locks dbo.Appointments: run off-peak.
+    """
+    global _SCHEMA
+    with db_cursor(commit=True) as (_conn, cur):
+        cur.execute(_COLUMNS_DDL)
+        cur.execute(_INDEX_DDL)
+        slot_unique = bool(cur.fetchone()[0])
+        for name, cols in _LOOKUP_INDEXES:
+            try:
+                cur.execute(f"""
+                    IF NOT EXISTS (SELECT 1 FROM sys.indexes
+                                   WHERE object_id = OBJECT_ID('dbo.Appointments') AND name = ?)
+                        CREATE INDEX {name} ON dbo.Appointments {cols};
+                """, (name,))
+            except pyodbc.Error as ex:
+                # e.g. PhoneNumber declared NVARCHAR(MAX): that lookup just stays unindexed
+                print(f"[Appointments] could not create {name}: {ex}")
+    if not slot_unique:
+        print("[Appointments] duplicate slots in dbo.Appointments; slot index created non-unique")
+    with _SCHEMA_LOCK:
+        _SCHEMA = None
+    return schema()
+
+
+def specialist_key(specialist: Optional[str]) -> str:
+    """Python mirror of the SpecialistKey (and PatientEmailKey / PatientNameKey) computed columns."""
+    return (specialist or "").strip().lower()
+
+
+# ---------- patient lookup ----------
+
+APPOINTMENT_COLUMNS = """AppointmentID, PatientName, PatientEmail, PhoneNumber,
+                   AppointmentDate, AppointmentTime, Specialist, Status, SubmittedAt"""
+
+
+def _like_prefix(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("[", "\\[")
+    return escaped + "%"
+
+
+def find_appointments(email: str = "", phone: str = "", name: str = "", upcoming: bool = True,
+                      limit: Optional[int] = None,
+                      after: Optional[Tuple[datetime.datetime, int]] = None) -> List[Dict[str, Any]]:
+    """
+    Appointments matching ANY of email / phone / name-prefix, ordered by (StartsAt, AppointmentID).
+    Every predicate is sargable (persisted key columns), so each OR branch is an index seek.
+    limit=None returns everything (legacy); otherwise at most `limit` rows after the
+    keyset position `after` = (StartsAt, AppointmentID) of the previous page's last row.
+    """
+    s = schema()
+    starts_at = s.col("StartsAt")
+    where: List[str] = []
+    params: List[Any] = []
+
+    or_parts: List[str] = []
+    if email:
+        or_parts.append(f"{s.col('PatientEmailKey')} = ?")
+        params.append(specialist_key(email))
+    if phone:
+        or_parts.append("PhoneNumber = ?")
+        params.append(phone)
+    if name:
+        # exact match OR starts-with, as before; the prefix LIKE covers both
+        or_parts.append(f"{s.col('PatientNameKey')} LIKE ? ESCAPE '\\'")
+        params.append(_like_prefix(specialist_key(name)))
+    if or_parts:
+        where.append("(" + " OR ".join(or_parts) + ")")
+
+    if upcoming:
+        where.append(f"{starts_at} >= GETDATE()")
+    if after is not None:
+        where.append(f"({starts_at} > ? OR ({starts_at} = ? AND AppointmentID > ?))")
+        params.extend([after[0], after[0], after[1]])
+
+    top = ""
+    if limit is not None:
+        top = "TOP (?) "
+        params.insert(0, int(limit))
+
+    sql = f"""
+        SELECT {top}{APPOINTMENT_COLUMNS}, {starts_at} AS StartsAt
+          FROM dbo.Appointments
+          {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY StartsAt ASC, AppointmentID ASC
+    """
+    with db_cursor() as (_conn, cur):
+        cur.execute(sql, params)
+        cols = [c[0] for c in cur.description]
+        return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+
+# ---------- booking ----------
+
+class SlotTaken(Exception):
+    """The (specialist, date, time) slot already has an appointment."""
+
+    def __init__(self, message: str, own: bool = False):
+        super().__init__(message)
+        self.own = own   # True when the existing booking belongs to the same patient email
+
+
+def is_duplicate_key(ex: Exception) -> bool:
+    msg = str(ex)
+    return "2627" in msg or "2601" in msg
+
+
+def book_slot(patient_name: str, patient_email: str, phone_number: str,
+              appointment_date: datetime.date, appointment_time: datetime.time,
+              specialist: str, status: Optional[str] = "Pending") -> int:
+    """
+    Insert one appointment; returns its AppointmentID or raises SlotTaken.
+    The unique slot index makes the INSERT itself the availability check; without it
+    (not migrated, or duplicate slots in old data) the insert locks the slot and checks first.
+    """
+    s = schema()
+    values = (patient_name, patient_email, phone_number, appointment_date, appointment_time,
+              specialist, status, datetime.datetime.now())
+    with db_cursor(commit=True) as (_conn, cur):
+        try:
+            if s.slot_unique:
+                cur.execute("""
+                    INSERT INTO dbo.Appointments
+                        (PatientName, PatientEmail, PhoneNumber,
+                         AppointmentDate, AppointmentTime, Specialist, Status, SubmittedAt)
+                    OUTPUT INSERTED.AppointmentID
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, values)
+            else:
+                cur.execute(f"""
+                    INSERT INTO dbo.Appointments
+                        (PatientName, PatientEmail, PhoneNumber,
+                         AppointmentDate, AppointmentTime, Specialist, Status, SubmittedAt)
+                    OUTPUT INSERTED.AppointmentID
+                    SELECT ?, ?, ?, ?, ?, ?, ?, ?
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM dbo.Appointments WITH (UPDLOCK, HOLDLOCK)
+                        WHERE {s.col("SpecialistKey")} = ? AND AppointmentDate = ? AND AppointmentTime = ?
+                    )
+                """, values + (specialist_key(specialist), appointment_date, appointment_time))
+            row = cur.fetchone()
+        except pyodbc.Error as ex:
+            if not is_duplicate_key(ex):
+                raise
+            row = None
+        if row:
+            return int(row[0])
+
+    raise SlotTaken(*_taken_message(s, patient_email, appointment_date, appointment_time, specialist))
+
+
+def _taken_message(s: AppointmentSchema, patient_email: str, appointment_date: datetime.date,
+                   appointment_time: datetime.time, specialist: str) -> Tuple[str, bool]:
+    """Only on the conflict path: tell a patient re-booking their own slot apart from a clash."""
+    with db_cursor() as (_conn, cur):
+        cur.execute(f"""
+            SELECT TOP 1 PatientEmail FROM dbo.Appointments
+            WHERE {s.col("SpecialistKey")} = ? AND AppointmentDate = ? AND AppointmentTime = ?
+        """, (specialist_key(specialist), appointment_date, appointment_time))
+        row = cur.fetchone()
+    if row and (row[0] or "").strip().lower() == (patient_email or "").strip().lower():
+        return "You already have an appointment at that time.", True
+    return (f"No availability for {appointment_time.strftime('%H:%M')} on {appointment_date} ({specialist}).",
+            False)
+
+
+# ---------- bulk changes ----------
+
+class RescheduleConflict(Exception):
+    """Some targets of a bulk reschedule are taken; nothing was changed."""
+
+    def __init__(self, conflicts: List[Dict[str, Any]]):
+        # empty when the unique slot index caught a booking made after the check
+        super().__init__(f"{len(conflicts) or 'Some'} appointment(s) would collide with a booked slot")
+        self.conflicts = conflicts
+
+
+def _bulk_scope(s: AppointmentSchema, stage: KeyStage, ids: Optional[List[int]], specialist: Optional[str],
+                on_date: Optional[datetime.date]) -> Tuple[str, List[Any]]:
+    """WHERE fragment over alias a: explicit ids, or every appointment of a specialist on a day."""
+    if ids:
+        frag, vals = stage.predicate("a.AppointmentID", [int(i) for i in ids])
+        return frag, list(vals)
+    if specialist and on_date:
+        return (f"{s.col('SpecialistKey', 'a')} = ? AND a.AppointmentDate = ?",
+                [specialist_key(specialist), on_date])
+    raise ValueError("Provide ids, or specialist and date")
+
+
+def _serialize(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for r in rows:
+        if isinstance(r.get("AppointmentDate"), (datetime.date, datetime.datetime)):
+            r["AppointmentDate"] = r["AppointmentDate"].strftime("%Y-%m-%d")
+        if isinstance(r.get("AppointmentTime"), datetime.time):
+            r["AppointmentTime"] = r["AppointmentTime"].strftime("%H:%M:%S")
+        if isinstance(r.get("SubmittedAt"), datetime.datetime):
+            r["SubmittedAt"] = r["SubmittedAt"].strftime("%Y-%m-%d %H:%M:%S")
+        r["id"] = r.pop("AppointmentID", None)
+        r["date"] = r["AppointmentDate"]
+        r["time"] = r["AppointmentTime"]
+        r["doctor"] = r.get("Specialist") or ""
+        r["status"] = r.get("Status") or "Pending"
+    return rows
+
+
+def bulk_reschedule(ids: Optional[List[int]] = None, specialist: Optional[str] = None,
+                    on_date: Optional[datetime.date] = None,
+                    to_date: Optional[datetime.date] = None,
+                    to_time: Optional[datetime.time] = None,
+                    shift_minutes: int = 0) -> List[Dict[str, Any]]:
+    """
+    Move a set of appointments, all or nothing. Target per appointment:
+      to_date (+ to_time)  -> that day, keeping each one's time unless to_time is given
+      shift_minutes        -> StartsAt + shift (e.g. 1440 = same time tomorrow)
+    to_time only makes sense for a single appointment (several would share one slot).
+    Raises RescheduleConflict (nothing changed) when a target is booked by an appointment
+    outside the set, or two of the set land on the same slot. Returns the updated rows.
+    """
+    if to_date is None and to_time is None and not shift_minutes:
+        raise ValueError("Provide a target date/time or shiftMinutes/shiftDays")
+
+    if to_date is not None or to_time is not None:
+        day_sql = "CAST(? AS DATETIME)" if to_date is not None else "CAST(a.AppointmentDate AS DATETIME)"
+        time_sql = "CAST(? AS DATETIME)" if to_time is not None else "CAST(a.AppointmentTime AS DATETIME)"
+        target_sql = f"{day_sql} + {time_sql}"
+        target_params: List[Any] = [v for v in (to_date, to_time.strftime("%H:%M:%S") if to_time else None)
+                                    if v is not None]
+    else:
+        target_sql = None
+        target_params = [int(shift_minutes)]
+
+    with db_cursor(commit=True) as (_conn, cur), KeyStage(cur) as stage:
+        s = schema(cur)
+        if target_sql is None:
+            target_sql = f"DATEADD(minute, ?, {s.col('StartsAt', 'a')})"
+        scope_sql, scope_params = _bulk_scope(s, stage, ids, specialist, on_date)
+        cur.execute("""
+            IF OBJECT_ID('tempdb..#moves') IS NOT NULL DROP TABLE #moves;
+            CREATE TABLE #moves (
+                AppointmentID  INT           NOT NULL PRIMARY KEY,
+                SpecialistKey  NVARCHAR(200) NOT NULL,
+                NewStart       DATETIME      NOT NULL
+            );
+        """)
+        try:
+            # Lock the rows being moved so nobody edits them between check and update
+            cur.execute(f"""
+                INSERT INTO #moves (AppointmentID, SpecialistKey, NewStart)
+                SELECT a.AppointmentID, {s.col("SpecialistKey", "a")}, {target_sql}
+                  FROM dbo.Appointments AS a WITH (UPDLOCK, HOLDLOCK)
+                 WHERE {scope_sql}
+            """, target_params + scope_params)
+            if cur.rowcount == 0:
+                return []
+            if to_time is not None and cur.rowcount > 1:
+                raise ValueError("appointmentTime can only be set when moving a single appointment")
+
+            cur.execute(f"""
+                SELECT m.AppointmentID, m.NewStart, x.AppointmentID AS ConflictWith
+                  FROM #moves AS m
+                  JOIN dbo.Appointments AS x WITH (UPDLOCK, HOLDLOCK)
+                    ON {s.col("SpecialistKey", "x")} = m.SpecialistKey
+                   AND x.AppointmentDate = CAST(m.NewStart AS DATE)
+                   AND x.AppointmentTime = CAST(m.NewStart AS TIME)
+                 WHERE NOT EXISTS (SELECT 1 FROM #moves AS o WHERE o.AppointmentID = x.AppointmentID)
+                UNION ALL
+                SELECT m.AppointmentID, m.NewStart, o.AppointmentID
+                  FROM #moves AS m
+                  JOIN #moves AS o
+                    ON o.SpecialistKey = m.SpecialistKey
+                   AND o.NewStart      = m.NewStart
+                   AND o.AppointmentID < m.AppointmentID
+            """)
+            conflicts = [
+                {"id": r[0], "target": r[1].strftime("%Y-%m-%d %H:%M:%S"), "conflictWith": r[2]}
+                for r in cur.fetchall()
+            ]
+            if conflicts:
+                raise RescheduleConflict(conflicts)
+
+            try:
+                cur.execute(f"""
+                    UPDATE a
+                       SET AppointmentDate = CAST(m.NewStart AS DATE),
+                           AppointmentTime = CAST(m.NewStart AS TIME),
+                           Status          = COALESCE(a.Status, 'Pending')
+                           {", ReminderSentAt = NULL" if s.has("ReminderSentAt") else ""}
+                    OUTPUT {", ".join("inserted." + c.strip() for c in APPOINTMENT_COLUMNS.split(","))}
+                      FROM dbo.Appointments AS a
+                      JOIN #moves AS m ON m.AppointmentID = a.AppointmentID
+                """)
+                cols = [c[0] for c in cur.description]
+                rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+            except pyodbc.Error as ex:
+                if is_duplicate_key(ex):
+                    # a booking slipped into a target slot after the check
+                    raise RescheduleConflict([])
+                raise
+        finally:
+            try:
+                cur.execute("IF OBJECT_ID('tempdb..#moves') IS NOT NULL DROP TABLE #moves;")
+            except Exception:
+                pass
+
+    rows.sort(key=lambda r: (r["AppointmentDate"], r["AppointmentTime"], r["AppointmentID"]))
+    return _serialize(rows)
+
+
+def bulk_cancel(ids: Optional[List[int]] = None, specialist: Optional[str] = None,
+                on_date: Optional[datetime.date] = None) -> List[Dict[str, Any]]:
+    """Hard-delete a set of appointments in one statement; returns the deleted rows."""
+    with db_cursor(commit=True) as (_conn, cur), KeyStage(cur) as stage:
+        scope_sql, scope_params = _bulk_scope(schema(cur), stage, ids, specialist, on_date)
+        cur.execute(f"""
+            DELETE a
+            OUTPUT {", ".join("deleted." + c.strip() for c in APPOINTMENT_COLUMNS.split(","))}
+              FROM dbo.Appointments AS a
+             WHERE {scope_sql}
+        """, scope_params)
+        cols = [c[0] for c in cur.description]
+        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+    rows.sort(key=lambda r: (r["AppointmentDate"], r["AppointmentTime"], r["AppointmentID"]))
+    return _serialize(rows)
+
+
+# ---------- availability ----------
+
+def _as_time(value: Any, default: datetime.time) -> datetime.time:
+    if isinstance(value, datetime.datetime):
+        return value.time()
+    if isinstance(value, datetime.time):
+        return value
+    text = str(value or "").strip()
+    for fmt in ("%H:%M:%S", "%H:%M", "%I:%M %p", "%I:%M%p"):
+        try:
+            return datetime.datetime.strptime(text.split(".")[0], fmt).time()
+        except ValueError:
+            continue
+    return default
+
+
+def opening_hours(cur, location_id: Optional[int] = None) -> Tuple[datetime.time, datetime.time]:
+    """(start, end) from dbo.locations: one location, or the widest window over active ones."""
+    if location_id is not None:
+        cur.execute("SELECT schedule_start, schedule_end FROM locations WHERE id = ?", (location_id,))
+        rows = cur.fetchall()
+        if not rows:
+            raise LookupError(f"Location {location_id} not found")
+    else:
+        cur.execute("SELECT schedule_start, schedule_end FROM locations WHERE is_active = 1")
+        rows = cur.fetchall()
+    starts = [_as_time(r[0], DEFAULT_DAY_START) for r in rows if r[0] is not None]
+    ends = [_as_time(r[1], DEFAULT_DAY_END) for r in rows if r[1] is not None]
+    return (min(starts) if starts else DEFAULT_DAY_START, max(ends) if ends else DEFAULT_DAY_END)
+
+
+def _minutes(t: datetime.time) -> int:
+    return t.hour * 60 + t.minute
+
+
+def free_slots(specialist: str, date_from: datetime.date, date_to: datetime.date,
+               location_id: Optional[int] = None, slot_minutes: int = SLOT_MINUTES,
+               now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+    """
+    [{"date": "YYYY-MM-DD", "free": ["HH:MM", ...]}] for every day in [date_from, date_to].
+    A slot is busy when any booking of the specialist starts inside it; slots already
+    started today are not offered.
+    """
+    if date_to < date_from:
+        raise ValueError("'to' must not be before 'from'")
+    if (date_to - date_from).days + 1 > AVAILABILITY_MAX_DAYS:
+        raise ValueError(f"Range too large (max {AVAILABILITY_MAX_DAYS} days)")
+    if slot_minutes <= 0:
+        raise ValueError("slotMinutes must be positive")
+
+    with db_cursor() as (_conn, cur):
+        start, end = opening_hours(cur, location_id)
+        cur.execute(f"""
+            SELECT AppointmentDate, AppointmentTime
+            FROM dbo.Appointments
+            WHERE {schema(cur).col("SpecialistKey")} = ? AND AppointmentDate BETWEEN ? AND ?
+        """, (specialist_key(specialist), date_from, date_to))
+        booked = cur.fetchall()
+
+    day_start = _minutes(start)
+    n_slots = max(0, (_minutes(end) - day_start) // slot_minutes)
+    busy: Dict[datetime.date, int] = {}
+    for d, t in booked:
+        d = d.date() if isinstance(d, datetime.datetime) else d
+        idx = (_minutes(_as_time(t, DEFAULT_DAY_START)) - day_start) // slot_minutes
+        if 0 <= idx < n_slots:
+            busy[d] = busy.get(d, 0) | (1 << idx)
+
+    now = now or datetime.datetime.now()
+    days: List[Dict[str, Any]] = []
+    day = date_from
+    while day <= date_to:
+        mask = busy.get(day, 0)
+        free: List[str] = []
+        for i in range(n_slots):
+            if mask >> i & 1:
+                continue
+            m = day_start + i * slot_minutes
+            slot = datetime.time(m // 60, m % 60)
+            if day == now.date() and slot <= now.time():
+                continue
+            if day < now.date():
+                break
+            free.append(slot.strftime("%H:%M"))
+        days.append({"date": day.isoformat(), "free": free})
+        day += datetime.timedelta(days=1)
+    return days
@@ -0,0 +1,266 @@
+# Backend/app/services/completion_summary.py
+# Materialized per-(patient, form) completion summary.
+# - dbo.FormCompletionSummary holds the latest submission and its answered/total field counts
+# - write paths (update_form, customer submit, create_form) refresh only the pairs they touched
+# - rebuild() creates (first run), backfills and repairs the whole table; it only runs from
+#   `flask rebuild-completion-summary`, never inside a request
+# Dashboard reads join completion_source(): this table once it exists, otherwise the live
+# latest-submission count the dashboard used before, so a fresh deploy still answers.
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+from ..database import db_cursor
+
+SUMMARY_TABLE = "dbo.FormCompletionSummary"
+
+_SCHEMA_READY = False
+_SCHEMA_LOCK = threading.Lock()
+_MISSING_RECHECK_SECS = 60.0
+_missing_since: Optional[float] = None
+
+_DDL = """
+IF OBJECT_ID('dbo.FormCompletionSummary', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.FormCompletionSummary (
+        patient_id            INT           NOT NULL,
+        form_id               INT           NOT NULL,
+        latest_submission_id  INT           NULL,
+        total_fields          INT           NOT NULL CONSTRAINT DF_FCS_total DEFAULT 0,
+        answered_fields       INT           NOT NULL CONSTRAINT DF_FCS_answered DEFAULT 0,
+        completion            DECIMAL(5,2)  NOT NULL CONSTRAINT DF_FCS_completion DEFAULT 0,
+        updated_at            DATETIME2     NOT NULL CONSTRAINT DF_FCS_updated DEFAULT SYSUTCDATETIME(),
+        CONSTRAINT PK_FormCompletionSummary PRIMARY KEY (patient_id, form_id)
+    );
+    SELECT CAST(1 AS BIT) AS created;
+END
+ELSE
+    SELECT CAST(0 AS BIT) AS created;
+"""
+
+# Lets the per-pair refresh find the latest submission with a single seek
+_INDEX_DDL = """
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_FormSubmissions_patient_form_submitted'
+      AND object_id = OBJECT_ID('dbo.FormSubmissions')
+)
+    CREATE INDEX IX_FormSubmissions_patient_form_submitted
+        ON dbo.FormSubmissions (patient_id, form_id, submitted_at DESC)
+        INCLUDE (submission_id);
+"""
+
+# {scope} filters the candidate (patient, form) pairs; {on_missing} is empty or a
+# NOT MATCHED BY SOURCE clause for full rebuilds.
+_MERGE_TEMPLATE = """
+MERGE dbo.FormCompletionSummary WITH (HOLDLOCK) AS t
+USING (
+    SELECT
+        pr.patient_id,
+        pr.form_id,
+        ls.submission_id AS latest_submission_id,
+        comp.total_fields,
+        comp.answered_fields,
+        ISNULL(CAST(100.0 * comp.answered_fields / NULLIF(comp.total_fields, 0) AS DECIMAL(5,2)), 0)
+            AS completion
+    FROM (
+        SELECT patient_id, form_id FROM dbo.form_status WHERE {scope}
+        UNION
+        SELECT patient_id, form_id FROM dbo.FormSubmissions WHERE {scope}
+    ) AS pr
+    OUTER APPLY (
+        SELECT TOP 1 s.submission_id
+        FROM dbo.FormSubmissions AS s
+        WHERE s.patient_id = pr.patient_id AND s.form_id = pr.form_id
+        ORDER BY s.submitted_at DESC
+    ) AS ls
+    OUTER APPLY (
+        SELECT
+            COUNT(ff.field_id) AS total_fields,
+            COUNT(
+                CASE
+                    WHEN fr.response_value IS NOT NULL AND LTRIM(RTRIM(fr.response_value)) <> ''
+                    THEN 1 END
+            ) AS answered_fields
+        FROM dbo.FormFields AS ff
+        LEFT JOIN dbo.FormResponses AS fr
+            ON fr.submission_id = ls.submission_id AND fr.field_id = ff.field_id
+        WHERE ff.form_id = pr.form_id
+    ) AS comp
+    WHERE pr.patient_id IS NOT NULL AND pr.form_id IS NOT NULL
+) AS src
+ON t.patient_id = src.patient_id AND t.form_id = src.form_id
+WHEN MATCHED THEN
+    UPDATE SET
+        latest_submission_id = src.latest_submission_id,
+        total_fields         = src.total_fields,
+        answered_fields      = src.answered_fields,
+        completion           = src.completion,
+        updated_at           = SYSUTCDATETIME()
+WHEN NOT MATCHED BY TARGET THEN
+    INSERT (patient_id, form_id, latest_submission_id, total_fields, answered_fields, completion)
+    VALUES (src.patient_id, src.form_id, src.latest_submission_id,
+            src.total_fields, src.answered_fields, src.completion)
+{on_missing};
+"""
+
+
+# ---------- schema ----------
+
+def ready() -> bool:
+    """
+    True once dbo.FormCompletionSummary exists. Only looks (a missing table is re-checked at
+    most every _MISSING_RECHECK_SECS); failures are logged and read as "not ready".
+    """
+    global _SCHEMA_READY, _missing_since
+    if _SCHEMA_READY:
+        return True
+    if _missing_since is not None and time.monotonic() - _missing_since < _MISSING_RECHECK_SECS:
+        return False
+    try:
+        with db_cursor() as (_conn, cur):
+            cur.execute("SELECT OBJECT_ID('dbo.FormCompletionSummary', 'U')")
+            exists = cur.fetchone()[0] is not None
+    except Exception as e:
+        print(f"[Completion Summary] schema check failed: {e}")
+        exists = False
+    with _SCHEMA_LOCK:
+        _SCHEMA_READY = exists
+        _missing_since = None if exists else time.monotonic()
+    if not exists:
+        print("[Completion Summary] table missing, using live counts (run `flask rebuild-completion-summary`)")
+    return exists
+
+
+def prepare() -> bool:
+    """ready() for write paths, called before the caller opens its transaction."""
+    return ready()
+
+
+def _create_schema(cur) -> None:
+    cur.execute(_DDL)
+    if cur.fetchone()[0]:
+        print("[Completion Summary] table created")
+    cur.execute(_INDEX_DDL)
+
+
+# The live equivalent of the summary row: fields of the form answered in the pair's latest submission
+_LIVE_SOURCE = """
+        OUTER APPLY (
+            SELECT
+                COUNT(ff.field_id) AS total_fields,
+                COUNT(
+                    CASE
+                        WHEN fr.response_value IS NOT NULL AND LTRIM(RTRIM(fr.response_value)) <> ''
+                        THEN 1 END
+                ) AS answered_fields,
+                CAST(
+                    100.0 * COUNT(
+                        CASE
+                            WHEN fr.response_value IS NOT NULL AND LTRIM(RTRIM(fr.response_value)) <> ''
+                            THEN 1 END
+                    ) / NULLIF(COUNT(ff.field_id), 0) AS DECIMAL(5,2)
+                ) AS completion
+            FROM FormFields ff
+            LEFT JOIN FormResponses fr
+                ON fr.field_id = ff.field_id
+               AND fr.submission_id = (
+                    SELECT TOP 1 s.submission_id
+                    FROM FormSubmissions s
+                    WHERE s.patient_id = {patient} AND s.form_id = {form}
+                    ORDER BY s.submitted_at DESC
+               )
+            WHERE ff.form_id = {form}
+        ) {alias}
+"""
+
+_SUMMARY_SOURCE = """
+        LEFT JOIN dbo.FormCompletionSummary {alias}
+            ON {alias}.patient_id = {patient} AND {alias}.form_id = {form}
+"""
+
+
+def completion_source(patient: str, form: str, alias: str = "cs") -> str:
+    """
+    FROM-clause fragment exposing {alias}.total_fields / answered_fields / completion for the
+    (patient, form) columns given: the summary table, or the live count until it exists.
+    """
+    template = _SUMMARY_SOURCE if ready() else _LIVE_SOURCE
+    return template.format(patient=patient, form=form, alias=alias)
+
+
+# ---------- refresh ----------
+
+def _merge(cur, scope: str, params: Tuple[Any, ...], full: bool = False) -> int:
+    sql = _MERGE_TEMPLATE.format(
+        scope=scope,
+        on_missing="WHEN NOT MATCHED BY SOURCE THEN DELETE" if full else "",
+    )
+    cur.execute(sql, tuple(params) + tuple(params))
+    return cur.rowcount
+
+
+def _run(scope: str, params: Tuple[Any, ...], cursor=None, full: bool = False) -> Optional[int]:
+    """
+    Refresh inside the caller's transaction when a cursor is given (caller commits),
+    otherwise on a pooled connection of our own. Neither raises: a stale summary row
+    is repaired by the next write or by rebuild().
+
+    Callers passing a cursor must call prepare() BEFORE their first write: the
+    existence check runs on a second connection. Until the table exists (see rebuild())
+    refreshes are skipped.
+    """
+    if cursor is not None:
+        if not _SCHEMA_READY:
+            return None
+        return _merge_savepoint(cursor, scope, params, full=full)
+    if not ready():
+        return None
+    try:
+        with db_cursor(commit=True) as (_conn, cur):
+            return _merge(cur, scope, params, full=full)
+    except Exception as e:
+        print(f"[Completion Summary] refresh failed ({scope} {params}): {e}")
+        return None
+
+
+def _merge_savepoint(cur, scope: str, params: Tuple[Any, ...], full: bool = False) -> Optional[int]:
+    """_merge() that cannot fail the caller's transaction: errors roll back to a savepoint and are logged."""
+    cur.execute("SAVE TRANSACTION completion_summary;")
+    try:
+        return _merge(cur, scope, params, full=full)
+    except Exception as e:
+        # a doomed transaction cannot roll back to the savepoint; the caller's commit fails anyway
+        cur.execute("ROLLBACK TRANSACTION completion_summary;")
+        print(f"[Completion Summary] in-transaction refresh failed ({scope} {params}): {e}")
+        return None
+
+
+def refresh_pair(patient_id: int, form_id: int, cursor=None) -> Optional[int]:
+    """Recompute the summary row for one (patient, form) after a submission write."""
+    return _run("patient_id = ? AND form_id = ?", (int(patient_id), int(form_id)), cursor)
+
+
+def refresh_form(form_id: int, cursor=None) -> Optional[int]:
+    """Recompute every summary row of a form (its field set changed)."""
+    return _run("form_id = ?", (int(form_id),), cursor)
+
+
+def rebuild(cursor=None) -> Optional[int]:
+    """
+    Create the table and its index if needed, then recompute every pair and drop rows whose
+    pair no longer exists. Maintenance only (flask rebuild-completion-summary).
+    """
+    global _SCHEMA_READY, _missing_since
+    if cursor is not None:
+        _create_schema(cursor)
+        merged = _merge(cursor, "1 = 1", (), full=True)
+    else:
+        with db_cursor(commit=True) as (_conn, cur):
+            _create_schema(cur)
+            merged = _merge(cur, "1 = 1", (), full=True)
+    with _SCHEMA_LOCK:
+        _SCHEMA_READY, _missing_since = True, None
+    return merged
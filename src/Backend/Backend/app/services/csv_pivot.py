@@ -0,0 +1,176 @@
+# Backend/app/services/csv_pivot.py
+# Per-template answers pivot for the includeAnswers CSV export (no DB access here).
+# - field order for every template is built in ONE pass over the FormFields rows
+# - each template gets a TemplatePlan: header + the field feeding each answer column
+# - templates are rendered to CSV bytes independently; big exports on multi-core hosts use one
+#   long-lived process pool (spawned on first use, like the PDF render pool), never one per request
+# bench_csv_pivot.py (next to run.py) times this on a synthetic dataset.
+from __future__ import annotations
+
+import csv
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CPU_COUNT = os.cpu_count() or 1
+# serial unless the host has cores to spare: on one CPU the pool only adds pickling (bench_csv_pivot.py)
+PIVOT_WORKERS = int(os.getenv("EXPORT_PIVOT_WORKERS", str(min(4, CPU_COUNT) if CPU_COUNT > 1 else 1)))
+PIVOT_PARALLEL_MIN_ROWS = int(os.getenv("EXPORT_PIVOT_PARALLEL_MIN_ROWS", "20000"))
+PIVOT_MP_START = os.getenv("EXPORT_MP_START", "spawn")   # same start method as the PDF render pool
+
+FIXED_COLUMNS = ("Form #", "Created On", "Location", "Patient", "Template", "Completed On")
+
+
+def build_field_order(fields_rows: Iterable[Dict[str, Any]]) -> Dict[Any, List[Tuple[Any, str]]]:
+    """
+    form_id -> ordered [(field_id, label)].
+    Rows carry field_id, form_id, label and optionally sort_order; ordering is
+    (sort_order missing, sort_order, label) when sort_order exists, else label.
+    """
+    grouped: Dict[Any, List[Tuple[Any, Any, str]]] = {}
+    has_order = False
+    for r in fields_rows:
+        if "sort_order" in r:
+            has_order = True
+        lbl = (r.get("label") or "").strip()
+        grouped.setdefault(r["form_id"], []).append((r.get("sort_order"), r["field_id"], lbl))
+
+    out: Dict[Any, List[Tuple[Any, str]]] = {}
+    for fid, items in grouped.items():
+        if has_order:
+            items.sort(key=lambda x: (x[0] is None, x[0] if x[0] is not None else 10**9, x[2].lower()))
+        else:
+            items.sort(key=lambda x: x[2].lower())
+        out[fid] = [(field_id, lbl) for _order, field_id, lbl in items]
+    return out
+
+
+@dataclass(frozen=True)
+class TemplatePlan:
+    """
+    Column layout of one template's CSV: fixed columns, then one column per distinct label.
+    column_fields[i] is the field feeding column i (None = fixed value). As with the old
+    dict-based rows, the last field wins on a duplicate label, and a field labelled like a
+    fixed column fills that column.
+    """
+    form_id: Any
+    header: Tuple[str, ...]
+    column_fields: Tuple[Any, ...]
+
+    @classmethod
+    def build(cls, form_id: Any, fields: Sequence[Tuple[Any, str]]) -> "TemplatePlan":
+        index: Dict[str, int] = {col: i for i, col in enumerate(FIXED_COLUMNS)}
+        header: List[str] = list(FIXED_COLUMNS)
+        feeding: List[Any] = [None] * len(FIXED_COLUMNS)
+        for field_id, label in fields:
+            col = label or f"Field {field_id}"
+            if col in index:
+                feeding[index[col]] = field_id
+            else:
+                index[col] = len(header)
+                header.append(col)
+                feeding.append(field_id)
+        return cls(form_id, tuple(header), tuple(feeding))
+
+    def row(self, base: Dict[str, Any], form_no: int, given: Dict[Any, Any]) -> List[Any]:
+        completed = base.get("completed_date") or ""
+        values = [
+            form_no,
+            completed,
+            "",  # Location: fill if you wire a location join
+            base.get("patient_name") or "",
+            base.get("form_name") or f"Form {self.form_id}",
+            completed,
+        ]
+        for i, fid in enumerate(self.column_fields):
+            if fid is None:
+                continue
+            value = given.get(fid, "")
+            if i < len(values):
+                values[i] = value
+            else:
+                values.append(value)
+        return values
+
+
+def render_template(plan: TemplatePlan, rows: Sequence[Dict[str, Any]],
+                    answers: Dict[Any, Dict[Any, Any]]) -> bytes:
+    """CSV bytes (utf-8 BOM) for one template's base rows."""
+    if not rows:
+        return "No data found.\n".encode("utf-8-sig")
+    sio = io.StringIO()
+    w = csv.writer(sio)
+    w.writerow(plan.header)
+    for form_no, base in enumerate(rows, start=1):
+        w.writerow(plan.row(base, form_no, answers.get(base.get("submission_id"), {})))
+    return sio.getvalue().encode("utf-8-sig")
+
+
+def _render_job(args) -> Tuple[Any, bytes]:
+    plan, rows, answers = args
+    return plan.form_id, render_template(plan, rows, answers)
+
+
+def render_templates(per_template: Dict[Any, List[Dict[str, Any]]],
+                     form_fields: Dict[Any, List[Tuple[Any, str]]],
+                     answers: Dict[Any, Dict[Any, Any]],
+                     workers: Optional[int] = None) -> List[Tuple[Any, bytes]]:
+    """
+    [(form_id, csv bytes)] in per_template order.
+    Each template only ships its own submissions' answers, so with workers > 1, more than
+    one CPU and at least PIVOT_PARALLEL_MIN_ROWS rows the templates render in the shared
+    process pool; small exports stay in-process where shipping rows to workers would dominate.
+    """
+    jobs = []
+    for fid, rows in per_template.items():
+        plan = TemplatePlan.build(fid, form_fields.get(fid, []))
+        own = {}
+        for r in rows:
+            sid = r.get("submission_id")
+            if sid in answers:
+                own[sid] = answers[sid]
+        jobs.append((plan, rows, own))
+
+    workers = PIVOT_WORKERS if workers is None else workers
+    total_rows = sum(len(rows) for rows in per_template.values())
+    if workers <= 1 or CPU_COUNT <= 1 or len(jobs) <= 1 or total_rows < PIVOT_PARALLEL_MIN_ROWS:
+        return [_render_job(job) for job in jobs]
+
+    pool = _executor(workers)
+    return list(pool.map(_render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+# ---------- shared pool ----------
+
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_EXECUTOR_WORKERS = 0
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    """The process's pivot pool; only rebuilt when a different size is asked for."""
+    global _EXECUTOR, _EXECUTOR_WORKERS
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is not None and _EXECUTOR_WORKERS != workers:
+            _EXECUTOR.shutdown(wait=False)
+            _EXECUTOR = None
+        if _EXECUTOR is None:
+            _EXECUTOR = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(PIVOT_MP_START),
+            )
+            _EXECUTOR_WORKERS = workers
+        return _EXECUTOR
+
+
+def _reset_executor_after_fork():
+    global _EXECUTOR, _EXECUTOR_WORKERS
+    _EXECUTOR, _EXECUTOR_WORKERS = None, 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor_after_fork)
@@ -0,0 +1,632 @@
+# Backend/app/services/delivery_service.py
+# Outbox-backed delivery of form invitations (email / SMS).
+# - enqueue_batch() writes one dbo.DeliveryOutbox row per recipient and returns a batch id
+# - a small pool of worker threads claims due rows (READPAST, so several processes can drain
+#   the same table), sends them over a reused SMTP session / Twilio client and records the result
+# - failures are retried with exponential backoff up to DELIVERY_MAX_ATTEMPTS
+# - DELIVERY_BACKEND=fake swaps SMTP/Twilio for a local JSONL sink (offline dev + testing)
+# - workers start with each web process (create_app, DELIVERY_IN_PROCESS=1, the default) so rows
+#   left pending or retrying by a restart are drained without waiting for a new enqueue; with
+#   DELIVERY_IN_PROCESS=0, delivery_worker.py MUST run somewhere or nothing is ever sent
+# - short-lived processes (cron ticks, flask commands) send what they queued with drain_until_empty()
+# - the email channel needs SMTP_EMAIL and SMTP_PASS; without them email rows stay queued
+from __future__ import annotations
+
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional
+
+from ..database import db_cursor, execute_in
+
+# ---------- configuration ----------
+
+DELIVERY_BACKEND   = os.getenv("DELIVERY_BACKEND", "live").lower()     # live | fake
+DELIVERY_WORKERS   = int(os.getenv("DELIVERY_WORKERS", "4"))           # concurrent senders per process
+DELIVERY_CLAIM     = int(os.getenv("DELIVERY_CLAIM_SIZE", "10"))       # jobs claimed per round trip
+DELIVERY_POLL_SECS = float(os.getenv("DELIVERY_POLL_SECS", "2"))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "5"))
+DELIVERY_BACKOFF_SECS = float(os.getenv("DELIVERY_BACKOFF_SECS", "30"))
+DELIVERY_LEASE_SECS   = int(os.getenv("DELIVERY_LEASE_SECS", "300"))   # reclaim jobs of crashed workers
+DELIVERY_IN_PROCESS   = os.getenv("DELIVERY_IN_PROCESS", "1").lower() in ("1", "true", "yes", "on")
+
+SMTP_HOST     = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT     = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+SMTP_EMAIL    = os.getenv("SMTP_EMAIL", "")
+SMTP_PASS     = os.getenv("SMTP_PASS", "")
+
+FAKE_SINK_PATH = os.getenv(
+    "DELIVERY_FAKE_SINK",
+    os.path.join(os.path.dirname(__file__), "_outbox_sink.jsonl"),
+)
+
+CHANNEL_EMAIL = "email"
+CHANNEL_SMS = "sms"
+
+_DDL = """
+IF OBJECT_ID('dbo.DeliveryOutbox', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.DeliveryOutbox (
+        job_id           BIGINT IDENTITY(1,1) NOT NULL CONSTRAINT PK_DeliveryOutbox PRIMARY KEY,
+        batch_id         CHAR(36)        NOT NULL,
+        channel          VARCHAR(10)     NOT NULL,
+        patient_id       INT             NULL,
+        recipient        NVARCHAR(320)   NOT NULL,
+        recipient_name   NVARCHAR(200)   NULL,
+        payload          NVARCHAR(MAX)   NOT NULL,
+        status           VARCHAR(10)     NOT NULL CONSTRAINT DF_DeliveryOutbox_status DEFAULT 'queued',
+        attempts         INT             NOT NULL CONSTRAINT DF_DeliveryOutbox_attempts DEFAULT 0,
+        next_attempt_at  DATETIME2       NOT NULL CONSTRAINT DF_DeliveryOutbox_next DEFAULT SYSUTCDATETIME(),
+        locked_until     DATETIME2       NULL,
+        last_error       NVARCHAR(1000)  NULL,
+        created_at       DATETIME2       NOT NULL CONSTRAINT DF_DeliveryOutbox_created DEFAULT SYSUTCDATETIME(),
+        sent_at          DATETIME2       NULL
+    );
+    CREATE INDEX IX_DeliveryOutbox_due   ON dbo.DeliveryOutbox (status, next_attempt_at);
+    CREATE INDEX IX_DeliveryOutbox_batch ON dbo.DeliveryOutbox (batch_id);
+END
+"""
+
+_SCHEMA_READY = False
+_SCHEMA_LOCK = threading.Lock()
+
+
+def ensure_schema() -> None:
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+    with _SCHEMA_LOCK:
+        if not _SCHEMA_READY:
+            with db_cursor(commit=True) as (_conn, cur):
+                cur.execute(_DDL)
+            _SCHEMA_READY = True
+
+
+# ---------- message helpers ----------
+
+def to_e164(phone: str, default_country: str = "1") -> str:
+    """'(978) 619-8530' -> '+19786198530'; numbers already starting with '+' keep their country code."""
+    raw = str(phone or "").strip()
+    digits = "".join(ch for ch in raw if ch.isdigit())
+    if raw.startswith("+"):
+        return "+" + digits
+    if len(digits) == 10:
+        return f"+{default_country}{digits}"
+    return "+" + digits
+
+
+def build_email_job(patient_id, name, email, qr_url, form_ids, due_iso, location) -> Dict[str, Any]:
+    html_body = f"""
+                <div>
+                    <h2>GIA HR</h2>
+                    <p>Hello <b>{name}</b>,<br>
+                    You have been assigned {len(form_ids)} forms:</p>
+                    <p><a href="{qr_url}">Click here to fill your forms</a></p>
+                </div>
+                """
+    return {
+        "channel": CHANNEL_EMAIL,
+        "patient_id": patient_id,
+        "recipient": email,
+        "recipient_name": name,
+        "payload": {
+            "subject": "Forms from GIA HR",
+            "html": html_body,
+            "form_ids": form_ids,
+            "due_date": due_iso,
+            "location": location,
+        },
+    }
+
+
+def build_sms_job(patient_id, name, phone, qr_url, form_ids, due_iso, location) -> Dict[str, Any]:
+    message_body = f"""
+Hello {name},
+You have been assigned {len(form_ids)} forms by GIA HR.
+
+Open here: {qr_url}
+"""
+    return {
+        "channel": CHANNEL_SMS,
+        "patient_id": patient_id,
+        "recipient": to_e164(phone),
+        "recipient_name": name,
+        "payload": {
+            "body": message_body.strip(),
+            "form_ids": form_ids,
+            "due_date": due_iso,
+            "location": location,
+        },
+    }
+
+
+# ---------- transports ----------
+
+class SmtpTransport:
+    """One SMTP session kept open across messages; reconnects once if the server dropped it."""
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        if SMTP_STARTTLS:
+            server.starttls()
+        if SMTP_EMAIL and SMTP_PASS:
+            server.login(SMTP_EMAIL, SMTP_PASS)
+        return server
+
+    def send(self, to: str, payload: Dict[str, Any]) -> str:
+        msg = MIMEMultipart("alternative")
+        msg["From"] = SMTP_EMAIL
+        msg["To"] = to
+        msg["Subject"] = payload.get("subject") or ""
+        msg.attach(MIMEText(payload.get("html") or "", "html"))
+
+        for attempt in (1, 2):
+            if self._server is None:
+                self._server = self._connect()
+            try:
+                self._server.sendmail(SMTP_EMAIL, to, msg.as_string())
+                return "smtp"
+            except smtplib.SMTPServerDisconnected:
+                self._server = None
+                if attempt == 2:
+                    raise
+        return "smtp"
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+class TwilioTransport:
+    """Twilio REST client created once per worker (keeps its HTTP session alive)."""
+
+    def __init__(self):
+        self._client = None
+
+    def send(self, to: str, payload: Dict[str, Any]) -> str:
+        if self._client is None:
+            from twilio.rest import Client  # lazy: only needed when SMS is used
+
+            account_sid = os.getenv("TWILIO_ACCOUNT_SID", "")
+            auth_token = os.getenv("TWILIO_AUTH_TOKEN", "")
+            if not account_sid or not auth_token:
+                raise RuntimeError("Twilio credentials not configured.")
+            self._client = Client(account_sid, auth_token)
+
+        send_kwargs = {"body": payload.get("body") or "", "to": to}
+        messaging_sid = os.getenv("TWILIO_MESSAGING_SERVICE_SID", "")
+        if messaging_sid:
+            send_kwargs["messaging_service_sid"] = messaging_sid
+        else:
+            send_kwargs["from_"] = os.getenv("TWILIO_FROM", "+19786198530")
+
+        msg = self._client.messages.create(**send_kwargs)
+        return msg.sid
+
+    def close(self):
+        self._client = None
+
+
+class FakeSink:
+    """
+    Offline stand-in for SMTP and Twilio: appends each message as a JSON line to
+    DELIVERY_FAKE_SINK and keeps it in FakeSink.sent. Recipients containing 'fail'
+    raise, which exercises the retry path.
+    """
+
+    sent: List[Dict[str, Any]] = []
+    _lock = threading.Lock()
+
+    def __init__(self, channel: str):
+        self.channel = channel
+
+    def send(self, to: str, payload: Dict[str, Any]) -> str:
+        if "fail" in str(to).lower():
+            raise RuntimeError(f"fake {self.channel} sink rejected {to}")
+        record = {
+            "channel": self.channel,
+            "to": to,
+            "payload": payload,
+            "at": datetime.utcnow().isoformat(timespec="seconds"),
+        }
+        with FakeSink._lock:
+            FakeSink.sent.append(record)
+            with open(FAKE_SINK_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return f"fake-{len(FakeSink.sent)}"
+
+    def close(self):
+        pass
+
+
+def enabled_channels() -> List[str]:
+    """Channels this process can send; rows of other channels are left queued for whoever can."""
+    if DELIVERY_BACKEND == "fake" or (SMTP_EMAIL and SMTP_PASS):
+        return [CHANNEL_EMAIL, CHANNEL_SMS]
+    return [CHANNEL_SMS]
+
+
+def make_transports() -> Dict[str, Any]:
+    """One transport per enabled channel; each worker owns its own set (SMTP sessions aren't thread-safe)."""
+    if DELIVERY_BACKEND == "fake":
+        return {CHANNEL_EMAIL: FakeSink(CHANNEL_EMAIL), CHANNEL_SMS: FakeSink(CHANNEL_SMS)}
+    live = {CHANNEL_EMAIL: SmtpTransport, CHANNEL_SMS: TwilioTransport}
+    return {channel: live[channel]() for channel in enabled_channels()}
+
+
+# ---------- outbox ----------
+
+def enqueue_batch(jobs: List[Dict[str, Any]], cursor=None) -> str:
+    """
+    Persist one outbox row per job in a single transaction and wake the local workers
+    (started by create_app / delivery_worker.py, not here).
+    With `cursor` the rows join the caller's transaction (the caller commits, then the
+    workers pick them up on their next poll).
+    """
+    ensure_schema()
+    batch_id = str(uuid.uuid4())
+    rows = [
+        (
+            batch_id,
+            j["channel"],
+            j.get("patient_id"),
+            j["recipient"],
+            j.get("recipient_name"),
+            json.dumps(j.get("payload") or {}, ensure_ascii=False, default=str),
+        )
+        for j in jobs
+    ]
+    if cursor is not None:
+        _insert_jobs(cursor, rows)
+        return batch_id
+    with db_cursor(commit=True) as (_conn, cur):
+        _insert_jobs(cur, rows)
+    _pool.wake()
+    return batch_id
+
+
+def _insert_jobs(cur, rows: List[tuple]) -> None:
+    if not rows:
+        return
+    cur.fast_executemany = True
+    cur.executemany(
+        """
+        INSERT INTO dbo.DeliveryOutbox
+            (batch_id, channel, patient_id, recipient, recipient_name, payload)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+
+
+def get_batch_status(batch_id: str) -> Optional[Dict[str, Any]]:
+    ensure_schema()
+    with db_cursor() as (_conn, cur):
+        cur.execute(
+            """
+            SELECT job_id, channel, patient_id, recipient, recipient_name,
+                   status, attempts, last_error, created_at, sent_at
+            FROM dbo.DeliveryOutbox
+            WHERE batch_id = ?
+            ORDER BY job_id
+            """,
+            (batch_id,),
+        )
+        cols = [c[0] for c in cur.description]
+        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    if not rows:
+        return None
+
+    counts = {"queued": 0, "sending": 0, "sent": 0, "failed": 0}
+    jobs = []
+    for r in rows:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+        jobs.append({
+            "jobId": r["job_id"],
+            "channel": r["channel"],
+            "patientId": r["patient_id"],
+            "name": r["recipient_name"],
+            "recipient": r["recipient"],
+            "status": r["status"],
+            "attempts": r["attempts"],
+            "error": r["last_error"],
+            "sentAt": r["sent_at"].strftime("%Y-%m-%d %H:%M:%S") if r["sent_at"] else None,
+        })
+
+    done = counts["sent"] + counts["failed"]
+    return {
+        "batchId": batch_id,
+        "total": len(rows),
+        "counts": counts,
+        "complete": done == len(rows),
+        "jobs": jobs,
+    }
+
+
+def _claim(limit: int, channels: List[str]) -> List[Dict[str, Any]]:
+    """Atomically lease up to `limit` due jobs; READPAST lets concurrent workers skip each other's rows."""
+    if not channels:
+        return []
+    marks = ", ".join("?" for _ in channels)
+    with db_cursor(commit=True) as (_conn, cur):
+        # a lease that expired on the last allowed attempt is not retried: the message may
+        # already have gone out (worker died between send and bookkeeping)
+        cur.execute(
+            f"""
+            UPDATE o
+               SET status = 'failed', locked_until = NULL,
+                   last_error = ISNULL(o.last_error, 'lease expired after the last attempt')
+            FROM dbo.DeliveryOutbox AS o WITH (ROWLOCK, READPAST, UPDLOCK)
+            WHERE o.channel IN ({marks})
+              AND o.status = 'sending' AND o.locked_until < SYSUTCDATETIME()
+              AND o.attempts >= ?
+            """,
+            (*channels, DELIVERY_MAX_ATTEMPTS),
+        )
+        cur.execute(
+            f"""
+            UPDATE TOP (?) o
+               SET status       = 'sending',
+                   attempts     = o.attempts + 1,
+                   locked_until = DATEADD(second, ?, SYSUTCDATETIME())
+            OUTPUT inserted.job_id, inserted.batch_id, inserted.channel, inserted.patient_id,
+                   inserted.recipient, inserted.payload, inserted.attempts
+            FROM dbo.DeliveryOutbox AS o WITH (ROWLOCK, READPAST, UPDLOCK)
+            WHERE o.channel IN ({marks})
+              AND ((o.status = 'queued'  AND o.next_attempt_at <= SYSUTCDATETIME())
+                OR (o.status = 'sending' AND o.locked_until   <  SYSUTCDATETIME()
+                    AND o.attempts < ?))
+            """,
+            (limit, DELIVERY_LEASE_SECS, *channels, DELIVERY_MAX_ATTEMPTS),
+        )
+        cols = [c[0] for c in cur.description]
+        return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def _mark_sent(job: Dict[str, Any], payload: Dict[str, Any]) -> None:
+    """
+    Record the delivery first, in its own transaction, so nothing after it can leave a sent
+    message 'sending' (and re-sent once the lease runs out). The form_status stamp is best-effort.
+    """
+    with db_cursor(commit=True) as (_conn, cur):
+        cur.execute(
+            """
+            UPDATE dbo.DeliveryOutbox
+               SET status = 'sent', sent_at = SYSUTCDATETIME(), locked_until = NULL, last_error = NULL
+             WHERE job_id = ?
+            """,
+            (job["job_id"],),
+        )
+    try:
+        _stamp_forms(job, payload)
+    except Exception as e:
+        print(f"[Delivery] job {job['job_id']} sent, but stamping form_status failed: {e}")
+
+
+def _stamp_forms(job: Dict[str, Any], payload: Dict[str, Any]) -> None:
+    stamp_col = "email_sent" if job["channel"] == CHANNEL_EMAIL else "sms_sent"
+    form_ids = [int(float(f)) for f in payload.get("form_ids") or []]
+    if not (job.get("patient_id") and form_ids):
+        return
+    with db_cursor(commit=True) as (_conn, cur):
+        execute_in(
+            cur,
+            f"""
+            UPDATE form_status
+            SET {stamp_col} = GETDATE(),
+                due_date   = ?,
+                location   = ?,
+                status     = 'Active'
+            WHERE patient_id = ? AND form_id IN {{keys}}
+            """,
+            form_ids,
+            params_before=(payload.get("due_date"), payload.get("location"), job["patient_id"]),
+        )
+
+
+def _mark_failed(job: Dict[str, Any], error: str) -> None:
+    attempts = int(job.get("attempts") or 1)
+    if attempts >= DELIVERY_MAX_ATTEMPTS:
+        status, delay = "failed", 0
+    else:
+        # 30s, 60s, 120s, ... with +/-20% jitter so retries of one outage don't stampede
+        status = "queued"
+        delay = int(DELIVERY_BACKOFF_SECS * (2 ** (attempts - 1)) * random.uniform(0.8, 1.2))
+
+    with db_cursor(commit=True) as (_conn, cur):
+        cur.execute(
+            """
+            UPDATE dbo.DeliveryOutbox
+               SET status = ?, last_error = ?, locked_until = NULL,
+                   next_attempt_at = DATEADD(second, ?, SYSUTCDATETIME())
+             WHERE job_id = ?
+            """,
+            (status, str(error)[:1000], delay, job["job_id"]),
+        )
+        if status == "failed":
+            _release_reminder(cur, job)
+
+
+def _release_reminder(cur, job: Dict[str, Any]) -> None:
+    """
+    A reminder job failed for good: clear Appointments.ReminderSentAt so a later tick queues it
+    again, unless another channel of the same reminder was delivered or is still in flight
+    (the last job to fail does the release).
+    """
+    try:
+        appointment_id = json.loads(job["payload"] or "{}").get("appointment_id")
+    except ValueError:
+        return
+    if appointment_id is None:
+        return
+    cur.execute(
+        """
+        UPDATE dbo.Appointments
+           SET ReminderSentAt = NULL
+         WHERE AppointmentID = ?
+           AND NOT EXISTS (
+               SELECT 1 FROM dbo.DeliveryOutbox AS o
+                WHERE o.batch_id = ? AND o.status <> 'failed'
+                  AND JSON_VALUE(o.payload, '$.appointment_id') = ?
+           )
+        """,
+        (appointment_id, job.get("batch_id"), str(appointment_id)),
+    )
+    if cur.rowcount:
+        print(f"[Delivery] reminder for appointment {appointment_id} released for retry")
+
+
+def process_job(job: Dict[str, Any], transports: Dict[str, Any]) -> bool:
+    """Send one claimed job and record the outcome. Returns True when delivered."""
+    try:
+        payload = json.loads(job["payload"] or "{}")
+        transport = transports[job["channel"]]
+        ref = transport.send(job["recipient"], payload)
+        print(f"[Delivery] {job['channel']} job {job['job_id']} -> {job['recipient']} ({ref})")
+    except Exception as e:
+        print(f"[Delivery] {job['channel']} job {job['job_id']} failed: {e}")
+        _mark_failed(job, str(e))
+        return False
+    try:
+        _mark_sent(job, payload)
+    except Exception as e:
+        # the lease expires and the attempts cap in _claim() bounds any re-send
+        print(f"[Delivery] job {job['job_id']} sent but not recorded: {e}")
+    return True
+
+
+def drain_once(transports: Dict[str, Any], limit: int = DELIVERY_CLAIM) -> int:
+    """Claim and process one round of due jobs. Returns how many were claimed."""
+    jobs = _claim(limit, list(transports))
+    for job in jobs:
+        process_job(job, transports)
+    return len(jobs)
+
+
+def drain_until_empty(timeout_secs: float = 60) -> int:
+    """
+    Send due jobs on the calling thread until none are left or timeout_secs pass; for
+    short-lived processes that must not exit with their own jobs still queued.
+    Jobs whose retry is scheduled past the deadline stay queued for the workers.
+    Returns how many jobs were claimed.
+    """
+    ensure_schema()
+    deadline = time.monotonic() + timeout_secs
+    transports = make_transports()
+    total = 0
+    try:
+        while time.monotonic() < deadline:
+            claimed = drain_once(transports)
+            if not claimed:
+                break
+            total += claimed
+    finally:
+        for t in transports.values():
+            t.close()
+    return total
+
+
+# ---------- worker pool ----------
+
+class DeliveryWorkerPool:
+    """
+    Fixed number of daemon threads draining the outbox. Each thread owns its transports,
+    so an SMTP session is opened once per worker and reused for every message it sends.
+    """
+
+    def __init__(self, workers: int = DELIVERY_WORKERS, poll_secs: float = DELIVERY_POLL_SECS):
+        self.workers = max(1, workers)
+        self.poll_secs = poll_secs
+        self._threads: List[threading.Thread] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"delivery-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for t in self._threads:
+                t.start()
+            print(f"[Delivery] started {self.workers} worker(s), backend={DELIVERY_BACKEND}, "
+                  f"channels={','.join(enabled_channels())}")
+            if CHANNEL_EMAIL not in enabled_channels():
+                print("[Delivery] SMTP_EMAIL / SMTP_PASS not set: email jobs stay queued")
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _run(self) -> None:
+        transports = make_transports()
+        try:
+            while not self._stop.is_set():
+                try:
+                    claimed = drain_once(transports)
+                except Exception as e:
+                    print(f"[Delivery] worker error: {e}")
+                    claimed = 0
+                if claimed:
+                    continue  # keep draining while there is work
+                # idle: drop SMTP sessions rather than hold them open between batches
+                for t in transports.values():
+                    t.close()
+                self._wake.wait(self.poll_secs)
+                self._wake.clear()
+        finally:
+            for t in transports.values():
+                t.close()
+
+
+_pool = DeliveryWorkerPool()
+
+
+def start_workers() -> None:
+    """
+    Start this process's worker threads (idempotent); called from create_app().
+    DELIVERY_IN_PROCESS=0 or DELIVERY_WORKERS=0 disables them (run delivery_worker.py instead).
+    """
+    if DELIVERY_WORKERS <= 0 or not DELIVERY_IN_PROCESS:
+        return
+    ensure_schema()
+    _pool.start()
+
+
+def _reset_after_fork():
+    # Threads don't survive fork; a child process gets a fresh, not-yet-started pool
+    global _pool
+    _pool = DeliveryWorkerPool()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
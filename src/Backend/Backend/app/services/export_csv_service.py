@@ -7,39 +7,21 @@
 
 import csv
 import io
+import itertools
+import os
 import datetime
 import zipfile
-from typing import Iterable, Tuple, Dict, Any, List, Optional
-from ..database import get_connection
+from typing import Iterable, Iterator, Tuple, Dict, Any, List, Optional
+from ..database import KeyStage, db_cursor, fetch_in, get_connection
+from . import csv_pivot
+from .incremental_export import Window
+from .schema_registry import Schema, get_schema
 
+# Rows pulled per fetchmany() in streaming mode
+STREAM_FETCH_SIZE = int(os.getenv("EXPORT_CSV_FETCH_SIZE", "1000"))
 
-# ---------- small helpers ----------
-
-def _in_clause(values: Iterable[Any]) -> Tuple[str, Tuple[Any, ...]]:
-    vals = tuple(values or [])
-    if not vals:
-        return "(NULL)", tuple()
-    return "(" + ",".join(["?"] * len(vals)) + ")", vals
-
-
-def _cols(cur, table: str) -> List[str]:
-    cur.execute("""
-        SELECT COLUMN_NAME
-        FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_NAME = ?
-        ORDER BY ORDINAL_POSITION
-    """, (table,))
-    return [r[0] for r in cur.fetchall()]
-
-
-def _pick(cols: List[str], *candidates: str) -> Optional[str]:
-    low = {c.lower(): c for c in cols}
-    for cand in candidates:
-        name = low.get(cand.lower())
-        if name:
-            return name
-    return None
 
+# ---------- small helpers ----------
 
 def _slug_filename(s: str) -> str:
     s = (s or "").strip().lower()
@@ -70,54 +52,35 @@ def _csv_bytes(rows: List[Dict[str, Any]]) -> bytes:
     return sio.getvalue().encode("utf-8-sig")
 
 
-# ---------- main exporter ----------
+# ---------- filter scope (shared by CSV and batch PDF exports) ----------
 
-def generate_csv_export(filters: Dict[str, Any] | None = None) -> Tuple[bytes, str, str]:
+def _filter_scope(cur, filters: Dict[str, Any], stage: KeyStage) -> Tuple[Schema, str, List[Any]]:
     """
-    Base behavior: one CSV with (patient, form) and latest submission timestamp.
-    If filters.includeAnswers == True -> return a ZIP, one CSV per template (fields as columns).
-    Supported filters keys (all optional):
-      respectPage, patientIds
-      respectTemplates, templateIds
-      respectStatus, statuses
-      respectDueDate, dueFrom, dueTo
-      includeCurrentAndArchived (False to exclude archived if column exists)
-      includeAnswers (True to build per-template files and pivot answers)
-      groupPerTemplate (True -> ZIP per template; kept for parity)
-      respectLocation/location (ignored unless you wire a location join)
+    Check the (cached) column mapping of patients/forms/form_status and turn the export
+    filter object into a WHERE clause over aliases p / f / fs.
+    Long id lists are staged into temp tables through `stage` (2100-parameter cap).
+    Returns (schema, where_sql, params).
     """
-    filters = filters or {}
-
-    conn = get_connection()
-    if not conn:
-        raise RuntimeError("No DB connection")
-
-    cur = conn.cursor()
-
-    # Discover columns on core tables
-    patients_cols     = _cols(cur, "patients")
-    forms_cols        = _cols(cur, "forms")
-    form_status_cols  = _cols(cur, "form_status")
+    schema = get_schema(cur)
 
     # Patients
-    P_ID    = _pick(patients_cols, "id", "patient_id")
-    P_FIRST = _pick(patients_cols, "first_name", "firstname")
-    P_LAST  = _pick(patients_cols, "last_name", "lastname")
+    P_ID    = schema.patients.id
+    P_FIRST = schema.patients.first_name
+    P_LAST  = schema.patients.last_name
     if not (P_ID and P_FIRST and P_LAST):
         raise RuntimeError("Required columns not found on dbo.patients (need id, first_name, last_name).")
 
     # Forms
-    F_ID   = _pick(forms_cols, "form_id", "id", "template_id")
-    F_NAME = _pick(forms_cols, "form_name", "name", "template_name", "title")
+    F_ID   = schema.forms.id
     if not F_ID:
         raise RuntimeError("Required column not found on dbo.forms (need form_id/id/template_id).")
 
     # Form status
-    FS_PATIENT  = _pick(form_status_cols, "patient_id")
-    FS_FORM     = _pick(form_status_cols, "form_id")
-    FS_STATUS   = _pick(form_status_cols, "status")
-    FS_DUE      = _pick(form_status_cols, "due_date", "dueon", "due_on")
-    FS_ARCHIVED = _pick(form_status_cols, "is_archived", "archived", "activeflag")
+    FS_PATIENT  = schema.form_status.patient_id
+    FS_FORM     = schema.form_status.form_id
+    FS_STATUS   = schema.form_status.status
+    FS_DUE      = schema.form_status.due_date
+    FS_ARCHIVED = schema.form_status.archived
     if not (FS_PATIENT and FS_FORM and FS_STATUS):
         raise RuntimeError("Required columns not found on dbo.form_status (need patient_id, form_id, status).")
 
@@ -126,18 +89,18 @@ def generate_csv_export(filters: Dict[str, Any] | None = None) -> Tuple[bytes, s
     params: List[Any] = []
 
     if filters.get("respectPage") and filters.get("patientIds"):
-        frag, vals = _in_clause(filters["patientIds"])
-        where_parts.append(f"p.{P_ID} IN {frag}")
+        frag, vals = stage.predicate(f"p.{P_ID}", filters["patientIds"])
+        where_parts.append(frag)
         params.extend(vals)
 
     if filters.get("respectTemplates") and filters.get("templateIds"):
-        frag, vals = _in_clause(filters["templateIds"])
-        where_parts.append(f"f.{F_ID} IN {frag}")
+        frag, vals = stage.predicate(f"f.{F_ID}", filters["templateIds"])
+        where_parts.append(frag)
         params.extend(vals)
 
     if filters.get("respectStatus") and filters.get("statuses"):
-        frag, vals = _in_clause(filters["statuses"])
-        where_parts.append(f"fs.{FS_STATUS} IN {frag}")
+        frag, vals = stage.predicate(f"fs.{FS_STATUS}", filters["statuses"])
+        where_parts.append(frag)
         params.extend(vals)
 
     if filters.get("respectDueDate"):
@@ -152,18 +115,86 @@ def generate_csv_export(filters: Dict[str, Any] | None = None) -> Tuple[bytes, s
         where_parts.append(f"(fs.{FS_ARCHIVED} IN (0, '0', 'False', 'N'))")
 
     where_sql = "WHERE " + " AND ".join(where_parts) if where_parts else ""
+    return schema, where_sql, params
+
+
+def resolve_patient_ids(filters: Dict[str, Any] | None = None) -> List[int]:
+    """Distinct patient ids matched by the same filter object generate_csv_export() takes."""
+    filters = filters or {}
+    with db_cursor() as (_conn, cur), KeyStage(cur) as stage:
+        schema, where_sql, params = _filter_scope(cur, filters, stage)
+        P_ID = schema.patients.id
+        cur.execute(f"""
+            SELECT DISTINCT p.{P_ID} AS patient_id
+            FROM dbo.patients AS p
+            LEFT JOIN dbo.form_status AS fs
+                   ON p.{P_ID} = fs.{schema.form_status.patient_id}
+            LEFT JOIN dbo.forms AS f
+                   ON fs.{schema.form_status.form_id} = f.{schema.forms.id}
+            {where_sql}
+            ORDER BY p.{P_ID}
+        """, tuple(params))
+        return [int(r[0]) for r in cur.fetchall()]
+
+
+# ---------- query builders ----------
+
+def _base_query(cur, filters: Dict[str, Any], stage: KeyStage,
+                per_template: bool = False, typed: bool = False,
+                window: Optional[Window] = None) -> Tuple[str, List[Any]]:
+    """
+    (patient, form, latest submission) rows for the filter object.
+    per_template=True orders by template first (NULL templates last) so a streaming
+    reader sees each template's rows contiguously.
+    typed=True returns due_date / completed_date as DATETIME2 instead of 'YYYY-MM-DD hh:mm:ss' text.
+    window (incremental mode) keeps only the (patient, form) pairs changed inside it; the
+    latest-submission ranking then only runs over those pairs.
+    """
+    schema, where_sql, params = _filter_scope(cur, filters, stage)
+    P_ID, P_FIRST, P_LAST = schema.patients.id, schema.patients.first_name, schema.patients.last_name
+    F_ID, F_NAME = schema.forms.id, schema.forms.name
+    fs_cols = schema.form_status
+    FS_PATIENT, FS_FORM, FS_STATUS, FS_DUE = fs_cols.patient_id, fs_cols.form_id, fs_cols.status, fs_cols.due_date
 
     # Latest submission CTE from dbo.FormSubmissions
-    subs_cols = _cols(cur, "FormSubmissions")
-    SUBS_ID = _pick(subs_cols, "submission_id", "id")
-    SUBS_FID = _pick(subs_cols, "form_id")
-    SUBS_PID = _pick(subs_cols, "patient_id")
-    SUBS_AT = _pick(subs_cols, "submitted_at", "created_on", "created_at")
+    SUBS_ID = schema.submissions.id
+    SUBS_FID = schema.submissions.form_id
+    SUBS_PID = schema.submissions.patient_id
+    SUBS_AT = schema.submissions.submitted_at
     if not (SUBS_ID and SUBS_FID and SUBS_PID and SUBS_AT):
         raise RuntimeError("FormSubmissions required columns not found (need submission_id, form_id, patient_id, submitted_at).")
 
+    if typed:
+        due_sql = f"TRY_CONVERT(DATETIME2, fs.{FS_DUE})" if FS_DUE else "CAST(NULL AS DATETIME2)"
+        completed_sql = "CAST(ls.submitted_at AS DATETIME2)"
+    else:
+        due_sql = f"CONVERT(VARCHAR(19), fs.{FS_DUE}, 120)" if FS_DUE else "CAST(NULL AS NVARCHAR(19))"
+        completed_sql = "CONVERT(VARCHAR(19), ls.submitted_at, 120)"
+
+    if per_template:
+        order_sql = f"CASE WHEN f.{F_ID} IS NULL THEN 1 ELSE 0 END, f.{F_ID}, p.{P_ID}"
+    else:
+        order_sql = f"p.{P_ID}, f.{F_ID}"
+
+    changed_sql, changed_params = window.changed_pairs(schema) if window is not None else ("", [])
+    if changed_sql:
+        changed_cte = f"""Changed AS (
+            {changed_sql}
+        ),
+        """
+        changed_subs = f"""
+            WHERE EXISTS (SELECT 1 FROM Changed AS c
+                          WHERE c.form_id = s.{SUBS_FID} AND c.patient_id = s.{SUBS_PID})"""
+        changed_join = f"""
+        INNER JOIN Changed AS ch
+               ON ch.form_id = fs.{FS_FORM}
+              AND ch.patient_id = fs.{FS_PATIENT}"""
+        params = changed_params + params
+    else:
+        changed_cte = changed_subs = changed_join = ""
+
     base_sql = f"""
-        WITH LatestSubmission AS (
+        WITH {changed_cte}LatestSubmission AS (
             SELECT
                 {SUBS_ID}  AS submission_id,
                 {SUBS_FID} AS form_id,
@@ -173,7 +204,7 @@ def generate_csv_export(filters: Dict[str, Any] | None = None) -> Tuple[bytes, s
                     PARTITION BY {SUBS_FID}, {SUBS_PID}
                     ORDER BY {SUBS_AT} DESC
                 ) AS rn
-            FROM dbo.FormSubmissions
+            FROM dbo.FormSubmissions AS s{changed_subs}
         )
         SELECT 
             ls.submission_id,
@@ -182,11 +213,11 @@ def generate_csv_export(filters: Dict[str, Any] | None = None) -> Tuple[bytes, s
             f.{F_ID}                         AS form_id,
             {("f." + F_NAME) if F_NAME else "CAST(NULL AS NVARCHAR(255))"} AS form_name,
             fs.{FS_STATUS}                   AS status,
-            {"CONVERT(VARCHAR(19), fs." + FS_DUE + ", 120)" if FS_DUE else "CAST(NULL AS NVARCHAR(19))"} AS due_date,
-            CONVERT(VARCHAR(19), ls.submitted_at, 120) AS completed_date
+            {due_sql} AS due_date,
+            {completed_sql} AS completed_date
         FROM dbo.patients AS p
         LEFT JOIN dbo.form_status AS fs
-               ON p.{P_ID} = fs.{FS_PATIENT}
+               ON p.{P_ID} = fs.{FS_PATIENT}{changed_join}
         LEFT JOIN dbo.forms AS f
                ON fs.{FS_FORM} = f.{F_ID}
         LEFT JOIN LatestSubmission AS ls
@@ -194,135 +225,286 @@ def generate_csv_export(filters: Dict[str, Any] | None = None) -> Tuple[bytes, s
               AND ls.patient_id = p.{P_ID}
               AND ls.rn = 1
         {where_sql}
-        ORDER BY p.{P_ID}, f.{F_ID};
+        ORDER BY {order_sql};
     """
+    return base_sql, params
 
-    cur.execute(base_sql, tuple(params))
-    base_cols = [d[0] for d in cur.description]
-    base_rows = [dict(zip(base_cols, r)) for r in cur.fetchall()]
-    print(f"[CSV EXPORT] base rows: {len(base_rows)}")
-
-    # If NOT including answers -> return single CSV
-    if not filters.get("includeAnswers"):
-        csv_bytes = _csv_bytes(base_rows)
-        return csv_bytes, f"forms-export-{datetime.datetime.now():%Y%m%d-%H%M%S}.csv", "text/csv"
-
-    # ---------- Answers pivot (Lobbie-style) ----------
-
-    # Discover fields & responses tables
-    ff_cols = _cols(cur, "FormFields")
-    fr_cols = _cols(cur, "FormResponses")
-
-    # FormFields picks (supports your schema: field_id, form_id, field_label)
-    FF_ID     = _pick(ff_cols, "field_id", "id")
-    FF_FORMID = _pick(ff_cols, "form_id", "template_id")
-    FF_LABEL  = _pick(
-        ff_cols,
-        "field_label",            # your table has this column
-        "label", "question", "title", "text", "name"
-    )
-    FF_ORDER  = _pick(ff_cols, "display_order", "sort_order", "position", "order")  # optional
-
-    if not (FF_ID and FF_FORMID and FF_LABEL):
-        raise RuntimeError("FormFields required columns not found. Need field_id, form_id and field_label/label/question/name.")
 
-    # FormResponses picks (broadened for resilience)
-    FR_ID       = _pick(fr_cols, "id", "response_id")
-    FR_SUBID    = _pick(fr_cols, "submission_id", "patientform_id", "header_id")
-    FR_FIELDID  = _pick(fr_cols, "field_id", "question_id")
-    FR_VALUE    = _pick(
-        fr_cols,
-        "value", "answer", "response",
-        "response_value", "answer_value",
-        "value_text", "text", "choice", "number", "date"
-    )
-
-    if not (FR_SUBID and FR_FIELDID and FR_VALUE):
+def _answer_schema(cur) -> Schema:
+    """Check FormFields / FormResponses have the columns the answers pivot needs."""
+    schema = get_schema(cur)
+    ff, fr = schema.fields, schema.responses
+    if not (ff.id and ff.form_id and ff.label):
+        raise RuntimeError("FormFields required columns not found. Need field_id, form_id and field_label/label/question/name.")
+    if not (fr.submission_id and fr.field_id and fr.value):
         raise RuntimeError("FormResponses required columns not found. Need submission_id, field_id and value/answer/response.")
+    return schema
 
-    # Work on forms present in base rows
-    form_ids = sorted({r["form_id"] for r in base_rows if r.get("form_id") is not None})
-    if not form_ids:
-        # No forms -> return base CSV
-        csv_bytes = _csv_bytes(base_rows)
-        return csv_bytes, f"forms-export-{datetime.datetime.now():%Y%m%d-%H%M%S}.csv", "text/csv"
 
-    # Load field labels for those forms
-    frag, vals = _in_clause(form_ids)
+def _load_form_fields(cur, a: Schema, form_ids: List[Any]) -> Dict[Any, List[Tuple[Any, str]]]:
+    """form_id -> ordered list of (field_id, label)."""
+    if not form_ids:
+        return {}
+    FF_ORDER = a.fields.order
     q_fields = f"""
-        SELECT {FF_ID} AS field_id,
-               {FF_FORMID} AS form_id,
-               {FF_LABEL} AS label
+        SELECT {a.fields.id} AS field_id,
+               {a.fields.form_id} AS form_id,
+               {a.fields.label} AS label
                {(", " + FF_ORDER + " AS sort_order") if FF_ORDER else ""}
         FROM dbo.FormFields
-        WHERE {FF_FORMID} IN {frag}
+        WHERE {a.fields.form_id} IN {{keys}}
     """
-    cur.execute(q_fields, vals)
-    cols = [d[0] for d in cur.description]
-    fields_rows = [dict(zip(cols, r)) for r in cur.fetchall()]
-
-    # Build form_id -> ordered list of (field_id, label)
-    form_fields: Dict[Any, List[Tuple[Any, str]]] = {}
-    for fr in fields_rows:
-        lbl = (fr["label"] or "").strip()
-        form_fields.setdefault(fr["form_id"], []).append((fr["field_id"], lbl))
-
-    # Sort by sort_order if present; else alphabetical by label
-    if fields_rows and "sort_order" in fields_rows[0]:
-        for fid in form_fields:
-            order_map = {r["field_id"]: r.get("sort_order") for r in fields_rows if r["form_id"] == fid}
-            form_fields[fid].sort(key=lambda x: (order_map.get(x[0]) is None, order_map.get(x[0], 10**9), str(x[1]).lower()))
-    else:
-        for fid in form_fields:
-            form_fields[fid].sort(key=lambda x: str(x[1]).lower())
+    # Sorted by sort_order if present; else alphabetical by label
+    return csv_pivot.build_field_order(fetch_in(cur, q_fields, form_ids))
+
 
-    # Load responses for the submissions from base_rows
-    sub_ids = sorted({r["submission_id"] for r in base_rows if r.get("submission_id") is not None})
+def _load_answers(cur, a: Schema, sub_ids: List[Any]) -> Dict[Any, Dict[Any, Any]]:
+    """submission_id -> {field_id: value}."""
     ans_map: Dict[Any, Dict[Any, Any]] = {}
-    if sub_ids:
-        frag, vals = _in_clause(sub_ids)
-        q_resp = f"""
-            SELECT {FR_SUBID}   AS submission_id,
-                   {FR_FIELDID} AS field_id,
-                   {FR_VALUE}   AS value
-            FROM dbo.FormResponses
-            WHERE {FR_SUBID} IN {frag}
-        """
-        cur.execute(q_resp, vals)
-        for submission_id, field_id, value in cur.fetchall():
-            ans_map.setdefault(submission_id, {})[field_id] = value
+    if not sub_ids:
+        return ans_map
+    q_resp = f"""
+        SELECT {a.responses.submission_id}   AS submission_id,
+               {a.responses.field_id} AS field_id,
+               {a.responses.value}   AS value
+        FROM dbo.FormResponses
+        WHERE {a.responses.submission_id} IN {{keys}}
+    """
+    for r in fetch_in(cur, q_resp, sub_ids):
+        ans_map.setdefault(r["submission_id"], {})[r["field_id"]] = r["value"]
+    return ans_map
+
 
-    # Group base rows per template and pivot answers into columns
+# ---------- main exporter ----------
+
+def generate_csv_export(filters: Dict[str, Any] | None = None,
+                        window: Optional[Window] = None) -> Tuple[bytes, str, str]:
+    """
+    Base behavior: one CSV with (patient, form) and latest submission timestamp.
+    If filters.includeAnswers == True -> return a ZIP, one CSV per template (fields as columns).
+    Supported filters keys (all optional):
+      respectPage, patientIds
+      respectTemplates, templateIds
+      respectStatus, statuses
+      respectDueDate, dueFrom, dueTo
+      includeCurrentAndArchived (False to exclude archived if column exists)
+      includeAnswers (True to build per-template files and pivot answers)
+      groupPerTemplate (True -> ZIP per template; kept for parity)
+      respectLocation/location (ignored unless you wire a location join)
+      format ("csv" default | "parquet" | "arrow" -> typed columnar files, see columnar_export)
+    window (from incremental_export.open_window) limits the export to pairs changed since a watermark.
+    Buffers the whole file in memory; stream_csv_export() is the flat-memory variant.
+    """
+    filters = filters or {}
+
+    fmt = str(filters.get("format") or "csv").lower()
+    if fmt != "csv":
+        from .columnar_export import generate_columnar_export
+        return generate_columnar_export(filters, fmt, window=window)
+
+    with db_cursor() as (_conn, cur), KeyStage(cur) as stage:
+        base_sql, params = _base_query(cur, filters, stage, window=window)
+        cur.execute(base_sql, tuple(params))
+        base_cols = [d[0] for d in cur.description]
+        base_rows = [dict(zip(base_cols, r)) for r in cur.fetchall()]
+        print(f"[CSV EXPORT] base rows: {len(base_rows)}")
+
+        # If NOT including answers -> return single CSV
+        if not filters.get("includeAnswers"):
+            csv_bytes = _csv_bytes(base_rows)
+            return csv_bytes, f"forms-export-{datetime.datetime.now():%Y%m%d-%H%M%S}.csv", "text/csv"
+
+        # ---------- Answers pivot (Lobbie-style) ----------
+        a = _answer_schema(cur)
+
+        # Work on forms present in base rows
+        form_ids = sorted({r["form_id"] for r in base_rows if r.get("form_id") is not None})
+        if not form_ids:
+            # No forms -> return base CSV
+            csv_bytes = _csv_bytes(base_rows)
+            return csv_bytes, f"forms-export-{datetime.datetime.now():%Y%m%d-%H%M%S}.csv", "text/csv"
+
+        form_fields = _load_form_fields(cur, a, form_ids)
+
+        # Load responses for the submissions from base_rows
+        sub_ids = sorted({r["submission_id"] for r in base_rows if r.get("submission_id") is not None})
+        ans_map = _load_answers(cur, a, sub_ids)
+
+    # Group base rows per template; each template pivots independently (see csv_pivot)
     per_template: Dict[Any, List[Dict[str, Any]]] = {}
-    counters: Dict[Any, int] = {}
     for row in base_rows:
-        fid = row["form_id"]
-        counters[fid] = counters.get(fid, 0) + 1
-        form_no = counters[fid]
-
-        widened = {
-            "Form #": form_no,
-            "Created On": row.get("completed_date") or "",
-            "Location": "",  # fill if you wire a location join
-            "Patient": row.get("patient_name") or "",
-            "Template": row.get("form_name") or f"Form {fid}",
-            "Completed On": row.get("completed_date") or "",
-        }
-
-        fields_for_form = form_fields.get(fid, [])
-        given = ans_map.get(row.get("submission_id"), {})
-        for field_id, label in fields_for_form:
-            col = label or f"Field {field_id}"
-            widened[col] = given.get(field_id, "")
-
-        per_template.setdefault(fid, []).append(widened)
+        per_template.setdefault(row["form_id"], []).append(row)
+    rendered = csv_pivot.render_templates(per_template, form_fields, ans_map)
 
     # Emit ZIP: one CSV per template
     mem = io.BytesIO()
     with zipfile.ZipFile(mem, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for fid, rows in per_template.items():
-            base_name = _slug_filename(rows[0].get("Template") or f"form-{fid}")
+        for fid, data in rendered:
+            first = per_template[fid][0]
+            base_name = _slug_filename(first.get("form_name") or f"Form {fid}")
             fname = f"{base_name}-{datetime.datetime.now():%Y%m%d-%H%M%S}.csv"
-            zf.writestr(fname, _csv_bytes(rows))
+            zf.writestr(fname, data)
     mem.seek(0)
     return mem.getvalue(), f"forms-export-{datetime.datetime.now():%Y%m%d-%H%M%S}.zip", "application/zip"
+
+
+# ---------- streaming exporter ----------
+
+class _ChunkSink:
+    """Unseekable write target for ZipFile: zipfile appends bytes, the generator drains them."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class _CsvEncoder:
+    """csv.writer that hands back encoded bytes per batch instead of growing one buffer."""
+
+    def __init__(self, bom: bool = True):
+        self._sio = io.StringIO()
+        self._w = csv.writer(self._sio)
+        self._bom = bom
+
+    def rows(self, rows: Iterable[Iterable[Any]]) -> bytes:
+        for r in rows:
+            self._w.writerow(r)
+        text = self._sio.getvalue()
+        self._sio.seek(0)
+        self._sio.truncate()
+        if self._bom:
+            self._bom = False
+            return text.encode("utf-8-sig")
+        return text.encode("utf-8")
+
+
+def _fetch_batches(cur, size: int):
+    while True:
+        batch = cur.fetchmany(size)
+        if not batch:
+            return
+        yield batch
+
+
+def stream_csv_export(filters: Dict[str, Any] | None = None,
+                      window: Optional[Window] = None) -> Tuple[Iterator[bytes], str, str]:
+    """
+    Same output as generate_csv_export() but as an iterator of byte chunks:
+    the base cursor is read with fetchmany(STREAM_FETCH_SIZE), CSV lines are encoded per
+    batch and, with includeAnswers, ZIP entries are written incrementally to an unseekable
+    sink. Memory stays flat in the number of rows.
+    The query runs (and schema errors raise) before this returns; the pooled connections
+    are released when the iterator is exhausted or closed.
+    """
+    filters = filters or {}
+    include_answers = bool(filters.get("includeAnswers"))
+    stamp = f"{datetime.datetime.now():%Y%m%d-%H%M%S}"
+
+    conn = get_connection()
+    cur = conn.cursor()
+    stage = KeyStage(cur)
+    try:
+        base_sql, params = _base_query(cur, filters, stage, per_template=include_answers, window=window)
+        answers = _answer_schema(cur) if include_answers else None
+        cur.execute(base_sql, tuple(params))
+        cols = [d[0] for d in cur.description]
+        first = cur.fetchmany(STREAM_FETCH_SIZE)
+    except BaseException:
+        _release(conn, cur, stage)
+        raise
+
+    # Templates sort first, so a NULL form_id on the first row means no template rows at all
+    if not include_answers or not first or first[0][cols.index("form_id")] is None:
+        return _stream_base(conn, cur, stage, cols, first), f"forms-export-{stamp}.csv", "text/csv"
+    return (_stream_zip(conn, cur, stage, cols, first, answers, stamp),
+            f"forms-export-{stamp}.zip", "application/zip")
+
+
+def _release(conn, cur, stage: KeyStage) -> None:
+    try:
+        # finish the pending result set first, or the DROP TABLE below hits a busy connection
+        cur.cancel()
+    except Exception:
+        pass
+    stage.close()
+    conn.close()
+
+
+def _stream_base(conn, cur, stage: KeyStage, cols: List[str], first: List[Any]) -> Iterator[bytes]:
+    try:
+        enc = _CsvEncoder()
+        if not first:
+            yield "No data found.\n".encode("utf-8-sig")
+            return
+        yield enc.rows([cols])
+        total = 0
+        for batch in itertools.chain([first], _fetch_batches(cur, STREAM_FETCH_SIZE)):
+            total += len(batch)
+            yield enc.rows(batch)
+        print(f"[CSV EXPORT] streamed base rows: {total}")
+    finally:
+        _release(conn, cur, stage)
+
+
+def _stream_zip(conn, cur, stage: KeyStage, cols: List[str], first: List[Any],
+                a: Schema, stamp: str) -> Iterator[bytes]:
+    # Lookups need their own connection: the base cursor still has pending rows
+    lookup_conn = get_connection()
+    try:
+        lookup = lookup_conn.cursor()
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            entry = None
+            enc = None
+            fid_current: Any = object()
+            plan: Optional[csv_pivot.TemplatePlan] = None
+            form_no = 0
+
+            for batch in itertools.chain([first], _fetch_batches(cur, STREAM_FETCH_SIZE)):
+                rows = [dict(zip(cols, r)) for r in batch]
+                sub_ids = sorted({r["submission_id"] for r in rows if r.get("submission_id") is not None})
+                ans_map = _load_answers(lookup, a, sub_ids)
+
+                out: List[List[Any]] = []
+                for row in rows:
+                    fid = row["form_id"]
+                    if fid != fid_current:
+                        # Template boundary: finish the previous entry, open the next one
+                        if entry is not None:
+                            entry.write(enc.rows(out))
+                            out = []
+                            entry.close()
+                        fid_current = fid
+                        fields = _load_form_fields(lookup, a, [fid]).get(fid, []) if fid is not None else []
+                        plan = csv_pivot.TemplatePlan.build(fid, fields)
+                        form_no = 0
+                        base_name = _slug_filename(row.get("form_name") or f"Form {fid}")
+                        entry = zf.open(f"{base_name}-{stamp}.csv", "w", force_zip64=True)
+                        enc = _CsvEncoder()
+                        out.append(list(plan.header))
+
+                    form_no += 1
+                    out.append(plan.row(row, form_no, ans_map.get(row.get("submission_id"), {})))
+
+                if entry is not None and out:
+                    entry.write(enc.rows(out))
+                yield sink.drain()
+
+            if entry is not None:
+                entry.close()
+        # central directory is written on ZipFile close
+        yield sink.drain()
+    finally:
+        lookup_conn.close()
+        _release(conn, cur, stage)
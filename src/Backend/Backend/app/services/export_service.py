@@ -1,13 +1,24 @@
 from __future__ import annotations
 
+import json
+import multiprocessing
 import os
+import shutil
+import tempfile
+import threading
+import time
 import uuid
-from typing import Dict, Optional
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
 
 import pdfkit  # pip install pdfkit
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
-from .fetch_forms import get_patient_export_data
+from ..database import db_cursor
+from . import pdf_cache
+from .fetch_forms import get_patient_export_data, get_patients_export_data
 
 
 # --------------------------------------------------------------------------------------
@@ -171,58 +182,437 @@ WKHTML_OPTS: Dict[str, str] = {
 }
 
 # --------------------------------------------------------------------------------------
-# Simple in-memory job store
+# Durable job store (dbo.ExportJobs) shared by every gunicorn worker
 # --------------------------------------------------------------------------------------
 
-_JOBS: Dict[str, Dict[str, Optional[str]]] = {}
-# structure: { export_id: {"status": "pending"|"ready"|"error", "path": "<abs pdf path>"} }
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))               # concurrent renders per process
+EXPORT_JOB_TIMEOUT = int(os.getenv("EXPORT_JOB_TIMEOUT", "600"))     # secs before a silent job is failed
+EXPORT_MP_START = os.getenv("EXPORT_MP_START", "spawn")              # spawn | forkserver | fork
+EXPORT_BATCH_MAX = int(os.getenv("EXPORT_BATCH_MAX", "500"))         # patients per batch export
+EXPORT_BATCH_THREADS = int(os.getenv("EXPORT_BATCH_THREADS", "4"))   # wkhtmltopdf processes per batch job
+EXPORT_JOB_RETENTION = int(os.getenv("EXPORT_JOB_RETENTION", "86400"))  # secs a finished job (and its file) is kept
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_READY = "ready"
+STATUS_ERROR = "error"
+
+_DDL = """
+IF OBJECT_ID('dbo.ExportJobs', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.ExportJobs (
+        export_id    CHAR(36)        NOT NULL CONSTRAINT PK_ExportJobs PRIMARY KEY,
+        kind         VARCHAR(20)     NOT NULL,
+        params       NVARCHAR(MAX)   NULL,
+        status       VARCHAR(10)     NOT NULL,
+        progress     INT             NOT NULL CONSTRAINT DF_ExportJobs_progress DEFAULT 0,
+        detail       NVARCHAR(MAX)   NULL,
+        error        NVARCHAR(2000)  NULL,
+        file_path    NVARCHAR(500)   NULL,
+        created_at   DATETIME2       NOT NULL CONSTRAINT DF_ExportJobs_created DEFAULT SYSUTCDATETIME(),
+        updated_at   DATETIME2       NOT NULL CONSTRAINT DF_ExportJobs_updated DEFAULT SYSUTCDATETIME(),
+        finished_at  DATETIME2       NULL
+    );
+    CREATE INDEX IX_ExportJobs_status ON dbo.ExportJobs (status, updated_at);
+END
+"""
+
+_SCHEMA_READY = False
+_SCHEMA_LOCK = threading.Lock()
+
+
+def ensure_schema() -> None:
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+    with _SCHEMA_LOCK:
+        if not _SCHEMA_READY:
+            with db_cursor(commit=True) as (_conn, cur):
+                cur.execute(_DDL)
+            _SCHEMA_READY = True
+
+
+def _create_job(export_id: str, kind: str, params: Dict[str, Any]) -> None:
+    ensure_schema()
+    with db_cursor(commit=True) as (_conn, cur):
+        cur.execute(
+            "INSERT INTO dbo.ExportJobs (export_id, kind, params, status) VALUES (?, ?, ?, ?)",
+            (export_id, kind, json.dumps(params), STATUS_PENDING),
+        )
+    _maybe_purge()
+
+
+# ---------- per-job artifacts ----------
+# A ready job owns <EXPORT_DIR>/<export_id>.<ext>: a hardlink (or copy) of the cache entry,
+# so cache invalidation / eviction can never pull the file out from under a finished job.
+# The file is deleted together with the job row after EXPORT_JOB_RETENTION.
+
+_PURGE_EVERY = 600
+_last_purge = 0.0
+
+
+def _job_path(export_id: str, ext: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{export_id}{ext}")
+
+
+def _pin(export_id: str, produce, ext: str = ".pdf") -> str:
+    """
+    Link the cache file returned by produce() to the job's own path. If the cache entry
+    is removed between produce() and the link, produce() runs once more.
+    """
+    dst = _job_path(export_id, ext)
+    if os.path.exists(dst):
+        os.remove(dst)
+    for attempt in (1, 2):
+        src = produce()
+        try:
+            try:
+                os.link(src, dst)
+            except FileNotFoundError:
+                raise
+            except OSError:
+                shutil.copyfile(src, dst)   # no hardlinks on this filesystem / across devices
+            return dst
+        except FileNotFoundError:
+            if attempt == 2:
+                raise
+    return dst
+
+
+def purge_expired_jobs(retention: int = EXPORT_JOB_RETENTION) -> int:
+    """Delete jobs finished (or created) more than `retention` seconds ago, with their files."""
+    ensure_schema()
+    with db_cursor(commit=True) as (_conn, cur):
+        cur.execute(
+            """
+            DELETE FROM dbo.ExportJobs
+            OUTPUT deleted.file_path
+            WHERE ISNULL(finished_at, created_at) < DATEADD(second, -?, SYSUTCDATETIME())
+            """,
+            (retention,),
+        )
+        paths = [r[0] for r in cur.fetchall()]
+    export_root = os.path.abspath(EXPORT_DIR)
+    for path in paths:
+        # only job-owned files; never anything inside the shared cache
+        if path and os.path.dirname(os.path.abspath(path)) == export_root:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    if paths:
+        print(f"[Export] purged {len(paths)} expired job(s)")
+    return len(paths)
+
+
+def _maybe_purge() -> None:
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < _PURGE_EVERY:
+        return
+    _last_purge = now
+    try:
+        purge_expired_jobs()
+    except Exception as e:
+        print(f"[Export Error] purge failed: {e}")
+
+
+def _update_job(export_id: str, status: Optional[str] = None, progress: Optional[int] = None,
+                detail: Optional[Any] = None, error: Optional[str] = None,
+                file_path: Optional[str] = None) -> None:
+    sets, params = ["updated_at = SYSUTCDATETIME()"], []
+    if status is not None:
+        sets.append("status = ?")
+        params.append(status)
+        if status in (STATUS_READY, STATUS_ERROR):
+            sets.append("finished_at = SYSUTCDATETIME()")
+    if progress is not None:
+        sets.append("progress = ?")
+        params.append(int(progress))
+    if detail is not None:
+        sets.append("detail = ?")
+        params.append(json.dumps(detail, default=str))
+    if error is not None:
+        sets.append("error = ?")
+        params.append(str(error)[:2000])
+    if file_path is not None:
+        sets.append("file_path = ?")
+        params.append(file_path)
+    params.append(export_id)
+    with db_cursor(commit=True) as (_conn, cur):
+        cur.execute(f"UPDATE dbo.ExportJobs SET {', '.join(sets)} WHERE export_id = ?", params)
+
+
+def get_job(export_id: str) -> Optional[Dict[str, Any]]:
+    """Job row as a dict (status, progress, detail, error, file_path, ...) or None."""
+    ensure_schema()
+    with db_cursor(commit=True) as (_conn, cur):
+        # A job whose worker died never reports again: fail it instead of polling forever
+        cur.execute(
+            """
+            UPDATE dbo.ExportJobs
+               SET status = ?, error = ?, finished_at = SYSUTCDATETIME(), updated_at = SYSUTCDATETIME()
+             WHERE export_id = ?
+               AND status IN (?, ?)
+               AND updated_at < DATEADD(second, -?, SYSUTCDATETIME())
+            """,
+            (STATUS_ERROR, "Export timed out", export_id, STATUS_PENDING, STATUS_RUNNING, EXPORT_JOB_TIMEOUT),
+        )
+        cur.execute(
+            """
+            SELECT export_id, kind, params, status, progress, detail, error, file_path,
+                   created_at, updated_at, finished_at
+            FROM dbo.ExportJobs
+            WHERE export_id = ?
+            """,
+            (export_id,),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        job = dict(zip([c[0] for c in cur.description], row))
+
+    for key in ("params", "detail"):
+        if job.get(key):
+            try:
+                job[key] = json.loads(job[key])
+            except ValueError:
+                pass
+    return job
+
 
 # --------------------------------------------------------------------------------------
-# Public API used by routes
+# Render pool: wkhtmltopdf runs in worker processes, never inside the request
 # --------------------------------------------------------------------------------------
 
-def start_export_job(patient_id: int, view: str) -> str:
-    """
-    Creates a 'job', generates the PDF synchronously for now, and stores the result path.
-    `view` can be "staff" | "patient" — included for future branching.
-    """
-    export_id = str(uuid.uuid4())
-    _JOBS[export_id] = {"status": "pending", "path": None}
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ProcessPoolExecutor(
+                max_workers=max(1, EXPORT_WORKERS),
+                mp_context=multiprocessing.get_context(EXPORT_MP_START),
+            )
+        return _EXECUTOR
+
+
+def _reset_executor_after_fork():
+    global _EXECUTOR
+    _EXECUTOR = None
+
 
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor_after_fork)
+
+
+def _submit(fn, *args) -> None:
+    global _EXECUTOR
+    try:
+        future = _executor().submit(fn, *args)
+    except BrokenProcessPool:
+        # A render process crashed hard (OOM etc.): start a fresh pool once
+        with _EXECUTOR_LOCK:
+            _EXECUTOR = None
+        future = _executor().submit(fn, *args)
+    future.add_done_callback(_log_future)
+
+
+def _log_future(future) -> None:
+    exc = future.exception()
+    if exc:
+        print(f"[Export Error] render process failed: {exc}")
+
+
+def _render_pdf(html: str, pdf_path: str) -> None:
+    # Use explicit configuration when we found the binary; otherwise try default PATH
+    if _PDFKIT_CFG:
+        pdfkit.from_string(html, pdf_path, options=WKHTML_OPTS, configuration=_PDFKIT_CFG)
+    else:
+        pdfkit.from_string(html, pdf_path, options=WKHTML_OPTS)
+
+
+def _run_patient_job(export_id: str, patient_id: int, view: str) -> None:
+    """Executed in a render process."""
     try:
         print(f"[Export Debug] Start for patient={patient_id}, view={view}")
+        _update_job(export_id, status=STATUS_RUNNING, progress=10)
 
         data = get_patient_export_data(patient_id)
+        _update_job(export_id, progress=40)
+
         template = env.get_template(_DEFAULT_TEMPLATE_NAME)
         html = template.render(patient=data["patient"], forms=data["forms"])
+        _update_job(export_id, progress=60)
+
+        # Unchanged packet -> same HTML -> served from the cache without spawning wkhtmltopdf
+        pdf_path = _pin(export_id, lambda: pdf_cache.get_or_render(
+            pdf_cache.patient_owner(patient_id), html, WKHTML_OPTS, _render_pdf))
+
+        _update_job(export_id, status=STATUS_READY, progress=100, file_path=pdf_path)
+        print(f"[Export Debug] Ready at {pdf_path}")
+
+    except Exception as e:
+        print(f"[Export Error] {e}")
+        _update_job(export_id, status=STATUS_ERROR, error=str(e))
 
-        pdf_path = os.path.join(EXPORT_DIR, f"{export_id}.pdf")
 
-        # Use explicit configuration when we found the binary; otherwise try default PATH
+# --------------------------------------------------------------------------------------
+# Batch exports: many patients -> one ZIP (a PDF per patient) or one merged PDF
+# --------------------------------------------------------------------------------------
+
+BATCH_FORMATS = ("zip", "pdf")
+
+
+def _render_merged_pdf(html_docs: List[str], pdf_path: str) -> None:
+    # wkhtmltopdf concatenates multiple input documents into one PDF in a single process
+    tmp_dir = tempfile.mkdtemp(dir=EXPORT_DIR)
+    try:
+        paths = []
+        for i, html in enumerate(html_docs):
+            path = os.path.join(tmp_dir, f"{i:05d}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(html)
+            paths.append(path)
         if _PDFKIT_CFG:
-            pdfkit.from_string(html, pdf_path, options=WKHTML_OPTS, configuration=_PDFKIT_CFG)
+            pdfkit.from_file(paths, pdf_path, options=WKHTML_OPTS, configuration=_PDFKIT_CFG)
         else:
-            pdfkit.from_string(html, pdf_path, options=WKHTML_OPTS)
+            pdfkit.from_file(paths, pdf_path, options=WKHTML_OPTS)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
-        _JOBS[export_id]["status"] = "ready"
-        _JOBS[export_id]["path"] = pdf_path
-        print(f"[Export Debug] Ready at {pdf_path}")
+
+def _run_batch_job(export_id: str, patient_ids: List[int], view: str, fmt: str) -> None:
+    """
+    Executed in a render process. Data for every patient is loaded in one batch, then
+    packets render on EXPORT_BATCH_THREADS threads (each drives its own wkhtmltopdf
+    subprocess) and per-patient status is written to the job's detail as they finish.
+    """
+    total = len(patient_ids)
+    state: Dict[str, str] = {str(pid): STATUS_PENDING for pid in patient_ids}
+
+    def _progress(done: int) -> int:
+        # 10% for loading, 85% spread over the patients, the rest for packaging
+        return 10 + int(85 * done / max(1, total))
+
+    try:
+        print(f"[Export Debug] Batch start: {total} patients, view={view}, format={fmt}")
+        _update_job(export_id, status=STATUS_RUNNING, progress=5,
+                    detail={"total": total, "done": 0, "patients": state})
+
+        data = get_patients_export_data(patient_ids)
+        template = env.get_template(_DEFAULT_TEMPLATE_NAME)
+        html_by_patient = {
+            pid: template.render(patient=data[pid]["patient"], forms=data[pid]["forms"])
+            for pid in patient_ids
+        }
+        _update_job(export_id, progress=_progress(0))
+
+        if fmt == "pdf":
+            docs = [html_by_patient[pid] for pid in patient_ids]
+            out_path = _pin(export_id, lambda: pdf_cache.get_or_render(
+                "batch", "\0".join(docs), WKHTML_OPTS,
+                lambda _html, path: _render_merged_pdf(docs, path),
+            ))
+            for pid in patient_ids:
+                state[str(pid)] = STATUS_READY
+            _update_job(export_id, status=STATUS_READY, progress=100, file_path=out_path,
+                        detail={"total": total, "done": total, "patients": state})
+            print(f"[Export Debug] Batch ready at {out_path}")
+            return
+
+        pdf_paths: Dict[int, str] = {}
+        done = 0
+        with ThreadPoolExecutor(max_workers=max(1, EXPORT_BATCH_THREADS)) as pool:
+            futures = {
+                pool.submit(pdf_cache.get_or_render, pdf_cache.patient_owner(pid),
+                            html_by_patient[pid], WKHTML_OPTS, _render_pdf): pid
+                for pid in patient_ids
+            }
+            for fut in as_completed(futures):
+                pid = futures[fut]
+                done += 1
+                try:
+                    pdf_paths[pid] = fut.result()
+                    state[str(pid)] = STATUS_READY
+                except Exception as e:
+                    print(f"[Export Error] batch {export_id} patient {pid}: {e}")
+                    state[str(pid)] = STATUS_ERROR
+                _update_job(export_id, progress=_progress(done),
+                            detail={"total": total, "done": done, "patients": state})
+
+        if not pdf_paths:
+            raise RuntimeError("No packet could be rendered")
+
+        # PDFs are already compressed: store them, and write straight to the job's own file.
+        # A packet invalidated since it rendered is rendered again.
+        zip_path = _job_path(export_id, ".zip")
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as zf:
+            for pid in patient_ids:
+                if pid not in pdf_paths:
+                    continue
+                try:
+                    zf.write(pdf_paths[pid], arcname=f"patient-{pid}.pdf")
+                except FileNotFoundError:
+                    path = pdf_cache.get_or_render(pdf_cache.patient_owner(pid), html_by_patient[pid],
+                                                   WKHTML_OPTS, _render_pdf)
+                    zf.write(path, arcname=f"patient-{pid}.pdf")
+
+        _update_job(export_id, status=STATUS_READY, progress=100, file_path=zip_path,
+                    detail={"total": total, "done": done, "patients": state})
+        print(f"[Export Debug] Batch ready at {zip_path}")
 
     except Exception as e:
         print(f"[Export Error] {e}")
-        _JOBS[export_id]["status"] = "error"
-        _JOBS[export_id]["path"] = None
+        _update_job(export_id, status=STATUS_ERROR, error=str(e),
+                    detail={"total": total, "patients": state})
+
 
+# --------------------------------------------------------------------------------------
+# Public API used by routes
+# --------------------------------------------------------------------------------------
+
+def start_export_job(patient_id: int, view: str) -> str:
+    """
+    Records a pending job and hands the render to the process pool; returns immediately.
+    `view` can be "staff" | "patient" — included for future branching.
+    """
+    export_id = str(uuid.uuid4())
+    _create_job(export_id, "patient", {"patientId": patient_id, "view": view})
+    _submit(_run_patient_job, export_id, patient_id, view)
+    return export_id
+
+
+def start_batch_export_job(patient_ids: List[int], view: str, fmt: str = "zip") -> str:
+    """
+    Batch counterpart of start_export_job(): one job renders every patient's packet.
+    fmt: "zip" (one PDF per patient) | "pdf" (one merged document).
+    """
+    if fmt not in BATCH_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(BATCH_FORMATS)}")
+    ids = list(dict.fromkeys(int(p) for p in patient_ids))
+    if not ids:
+        raise ValueError("No patients to export")
+    if len(ids) > EXPORT_BATCH_MAX:
+        raise ValueError(f"Batch export is limited to {EXPORT_BATCH_MAX} patients (got {len(ids)})")
+
+    export_id = str(uuid.uuid4())
+    _create_job(export_id, "batch", {"patientIds": ids, "view": view, "format": fmt})
+    _submit(_run_batch_job, export_id, ids, view, fmt)
     return export_id
 
 
 def get_job_state(export_id: str) -> Optional[str]:
-    job = _JOBS.get(export_id)
+    job = get_job(export_id)
     return job.get("status") if job else None
 
 
 def get_job_file_path(export_id: str) -> Optional[str]:
-    job = _JOBS.get(export_id)
-    if not job or job.get("status") != "ready":
+    job = get_job(export_id)
+    if not job or job.get("status") != STATUS_READY:
         return None
-    return job.get("path")
+    path = job.get("file_path")
+    return path if path and os.path.exists(path) else None
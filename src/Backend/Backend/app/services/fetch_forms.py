@@ -35,11 +35,7 @@ def get_patient_basic(patient_id: int) -> Dict[str, Any]:
     WHERE p.id = ?
     """
     row = _fetch_one(sql, (patient_id,))
-    return row or {
-        "id": patient_id, "first_name": None, "last_name": None,
-        "name": f"Patient {patient_id}", "email": None, "phone": None,
-        "dob": None, "created_on": None,
-    }
+    return row or _default_patient(patient_id)
 
 def get_assigned_forms(patient_id: int) -> List[Dict[str, Any]]:
     """
@@ -105,21 +101,127 @@ def get_submission_responses(submission_id: int) -> List[Dict[str, Any]]:
     """
     return _fetch_all(sql, (submission_id,))
 
-def get_patient_export_data(patient_id: int) -> Dict[str, Any]:
-    patient = get_patient_basic(patient_id)
-    forms   = get_assigned_forms(patient_id)
+def _default_patient(patient_id: int) -> Dict[str, Any]:
+    return {
+        "id": patient_id, "first_name": None, "last_name": None,
+        "name": f"Patient {patient_id}", "email": None, "phone": None,
+        "dob": None, "created_on": None,
+    }
 
-    # Attach responses from the latest submission (if any)
-    for f in forms:
-        sid = f.get("submission_id")
-        f["responses"] = get_submission_responses(sid) if sid else []
+def _display_status(f: Dict[str, Any]) -> str:
+    # Provide a consistent display_status WITHOUT guessing 'Completed'
+    # Priority: submit_status (from submission) -> assign_status (from assignment) -> 'Assigned'
+    return f.get("submit_status") or f.get("assign_status") or "Assigned"
 
-        # Provide a consistent display_status WITHOUT guessing 'Completed'
-        # Priority: submit_status (from submission) -> assign_status (from assignment) -> 'Assigned'
-        f["display_status"] = (
-            f.get("submit_status")
-            or f.get("assign_status")
-            or "Assigned"
-        )
+# ---------- batched loader (one connection, one query per entity) ----------
+# Key lists go through _db.fetch_in, which chunks them under the 2100-parameter cap.
+
+def _load_patients(cur, ids: List[int]) -> List[Dict[str, Any]]:
+    return _db.fetch_in(cur, """
+    SELECT
+        p.id,
+        p.first_name,
+        p.last_name,
+        CONCAT(p.first_name, ' ', p.last_name) AS name,
+        p.email,
+        p.phone,
+        p.dob,
+        p.created_on
+    FROM dbo.patients AS p
+    WHERE p.id IN {keys}
+    """, ids)
 
-    return {"patient": patient, "forms": forms}
+def _load_assignments(cur, ids: List[int]) -> List[Dict[str, Any]]:
+    """Same shape and order as get_assigned_forms(), for many patients at once."""
+    return _db.fetch_in(cur, """
+    ;WITH last_sub AS (
+        SELECT
+            fs.form_id,
+            fs.patient_id,
+            MAX(fs.submitted_at) AS submitted_at
+        FROM dbo.FormSubmissions AS fs
+        WHERE fs.patient_id IN {keys}
+        GROUP BY fs.form_id, fs.patient_id
+    )
+    SELECT
+        a.form_id,
+        a.patient_id,
+        a.status              AS assign_status,
+        a.due_date,
+        a.location,
+        f.form_name           AS title,
+        f.description,
+        f.form_url,
+        f.created_at          AS form_created_at,
+
+        s.submission_id,
+        s.status              AS submit_status,
+        s.submitted_at
+    FROM dbo.form_status AS a
+    JOIN dbo.Forms AS f
+      ON f.form_id = a.form_id
+    LEFT JOIN last_sub AS ls
+      ON ls.form_id = a.form_id AND ls.patient_id = a.patient_id
+    LEFT JOIN dbo.FormSubmissions AS s
+      ON s.form_id = ls.form_id
+     AND s.patient_id = ls.patient_id
+     AND s.submitted_at = ls.submitted_at
+    WHERE a.patient_id IN {keys}
+    ORDER BY
+        a.patient_id,
+        COALESCE(s.submitted_at, a.due_date) DESC,
+        a.form_id DESC
+    """, ids)
+
+def _load_responses(cur, submission_ids: List[int]) -> List[Dict[str, Any]]:
+    return _db.fetch_in(cur, """
+    SELECT
+        fr.submission_id,
+        fr.field_id,
+        fr.response_value,
+        fr.response_id,
+        ff.form_id,
+        ff.field_label  AS label,
+        ff.field_type   AS type,
+        ff.is_required
+    FROM dbo.FormResponses AS fr
+    LEFT JOIN dbo.FormFields AS ff
+      ON ff.field_id = fr.field_id
+    WHERE fr.submission_id IN {keys}
+    ORDER BY fr.submission_id, fr.response_id
+    """, submission_ids)
+
+def get_patients_export_data(patient_ids: List[int], cursor=None) -> Dict[int, Dict[str, Any]]:
+    """
+    Export payloads for many patients: {patient_id: {"patient": {...}, "forms": [...]}}.
+    Patient rows, assignments and ALL latest-submission responses are fetched on one
+    connection with one batched query each and grouped here, instead of one query per form.
+    Unknown ids still get a placeholder patient with no forms (same as get_patient_basic).
+    """
+    ids = list(dict.fromkeys(int(p) for p in patient_ids))
+    if not ids:
+        return {}
+    if cursor is None:
+        with _db.db_cursor() as (_conn, cur):
+            return get_patients_export_data(ids, cur)
+
+    patients = {int(r["id"]): r for r in _load_patients(cursor, ids)}
+    assignments = _load_assignments(cursor, ids)
+
+    submission_ids = list(dict.fromkeys(
+        int(a["submission_id"]) for a in assignments if a.get("submission_id") is not None
+    ))
+    responses: Dict[int, List[Dict[str, Any]]] = {}
+    for r in _load_responses(cursor, submission_ids):
+        responses.setdefault(int(r.pop("submission_id")), []).append(r)
+
+    out = {pid: {"patient": patients.get(pid) or _default_patient(pid), "forms": []} for pid in ids}
+    for f in assignments:
+        sid = f.get("submission_id")
+        f["responses"] = responses.get(int(sid), []) if sid is not None else []
+        f["display_status"] = _display_status(f)
+        out[int(f["patient_id"])]["forms"].append(f)
+    return out
+
+def get_patient_export_data(patient_id: int) -> Dict[str, Any]:
+    return get_patients_export_data([patient_id])[int(patient_id)]
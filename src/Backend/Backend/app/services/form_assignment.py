@@ -0,0 +1,112 @@
+# Backend/app/services/form_assignment.py
+# Set-based upsert of dbo.form_status for send_forms / assign_forms.
+# All (patient_id, form_id, due_date, location, qr) tuples are staged into a session temp
+# table with fast_executemany and applied by ONE MERGE in ONE transaction, instead of an
+# UPDATE-then-INSERT (and a commit) per pair.
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..database import db_cursor
+
+# Columns a caller may ask MERGE to overwrite on existing rows.
+# status is always reset to 'Active' when included.
+UPDATABLE = ("qr", "status", "due_date", "location")
+
+_STAGE_DDL = """
+IF OBJECT_ID('tempdb..#assign_stage') IS NOT NULL DROP TABLE #assign_stage;
+CREATE TABLE #assign_stage (
+    patient_id  INT            NOT NULL,
+    form_id     INT            NOT NULL,
+    due_date    NVARCHAR(30)   NULL,
+    location    NVARCHAR(255)  NULL,
+    qr          NVARCHAR(4000) NULL,
+    PRIMARY KEY (patient_id, form_id)
+);
+"""
+
+_MERGE_TEMPLATE = """
+MERGE form_status WITH (HOLDLOCK) AS target
+USING #assign_stage AS source
+ON (target.patient_id = source.patient_id AND target.form_id = source.form_id)
+{when_matched}
+WHEN NOT MATCHED THEN
+    INSERT (patient_id, form_id, status, due_date, qr, created, location)
+    VALUES (source.patient_id, source.form_id, 'Active', source.due_date, source.qr, GETDATE(), source.location);
+"""
+
+
+def _set_clause(on_match: Sequence[str]) -> str:
+    sets = []
+    for col in on_match:
+        if col not in UPDATABLE:
+            raise ValueError(f"form_status column {col!r} cannot be bulk-updated")
+        sets.append("status = 'Active'" if col == "status" else f"{col} = source.{col}")
+    return ("WHEN MATCHED THEN\n    UPDATE SET " + ", ".join(sets)) if sets else ""
+
+
+def _dedupe(rows: Iterable[Dict[str, Any]]) -> List[Tuple[Any, ...]]:
+    """Normalize to tuples keyed by (patient, form); the last tuple for a pair wins (MERGE needs unique keys)."""
+    staged: Dict[Tuple[int, int], Tuple[Any, ...]] = {}
+    for r in rows:
+        pid = int(float(r["patient_id"]))
+        fid = int(float(r["form_id"]))
+        staged[(pid, fid)] = (
+            pid,
+            fid,
+            r.get("due_date"),
+            r.get("location"),
+            r.get("qr"),
+        )
+    return list(staged.values())
+
+
+def bulk_assign(rows: Iterable[Dict[str, Any]], on_match: Sequence[str] = ("status", "due_date", "location"),
+                cursor=None) -> int:
+    """
+    Upsert many form_status rows at once.
+      rows: dicts with patient_id, form_id and optional due_date, location, qr
+      on_match: which of UPDATABLE to overwrite when the (patient, form) row already exists
+    New rows are always inserted as 'Active' with created = GETDATE().
+    Runs in the caller's transaction when `cursor` is given, otherwise commits on its own.
+    Returns the number of rows MERGE touched.
+    """
+    staged = _dedupe(rows)
+    if not staged:
+        return 0
+
+    if cursor is not None:
+        return _apply(cursor, staged, on_match)
+    with db_cursor(commit=True) as (_conn, cur):
+        return _apply(cur, staged, on_match)
+
+
+def _apply(cur, staged: List[Tuple[Any, ...]], on_match: Sequence[str]) -> int:
+    merge_sql = _MERGE_TEMPLATE.format(when_matched=_set_clause(on_match))
+    cur.execute(_STAGE_DDL)
+    try:
+        cur.fast_executemany = True
+        cur.executemany(
+            "INSERT INTO #assign_stage (patient_id, form_id, due_date, location, qr) VALUES (?, ?, ?, ?, ?)",
+            staged,
+        )
+        cur.fast_executemany = False
+        cur.execute(merge_sql)
+        return cur.rowcount
+    finally:
+        # pooled sessions outlive the request, so don't leave the temp table behind
+        try:
+            cur.execute("IF OBJECT_ID('tempdb..#assign_stage') IS NOT NULL DROP TABLE #assign_stage;")
+        except Exception:
+            pass
+
+
+def pairs(patient_ids: Iterable[Any], form_ids: Iterable[Any], due_date: Optional[str] = None,
+          location: Optional[str] = None, qr: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Cartesian helper: every patient x every form with the same due date / location / qr."""
+    form_ids = list(form_ids)
+    return [
+        {"patient_id": pid, "form_id": fid, "due_date": due_date, "location": location, "qr": qr}
+        for pid in patient_ids
+        for fid in form_ids
+    ]
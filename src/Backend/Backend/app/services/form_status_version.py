@@ -0,0 +1,70 @@
+# Backend/app/services/form_status_version.py
+# The rowversion column on dbo.form_status that incremental exports and the analytics rollup
+# use to find changed rows.
+# - adding it touches every row under a schema-modification lock, so it is an explicit migration
+#   (`flask migrate-form-status` -> migrate()), never something a web request runs
+# - request paths only look the column up; when it is missing the features that need it
+#   report MissingRowVersion instead of altering the table
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from ..database import db_cursor
+
+MIGRATE_COMMAND = "flask migrate-form-status"
+
+_ADD_COLUMN = """
+IF NOT EXISTS (SELECT 1 FROM sys.columns
+               WHERE object_id = OBJECT_ID('dbo.form_status') AND system_type_id = 189)
+    ALTER TABLE dbo.form_status ADD row_version ROWVERSION;
+"""
+
+_COLUMN: Optional[str] = None
+_LOCK = threading.Lock()
+
+
+class MissingRowVersion(RuntimeError):
+    """dbo.form_status has no rowversion column yet; the migration has not been run."""
+
+    def __init__(self):
+        super().__init__(f"dbo.form_status has no rowversion column; run `{MIGRATE_COMMAND}` first")
+
+
+def version_column(cur) -> Optional[str]:
+    """Name of the rowversion column, or None. Only a found column is cached (the migration may run later)."""
+    global _COLUMN
+    if _COLUMN is not None:
+        return _COLUMN
+    cur.execute(
+        "SELECT name FROM sys.columns WHERE object_id = OBJECT_ID('dbo.form_status') AND system_type_id = 189"
+    )
+    row = cur.fetchone()
+    if row:
+        with _LOCK:
+            _COLUMN = row[0]
+    return _COLUMN
+
+
+def require(cur) -> str:
+    """version_column() or MissingRowVersion."""
+    column = version_column(cur)
+    if column is None:
+        raise MissingRowVersion()
+    return column
+
+
+def migrate() -> str:
+    """
+    Add the rowversion column and the indexes built on form_status / patients / FormSubmissions
+    for the incremental export and the analytics rollup. Idempotent; returns the column name.
+    """
+    from . import analytics_rollup, incremental_export
+
+    with db_cursor(commit=True) as (_conn, cur):
+        cur.execute(_ADD_COLUMN)
+        column = require(cur)
+        incremental_export.create_indexes(cur, column)
+        analytics_rollup.create_indexes(cur, column)
+    print(f"[Migrate] dbo.form_status.{column} and change-tracking indexes in place")
+    return column
@@ -0,0 +1,215 @@
+# Backend/app/services/incremental_export.py
+# "Changed since" mode for the forms export.
+# - a watermark is an opaque token: latest FormSubmissions.submitted_at + form_status rowversion
+# - open_window(since) captures the upper bounds BEFORE the export query runs; the export only
+#   returns (patient, form) pairs with a submission or a form_status change inside the window
+# - window.token() is the next watermark; consumers can also keep theirs in dbo.ExportWatermarks
+# Deleted assignments are not reported (no tombstones); consumers upsert on (patient_id, form_id).
+# The rowversion column and window indexes come from `flask migrate-form-status`
+# (form_status_version); without them open_window() raises MissingRowVersion.
+from __future__ import annotations
+
+import base64
+import datetime
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..database import db_cursor
+from . import form_status_version
+from .schema_registry import Schema, get_schema
+
+# Submissions committed slightly after the window was captured can carry an earlier
+# submitted_at; re-reading this many seconds behind the watermark picks them up.
+WATERMARK_OVERLAP_SECONDS = float(os.getenv("EXPORT_WATERMARK_OVERLAP_SECONDS", "2"))
+
+_DDL = """
+IF OBJECT_ID('dbo.ExportWatermarks', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.ExportWatermarks (
+        consumer    NVARCHAR(100)  NOT NULL CONSTRAINT PK_ExportWatermarks PRIMARY KEY,
+        watermark   VARCHAR(200)   NOT NULL,
+        row_count   INT            NULL,
+        updated_at  DATETIME2      NOT NULL CONSTRAINT DF_ExportWatermarks_updated DEFAULT SYSUTCDATETIME()
+    );
+END
+"""
+
+_SCHEMA_READY = False
+_SCHEMA_LOCK = threading.Lock()
+
+
+def ensure_schema() -> None:
+    """Watermark table; once per process."""
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+    with _SCHEMA_LOCK:
+        if _SCHEMA_READY:
+            return
+        with db_cursor(commit=True) as (_conn, cur):
+            cur.execute(_DDL)
+        _SCHEMA_READY = True
+
+
+def create_indexes(cur, version_col: str) -> None:
+    """The two window indexes; run by form_status_version.migrate(), not by requests."""
+    schema = get_schema(cur)
+    s = schema.submissions
+    wanted = [("dbo.form_status", "IX_form_status_row_version",
+               f"({version_col}) INCLUDE ({schema.form_status.patient_id}, {schema.form_status.form_id})")]
+    if s.submitted_at and s.form_id and s.patient_id:
+        wanted.append(("dbo.FormSubmissions", "IX_FormSubmissions_submitted_at",
+                       f"({s.submitted_at}) INCLUDE ({s.form_id}, {s.patient_id})"))
+    for table, name, cols in wanted:
+        cur.execute(f"""
+            IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = ? AND object_id = OBJECT_ID(?))
+                CREATE INDEX {name} ON {table} {cols};
+        """, (name, table))
+
+
+# ---------- watermark tokens ----------
+
+def _encode(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_watermark(token: str) -> Tuple[Optional[datetime.datetime], bytes]:
+    """token -> (submitted_at high-water mark or None, form_status rowversion). ValueError if malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        at = datetime.datetime.fromisoformat(payload["at"]) if payload.get("at") else None
+        rv = bytes.fromhex(payload["rv"])
+    except Exception:
+        raise ValueError("Invalid watermark")
+    return at, rv
+
+
+@dataclass(frozen=True)
+class Window:
+    """
+    Change window of one incremental export. since_* are None for a full export
+    (no watermark yet): every row is returned and token() starts the chain.
+    """
+    since_at: Optional[datetime.datetime]
+    since_version: Optional[bytes]
+    upper_at: Optional[datetime.datetime]
+    upper_version: bytes
+    version_column: str
+
+    @property
+    def full(self) -> bool:
+        return self.since_at is None and self.since_version is None
+
+    def token(self) -> str:
+        return _encode({
+            "v": 1,
+            "at": self.upper_at.isoformat() if self.upper_at else None,
+            "rv": self.upper_version.hex(),
+        })
+
+    def changed_pairs(self, schema: Schema) -> Tuple[str, List[Any]]:
+        """
+        SELECT of distinct (form_id, patient_id) changed inside the window, or ("", []) when full.
+        Submissions: (since_at - overlap, upper_at]; form_status: [since_version, upper_version).
+        """
+        if self.full:
+            return "", []
+        s, fs = schema.submissions, schema.form_status
+        parts: List[str] = []
+        params: List[Any] = []
+
+        if self.upper_at is not None:
+            conds = [f"{s.submitted_at} <= ?"]
+            params.append(self.upper_at)
+            if self.since_at is not None:
+                conds.insert(0, f"{s.submitted_at} > ?")
+                params.insert(0, self.since_at - datetime.timedelta(seconds=WATERMARK_OVERLAP_SECONDS))
+            parts.append(
+                f"SELECT {s.form_id} AS form_id, {s.patient_id} AS patient_id "
+                f"FROM dbo.FormSubmissions WHERE {' AND '.join(conds)}"
+            )
+
+        conds = [f"{self.version_column} < ?"]
+        vals: List[Any] = [self.upper_version]
+        if self.since_version is not None:
+            conds.insert(0, f"{self.version_column} >= ?")
+            vals.insert(0, self.since_version)
+        parts.append(
+            f"SELECT {fs.form_id} AS form_id, {fs.patient_id} AS patient_id "
+            f"FROM dbo.form_status WHERE {' AND '.join(conds)}"
+        )
+        params.extend(vals)
+        return "\n            UNION\n            ".join(parts), params
+
+
+def open_window(since: Optional[str] = None) -> Window:
+    """
+    Capture the upper bounds for an export starting now. MIN_ACTIVE_ROWVERSION() is the
+    lowest version still in flight, so every form_status change below it is committed.
+    """
+    since_at, since_version = decode_watermark(since) if since else (None, None)
+    ensure_schema()
+    with db_cursor() as (_conn, cur):
+        version_col = form_status_version.require(cur)
+        schema = get_schema(cur)
+        if not schema.submissions.submitted_at:
+            raise RuntimeError("FormSubmissions has no submitted_at column; incremental export unavailable.")
+        cur.execute(f"SELECT MAX({schema.submissions.submitted_at}), MIN_ACTIVE_ROWVERSION() FROM dbo.FormSubmissions")
+        upper_at, upper_version = cur.fetchone()
+    return Window(since_at, since_version, upper_at, bytes(upper_version), version_col)
+
+
+# ---------- per-consumer watermarks ----------
+
+def get_watermark(consumer: str) -> Optional[Dict[str, Any]]:
+    """{"consumer", "watermark", "rowCount", "updatedAt"} or None when the consumer has none yet."""
+    ensure_schema()
+    with db_cursor() as (_conn, cur):
+        cur.execute(
+            "SELECT watermark, row_count, updated_at FROM dbo.ExportWatermarks WHERE consumer = ?",
+            (consumer,),
+        )
+        row = cur.fetchone()
+    if not row:
+        return None
+    return {
+        "consumer": consumer,
+        "watermark": row[0],
+        "rowCount": row[1],
+        "updatedAt": row[2].isoformat() if row[2] else None,
+    }
+
+
+def save_watermark(consumer: str, token: str, row_count: Optional[int] = None) -> None:
+    ensure_schema()
+    with db_cursor(commit=True) as (_conn, cur):
+        cur.execute(
+            """
+            UPDATE dbo.ExportWatermarks
+               SET watermark = ?, row_count = ?, updated_at = SYSUTCDATETIME()
+             WHERE consumer = ?;
+            IF @@ROWCOUNT = 0
+                INSERT INTO dbo.ExportWatermarks (consumer, watermark, row_count) VALUES (?, ?, ?);
+            """,
+            (token, row_count, consumer, consumer, token, row_count),
+        )
+    print(f"[CSV EXPORT] watermark for '{consumer}' advanced")
+
+
+def reset_watermark(consumer: str) -> bool:
+    """Forget a consumer's watermark; its next export is a full one."""
+    ensure_schema()
+    with db_cursor(commit=True) as (_conn, cur):
+        cur.execute("DELETE FROM dbo.ExportWatermarks WHERE consumer = ?", (consumer,))
+        return cur.rowcount > 0
+
+
+def save_when_done(chunks: Iterator[bytes], consumer: str, window: Window) -> Iterator[bytes]:
+    """Pass a streamed export through; the consumer's watermark only moves if it was fully sent."""
+    yield from chunks
+    save_watermark(consumer, window.token())
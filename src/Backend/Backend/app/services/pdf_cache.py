@@ -0,0 +1,125 @@
+# Backend/app/services/pdf_cache.py
+# Content-addressed cache of rendered PDF packets under services/_exports/cache.
+# - key = sha256(rendered HTML + wkhtmltopdf options); same inputs -> same PDF, no re-render
+# - files are named p<patient_id>-<key>.pdf so a patient's entries can be dropped when they submit
+# - size-bounded LRU: hits touch the file mtime, eviction removes the oldest until under budget
+# - export jobs never serve a cache path directly: they hardlink / copy the entry to a file of
+#   their own (export_service._pin), so invalidate / evict cannot break a finished job
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Optional
+
+_THIS_DIR = os.path.dirname(__file__)
+CACHE_DIR = os.getenv("EXPORT_CACHE_DIR") or os.path.join(_THIS_DIR, "_exports", "cache")
+CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("EXPORT_CACHE", "1").lower() not in ("0", "false", "no", "off")
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+_EVICT_LOCK = threading.Lock()
+_EVICTABLE = (".pdf", ".zip")
+
+
+def cache_key(html: str, options: Optional[Dict[str, Any]] = None) -> str:
+    h = hashlib.sha256()
+    h.update(html.encode("utf-8"))
+    h.update(b"\0")
+    h.update(json.dumps(options or {}, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _path(owner: str, key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{owner}-{key}.pdf")
+
+
+def lookup(owner: str, key: str) -> Optional[str]:
+    """Path of a cached PDF (and mark it recently used), or None."""
+    if not CACHE_ENABLED:
+        return None
+    path = _path(owner, key)
+    try:
+        os.utime(path, None)
+    except OSError:
+        return None
+    return path
+
+
+def get_or_render(owner: str, html: str, options: Optional[Dict[str, Any]],
+                  render: Callable[[str, str], None]) -> str:
+    """
+    Return the cached PDF for this HTML, rendering it with render(html, tmp_path) on a miss.
+    `owner` prefixes the file name (e.g. "p42") so invalidate_owner() can find it.
+    """
+    key = cache_key(html, options)
+    hit = lookup(owner, key)
+    if hit:
+        print(f"[Export Cache] hit {os.path.basename(hit)}")
+        return hit
+
+    final_path = _path(owner, key)
+    # Render next to the final path and rename, so readers never see a half-written PDF
+    fd, tmp_path = tempfile.mkstemp(suffix=".pdf.tmp", dir=CACHE_DIR)
+    os.close(fd)
+    try:
+        render(html, tmp_path)
+        os.replace(tmp_path, final_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    evict()
+    return final_path
+
+
+def patient_owner(patient_id: Any) -> str:
+    return f"p{int(patient_id)}"
+
+
+def invalidate_patient(patient_id: Any) -> int:
+    """Drop every cached packet of a patient (their answers changed). Never raises."""
+    removed = 0
+    try:
+        for path in glob.glob(os.path.join(CACHE_DIR, f"{patient_owner(patient_id)}-*.pdf")):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    except Exception as e:
+        print(f"[Export Cache] invalidate failed for patient {patient_id}: {e}")
+    return removed
+
+
+def evict(max_bytes: Optional[int] = None) -> int:
+    """Remove least-recently-used files until the cache fits in max_bytes. Returns files removed."""
+    limit = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _EVICT_LOCK:
+        entries = []
+        total = 0
+        for entry in os.scandir(CACHE_DIR):
+            if not entry.name.endswith(_EVICTABLE) or not entry.is_file():
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+
+        removed = 0
+        for _mtime, size, path in sorted(entries):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
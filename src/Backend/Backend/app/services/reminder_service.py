@@ -0,0 +1,183 @@
+# Backend/app/services/reminder_service.py
+# Appointment reminders.
+# - every tick claims appointments starting within the next REMINDER_LEAD_HOURS whose
+#   ReminderSentAt is still NULL: a range seek on the filtered IX_Appointments_ReminderDue index
+# - claiming stamps ReminderSentAt and queues the email / SMS in dbo.DeliveryOutbox in the SAME
+#   transaction, so a reminder is queued exactly once even with several schedulers running
+# - sending is the outbox workers' job (delivery_service): per-channel, reused SMTP / Twilio sessions;
+#   ReminderSentAt therefore means "queued". If every job of a reminder fails permanently the
+#   outbox clears it again (delivery_service._release_reminder) and a later tick retries, as long
+#   as the appointment is still ahead
+# Needs the ReminderSentAt / StartsAt columns from `flask migrate-appointments`; until then
+# run_tick() raises MissingAppointmentSchema.
+# Run it in-process (REMINDERS_IN_PROCESS=1), as reminder_worker.py, or once via `flask send-reminders`
+# (the one-shot forms send what they queued before exiting, up to REMINDER_DRAIN_SECS).
+from __future__ import annotations
+
+import datetime
+import html
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from ..database import db_cursor
+from . import appointment_service, delivery_service
+
+REMINDER_LEAD_HOURS = float(os.getenv("REMINDER_LEAD_HOURS", "24"))
+REMINDER_TICK_SECS = float(os.getenv("REMINDER_TICK_SECS", "300"))
+REMINDER_CLAIM = int(os.getenv("REMINDER_CLAIM_SIZE", "200"))          # appointments per round trip
+REMINDER_CHANNELS = tuple(
+    c.strip().lower() for c in os.getenv("REMINDER_CHANNELS", "email,sms").split(",") if c.strip()
+)
+REMINDER_DRAIN_SECS = float(os.getenv("REMINDER_DRAIN_SECS", "120"))     # one-shot runs: max send time
+REMINDERS_IN_PROCESS = os.getenv("REMINDERS_IN_PROCESS", "0").lower() in ("1", "true", "yes", "on")
+
+
+# ---------- messages ----------
+
+def _when(appt: Dict[str, Any]) -> str:
+    starts = appt.get("StartsAt")
+    if isinstance(starts, datetime.datetime):
+        return starts.strftime("%A, %B %d at %I:%M %p").replace(" 0", " ")
+    return f"{appt.get('AppointmentDate')} {appt.get('AppointmentTime')}"
+
+
+def build_reminder_jobs(appt: Dict[str, Any], channels=REMINDER_CHANNELS) -> List[Dict[str, Any]]:
+    """Outbox jobs (see delivery_service.enqueue_batch) for one claimed appointment."""
+    name = appt.get("PatientName") or "there"
+    specialist = appt.get("Specialist") or "your specialist"
+    when = _when(appt)
+    jobs: List[Dict[str, Any]] = []
+
+    email = (appt.get("PatientEmail") or "").strip()
+    if delivery_service.CHANNEL_EMAIL in channels and email:
+        jobs.append({
+            "channel": delivery_service.CHANNEL_EMAIL,
+            "recipient": email,
+            "recipient_name": appt.get("PatientName"),
+            "payload": {
+                "subject": "Appointment reminder from GIA HR",
+                "html": f"""
+                <div>
+                    <h2>GIA HR</h2>
+                    <p>Hello <b>{html.escape(name)}</b>,<br>
+                    This is a reminder of your appointment with <b>{html.escape(specialist)}</b> on <b>{when}</b>.</p>
+                </div>
+                """,
+                "appointment_id": appt.get("AppointmentID"),
+            },
+        })
+
+    phone = (appt.get("PhoneNumber") or "").strip()
+    if delivery_service.CHANNEL_SMS in channels and phone:
+        jobs.append({
+            "channel": delivery_service.CHANNEL_SMS,
+            "recipient": delivery_service.to_e164(phone),
+            "recipient_name": appt.get("PatientName"),
+            "payload": {
+                "body": f"Hello {name}, reminder: your appointment with {specialist} is on {when}. - GIA HR",
+                "appointment_id": appt.get("AppointmentID"),
+            },
+        })
+    return jobs
+
+
+# ---------- tick ----------
+
+def run_tick(lead_hours: float = REMINDER_LEAD_HOURS, claim: int = REMINDER_CLAIM) -> int:
+    """
+    Queue reminders for every appointment due within lead_hours. Claims in rounds of
+    `claim` rows until none are left. Returns the number of appointments reminded.
+    """
+    appointment_service.require()
+    delivery_service.ensure_schema()
+    total = 0
+    while True:
+        with db_cursor(commit=True) as (_conn, cur):
+            cur.execute(
+                """
+                UPDATE TOP (?) a
+                   SET ReminderSentAt = SYSUTCDATETIME()
+                OUTPUT inserted.AppointmentID, inserted.PatientName, inserted.PatientEmail,
+                       inserted.PhoneNumber, inserted.AppointmentDate, inserted.AppointmentTime,
+                       inserted.Specialist, inserted.StartsAt
+                  FROM dbo.Appointments AS a WITH (ROWLOCK, READPAST, UPDLOCK)
+                 WHERE a.ReminderSentAt IS NULL
+                   AND a.StartsAt >= GETDATE()
+                   AND a.StartsAt <  DATEADD(minute, ?, GETDATE())
+                   AND ISNULL(a.Status, '') NOT IN ('Cancelled', 'Canceled')
+                """,
+                (claim, int(lead_hours * 60)),
+            )
+            cols = [c[0] for c in cur.description]
+            claimed = [dict(zip(cols, r)) for r in cur.fetchall()]
+
+            jobs: List[Dict[str, Any]] = []
+            for appt in claimed:
+                jobs.extend(build_reminder_jobs(appt))
+            if jobs:
+                delivery_service.enqueue_batch(jobs, cursor=cur)
+
+        total += len(claimed)
+        if len(claimed) < claim:
+            break
+
+    if total:
+        print(f"[Reminders] queued reminders for {total} appointment(s)")
+    return total
+
+
+# ---------- scheduler ----------
+
+class ReminderScheduler:
+    """One daemon thread calling run_tick() every tick_secs."""
+
+    def __init__(self, tick_secs: float = REMINDER_TICK_SECS):
+        self.tick_secs = tick_secs
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+            self._thread.start()
+            print(f"[Reminders] scheduler started (every {self.tick_secs:.0f}s, {REMINDER_LEAD_HOURS:g}h ahead)")
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                run_tick()
+            except Exception as e:
+                print(f"[Reminders] tick failed: {e}")
+            self._stop.wait(self.tick_secs)
+
+
+_scheduler = ReminderScheduler()
+
+
+def start_scheduler() -> None:
+    """Start this process's scheduler thread when REMINDERS_IN_PROCESS is on (idempotent)."""
+    if REMINDERS_IN_PROCESS:
+        _scheduler.start()
+
+
+def _reset_after_fork():
+    global _scheduler
+    _scheduler = ReminderScheduler()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,187 @@
+# Backend/app/services/schema_registry.py
+# Process-wide cache of the column layout of the tables the exporters read.
+# - ONE INFORMATION_SCHEMA.COLUMNS query loads every table at once
+# - aliases (id vs patient_id, form_name vs name, ...) are resolved into typed, frozen mappings
+# - cached for SCHEMA_CACHE_TTL seconds; refresh() forces a reload (e.g. after a migration)
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from ..database import db_cursor
+
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "600"))
+
+TABLES = ("patients", "forms", "form_status", "FormSubmissions", "FormFields", "FormResponses")
+
+
+def _pick(cols: List[str], *candidates: str) -> Optional[str]:
+    low = {c.lower(): c for c in cols}
+    for cand in candidates:
+        name = low.get(cand.lower())
+        if name:
+            return name
+    return None
+
+
+# ---------- typed mappings (None = column not present) ----------
+
+@dataclass(frozen=True)
+class PatientColumns:
+    id: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+
+
+@dataclass(frozen=True)
+class FormColumns:
+    id: Optional[str]
+    name: Optional[str]
+
+
+@dataclass(frozen=True)
+class FormStatusColumns:
+    patient_id: Optional[str]
+    form_id: Optional[str]
+    status: Optional[str]
+    due_date: Optional[str]
+    archived: Optional[str]
+
+
+@dataclass(frozen=True)
+class SubmissionColumns:
+    id: Optional[str]
+    form_id: Optional[str]
+    patient_id: Optional[str]
+    submitted_at: Optional[str]
+
+
+@dataclass(frozen=True)
+class FieldColumns:
+    id: Optional[str]
+    form_id: Optional[str]
+    label: Optional[str]
+    order: Optional[str]
+
+
+@dataclass(frozen=True)
+class ResponseColumns:
+    submission_id: Optional[str]
+    field_id: Optional[str]
+    value: Optional[str]
+
+
+@dataclass(frozen=True)
+class Schema:
+    patients: PatientColumns
+    forms: FormColumns
+    form_status: FormStatusColumns
+    submissions: SubmissionColumns
+    fields: FieldColumns
+    responses: ResponseColumns
+    columns: Dict[str, Tuple[str, ...]] = field(default_factory=dict)   # lower(table) -> raw column list
+    loaded_at: float = 0.0
+
+    def has(self, table: str, column: str) -> bool:
+        return _pick(list(self.columns.get(table.lower(), ())), column) is not None
+
+
+def _resolve(columns: Dict[str, Tuple[str, ...]], loaded_at: float) -> Schema:
+    def cols(table: str) -> List[str]:
+        return list(columns.get(table.lower(), ()))
+
+    p, f, fs = cols("patients"), cols("forms"), cols("form_status")
+    s, ff, fr = cols("FormSubmissions"), cols("FormFields"), cols("FormResponses")
+    return Schema(
+        patients=PatientColumns(
+            id=_pick(p, "id", "patient_id"),
+            first_name=_pick(p, "first_name", "firstname"),
+            last_name=_pick(p, "last_name", "lastname"),
+        ),
+        forms=FormColumns(
+            id=_pick(f, "form_id", "id", "template_id"),
+            name=_pick(f, "form_name", "name", "template_name", "title"),
+        ),
+        form_status=FormStatusColumns(
+            patient_id=_pick(fs, "patient_id"),
+            form_id=_pick(fs, "form_id"),
+            status=_pick(fs, "status"),
+            due_date=_pick(fs, "due_date", "dueon", "due_on"),
+            archived=_pick(fs, "is_archived", "archived", "activeflag"),
+        ),
+        submissions=SubmissionColumns(
+            id=_pick(s, "submission_id", "id"),
+            form_id=_pick(s, "form_id"),
+            patient_id=_pick(s, "patient_id"),
+            submitted_at=_pick(s, "submitted_at", "created_on", "created_at"),
+        ),
+        fields=FieldColumns(
+            id=_pick(ff, "field_id", "id"),
+            form_id=_pick(ff, "form_id", "template_id"),
+            label=_pick(ff, "field_label", "label", "question", "title", "text", "name"),
+            order=_pick(ff, "display_order", "sort_order", "position", "order"),
+        ),
+        responses=ResponseColumns(
+            submission_id=_pick(fr, "submission_id", "patientform_id", "header_id"),
+            field_id=_pick(fr, "field_id", "question_id"),
+            value=_pick(
+                fr,
+                "value", "answer", "response",
+                "response_value", "answer_value",
+                "value_text", "text", "choice", "number", "date",
+            ),
+        ),
+        columns=columns,
+        loaded_at=loaded_at,
+    )
+
+
+# ---------- cache ----------
+
+_CACHE: Optional[Schema] = None
+_LOCK = threading.Lock()
+
+
+def _load(cur) -> Schema:
+    marks = ",".join("?" * len(TABLES))
+    cur.execute(f"""
+        SELECT TABLE_NAME, COLUMN_NAME
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = 'dbo' AND TABLE_NAME IN ({marks})
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """, TABLES)
+    columns: Dict[str, List[str]] = {}
+    for table, column in cur.fetchall():
+        columns.setdefault(str(table).lower(), []).append(column)
+    return _resolve({t: tuple(c) for t, c in columns.items()}, time.monotonic())
+
+
+def get_schema(cur=None) -> Schema:
+    """
+    Cached column mapping; introspects at most once per SCHEMA_CACHE_TTL per process.
+    Pass a cursor to reuse the caller's connection on a cache miss.
+    """
+    global _CACHE
+    cached = _CACHE
+    if cached is not None and time.monotonic() - cached.loaded_at < SCHEMA_CACHE_TTL:
+        return cached
+    with _LOCK:
+        cached = _CACHE
+        if cached is not None and time.monotonic() - cached.loaded_at < SCHEMA_CACHE_TTL:
+            return cached
+        if cur is not None:
+            _CACHE = _load(cur)
+        else:
+            with db_cursor() as (_conn, own):
+                _CACHE = _load(own)
+        return _CACHE
+
+
+def refresh() -> None:
+    """Drop the cached mapping; the next get_schema() re-introspects."""
+    global _CACHE
+    with _LOCK:
+        _CACHE = None
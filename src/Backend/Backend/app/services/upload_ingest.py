@@ -0,0 +1,204 @@
+# Backend/app/services/upload_ingest.py
+# Streaming import of large datasets into upload storage.
+# - the body is read straight from the WSGI input (request.stream): NDJSON, CSV with a header row,
+#   or a JSON array parsed one element at a time; nothing holds the whole body or row list
+# - rows are validated as they are parsed and written UPLOAD_CHUNK_ROWS at a time through
+#   upload_store.append_rows(), inside one transaction: a failed import leaves the upload untouched
+# - UPLOAD_MAX_BYTES caps the body; it is checked against Content-Length up front and against the
+#   bytes actually read (chunked requests have no Content-Length)
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+from ..database import db_cursor
+from . import upload_store
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(512 * 1024 * 1024)))
+READ_SIZE = 64 * 1024
+
+FORMATS = {
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json": "json",
+    "text/csv": "csv",
+}
+
+
+class PayloadTooLarge(Exception):
+    """The body is larger than UPLOAD_MAX_BYTES."""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+def detect_format(content_type: Optional[str], explicit: Optional[str] = None) -> Optional[str]:
+    """"ndjson" | "csv" | "json" from ?format= or the Content-Type, None when unsupported."""
+    if explicit:
+        fmt = explicit.strip().lower()
+        return fmt if fmt in FORMATS.values() else None
+    mime = (content_type or "").split(";")[0].strip().lower()
+    return FORMATS.get(mime)
+
+
+class _CappedStream(io.RawIOBase):
+    """Byte counter around the request stream; raises PayloadTooLarge past `limit`."""
+
+    def __init__(self, raw, limit: int):
+        self._raw = raw
+        self._limit = limit
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        data = self._raw.read(len(buf))
+        if not data:
+            return 0
+        self.bytes_read += len(data)
+        if self.bytes_read > self._limit:
+            raise PayloadTooLarge(self._limit)
+        buf[:len(data)] = data
+        return len(data)
+
+
+# ---------- row parsers ----------
+
+def _check_row(row: Any, n: int) -> Dict[str, Any]:
+    if not isinstance(row, dict):
+        raise ValueError(f"row {n} is not a JSON object")
+    return row
+
+
+def iter_ndjson(binary) -> Iterator[Dict[str, Any]]:
+    """One JSON object per line; blank lines are skipped."""
+    n = 0
+    for lineno, line in enumerate(binary, 1):
+        line = line.strip()
+        if not line:
+            continue
+        n += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {lineno}: invalid JSON ({e})")
+        yield _check_row(row, n)
+
+
+def iter_csv(text) -> Iterator[Dict[str, Any]]:
+    """Header row + data rows; every value stays a string, like the frontend's CSV parser."""
+    reader = csv.DictReader(text)
+    if not reader.fieldnames:
+        return
+    for row in reader:
+        if None in row:
+            raise ValueError(f"line {reader.line_num}: more values than header columns")
+        yield row
+
+
+# a decode error this close to the end of the buffer may just be an element cut by the read
+# ("-2." / "1E+", "\\u00", "tru", "-Infinit"); anything earlier is a malformed row
+_TAIL_CHARS = 10
+
+
+def _cut_off(buf: str, e: json.JSONDecodeError) -> bool:
+    if e.msg.startswith("Unterminated string"):
+        return True   # the string runs to the end of the buffer
+    return len(buf.rstrip()) - e.pos < _TAIL_CHARS
+
+
+def iter_json_array(text) -> Iterator[Dict[str, Any]]:
+    """
+    Elements of a top-level JSON array, decoded one at a time from a text stream.
+    Only the unparsed tail of the body (at most one element plus READ_SIZE) is buffered;
+    an element longer than that is read in doubling steps, so it costs linear time.
+    A malformed row is reported as soon as it is seen, not after reading the rest of the body.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def more() -> bool:
+        nonlocal buf, pos, eof
+        chunk = text.read(max(READ_SIZE, len(buf) - pos))
+        if not chunk:
+            eof = True
+            return False
+        buf, pos = buf[pos:] + chunk, 0
+        return True
+
+    def peek() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not more():
+                return ""
+
+    if peek() != "[":
+        raise ValueError("JSON body must be an array of rows")
+    pos += 1
+    if peek() == "]":
+        pos += 1
+    else:
+        n = 0
+        while True:
+            peek()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # a number ending exactly at the buffer edge may continue in the next read
+                    if end < len(buf) or eof or not more():
+                        break
+                except json.JSONDecodeError as e:
+                    if eof or not _cut_off(buf, e) or not more():
+                        raise ValueError(f"invalid JSON in row {n + 1} ({e.msg})")
+            pos = end
+            n += 1
+            yield _check_row(value, n)
+            c = peek()
+            if c == ",":
+                pos += 1
+            elif c == "]":
+                pos += 1
+                break
+            else:
+                raise ValueError(f"expected ',' or ']' after row {n}")
+    if peek():
+        raise ValueError("unexpected data after the JSON array")
+
+
+# ---------- import ----------
+
+def ingest(stream, fmt: str, uid: str, name: Any, source: Any, original: Any,
+           uploaded_at: datetime, content_length: Optional[int] = None,
+           max_bytes: int = UPLOAD_MAX_BYTES) -> Dict[str, Any]:
+    """
+    Replace the dataset of upload `uid` with the rows streamed from `stream`.
+    Returns {"id", "version", "rowCount", "bytes"}. Raises PayloadTooLarge and ValueError
+    (malformed body); either way nothing is committed.
+    """
+    if content_length is not None and content_length > max_bytes:
+        raise PayloadTooLarge(max_bytes)
+
+    capped = _CappedStream(stream, max_bytes)
+    binary = io.BufferedReader(capped, buffer_size=READ_SIZE)
+    if fmt == "ndjson":
+        rows = iter_ndjson(binary)
+    else:
+        text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="" if fmt == "csv" else None)
+        rows = iter_csv(text) if fmt == "csv" else iter_json_array(text)
+
+    with db_cursor(commit=True) as (_conn, cur):
+        version = upload_store.save_upload(cur, uid, name, source, original, uploaded_at, [])
+        row_count = upload_store.append_rows(cur, uid, rows)
+
+    print(f"[Uploads] imported {uid}: {row_count} rows from {capped.bytes_read} bytes ({fmt})")
+    return {"id": uid, "version": version, "rowCount": row_count, "bytes": capped.bytes_read}
@@ -0,0 +1,566 @@
+# Backend/app/services/upload_store.py
+# Storage engine for uploaded datasets (dbo.Uploads + dbo.UploadChunks).
+# - dbo.Uploads keeps the metadata; the rows live in dbo.UploadChunks as UPLOAD_CHUNK_ROWS-row
+#   chunks: compact JSON (column list once, rows as value arrays) compressed with zstd when the
+#   zstandard package is installed, gzip otherwise. Uploads.StorageFormat = 'chunks' marks them.
+# - chunks can be appended or replaced one at a time; readers decode only the chunks they touch
+# - uploads saved before this (rows in the UTF-16 [DataJson] column) are still read as-is and
+#   converted on their next save, or in bulk with `flask compact-uploads`
+# - Uploads.[Version] goes up on every save; apply_patch() applies row-level inserts / updates /
+#   deletes against an expected version, re-encoding only the chunks they touch
+# - list_meta(): id / name / source / uploadedAt / rowCount only, keyset-paged on (UploadedAt, UploadId);
+#   a covering index keeps the listing off the row data entirely
+# - read_rows(): one slice of a dataset
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+from datetime import datetime
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pyodbc
+
+from ..database import db_cursor, temporal_type
+
+UPLOAD_CHUNK_ROWS = int(os.getenv("UPLOAD_CHUNK_ROWS", "2000"))
+UPLOAD_CODEC = os.getenv("UPLOAD_CODEC", "auto").lower()     # auto | zstd | gzip
+
+STORAGE_CHUNKS = "chunks"
+
+_DDL = """
+IF OBJECT_ID('dbo.UploadChunks', 'U') IS NULL
+BEGIN
+    CREATE TABLE dbo.UploadChunks (
+        UploadId  UNIQUEIDENTIFIER NOT NULL,
+        ChunkNo   INT              NOT NULL,
+        FirstRow  INT              NOT NULL,
+        ChunkRows INT              NOT NULL,
+        Codec     VARCHAR(10)      NOT NULL,
+        Payload   VARBINARY(MAX)   NOT NULL,
+        CONSTRAINT PK_UploadChunks PRIMARY KEY (UploadId, ChunkNo)
+    );
+END
+IF COL_LENGTH('dbo.Uploads', 'StorageFormat') IS NULL
+    ALTER TABLE dbo.Uploads ADD [StorageFormat] VARCHAR(10) NULL;
+IF COL_LENGTH('dbo.Uploads', 'Version') IS NULL
+    ALTER TABLE dbo.Uploads ADD [Version] INT NOT NULL CONSTRAINT DF_Uploads_Version DEFAULT 1;
+IF EXISTS (SELECT 1 FROM sys.columns
+           WHERE object_id = OBJECT_ID('dbo.Uploads') AND name = 'DataJson'
+             AND is_nullable = 0 AND system_type_id = 231 AND max_length = -1)
+    ALTER TABLE dbo.Uploads ALTER COLUMN [DataJson] NVARCHAR(MAX) NULL;
+"""
+
+_INDEX_DDL = """
+IF NOT EXISTS (SELECT 1 FROM sys.indexes
+               WHERE object_id = OBJECT_ID('dbo.Uploads') AND name = 'IX_Uploads_Listing')
+    CREATE INDEX IX_Uploads_Listing
+        ON dbo.Uploads ([IsDeleted], [UploadedAt], [UploadId])
+        INCLUDE ([Name], [Source], [Original], [RowCount], [IsSaved]);
+"""
+
+_SCHEMA_READY = False
+_SCHEMA_LOCK = threading.Lock()
+
+
+class VersionConflict(Exception):
+    """The upload changed since the version the client edited."""
+
+    def __init__(self, current: int):
+        super().__init__(f"Upload was modified (current version {current})")
+        self.current = current
+
+
+def ensure_schema() -> None:
+    global _SCHEMA_READY
+    if _SCHEMA_READY:
+        return
+    with _SCHEMA_LOCK:
+        if not _SCHEMA_READY:
+            with db_cursor(commit=True) as (_conn, cur):
+                cur.execute(_DDL)
+                cur.execute(_INDEX_DDL)
+            _SCHEMA_READY = True
+
+
+# ---------- chunk codec ----------
+
+def _zstd():
+    try:
+        import zstandard  # optional: pip install zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _write_codec() -> str:
+    """zstd unless UPLOAD_CODEC=gzip or zstandard is missing; readers handle both per chunk."""
+    if UPLOAD_CODEC != "gzip" and _zstd() is not None:
+        return "zstd"
+    return "gzip"
+
+
+def _compress(raw: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=6).compress(raw)
+    return gzip.compress(raw, compresslevel=6)
+
+
+def _decompress(blob: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        z = _zstd()
+        if z is None:
+            raise RuntimeError("Upload chunk is zstd-compressed but zstandard is not installed")
+        return z.ZstdDecompressor().decompressobj().decompress(blob)
+    return gzip.decompress(blob)
+
+
+def encode_chunk(rows: Sequence[Any], codec: Optional[str] = None) -> Tuple[str, bytes]:
+    """
+    (codec, payload). Rows that are dicts with the chunk's column order are stored as
+    value arrays under one shared column list; anything else is kept verbatim as {"o": row}.
+    """
+    codec = codec or _write_codec()
+    cols: List[str] = list(rows[0].keys()) if rows and isinstance(rows[0], dict) else []
+    packed: List[Any] = []
+    for r in rows:
+        if isinstance(r, dict) and list(r.keys()) == cols:
+            packed.append(list(r.values()))
+        else:
+            packed.append({"o": r})
+    raw = json.dumps({"v": 1, "c": cols, "r": packed}, ensure_ascii=False, separators=(",", ":"))
+    return codec, _compress(raw.encode("utf-8"), codec)
+
+
+def decode_chunk(codec: str, payload: bytes) -> List[Any]:
+    doc = json.loads(_decompress(bytes(payload), codec).decode("utf-8"))
+    cols = doc.get("c") or []
+    return [dict(zip(cols, r)) if isinstance(r, list) else r.get("o") for r in doc.get("r") or []]
+
+
+# ---------- write side (caller owns the transaction) ----------
+
+def _insert_chunks(cur, uid: str, rows: Sequence[Any], first_chunk: int, first_row: int) -> int:
+    """Encode rows into chunks numbered from first_chunk. Returns the number of chunks written."""
+    params = []
+    for i in range(0, len(rows), UPLOAD_CHUNK_ROWS):
+        part = rows[i:i + UPLOAD_CHUNK_ROWS]
+        codec, payload = encode_chunk(part)
+        params.append((uid, first_chunk + len(params), first_row + i, len(part), codec, payload))
+    if params:
+        cur.executemany(
+            "INSERT INTO dbo.UploadChunks (UploadId, ChunkNo, FirstRow, ChunkRows, Codec, Payload) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            params,
+        )
+    return len(params)
+
+
+def _sync_row_count(cur, uid: str) -> int:
+    cur.execute("""
+        UPDATE dbo.Uploads
+           SET [RowCount] = (SELECT ISNULL(SUM(ChunkRows), 0) FROM dbo.UploadChunks WHERE UploadId = ?)
+        OUTPUT inserted.[RowCount]
+         WHERE [UploadId] = ?
+    """, (uid, uid))
+    row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+def save_upload(cur, uid: str, name: Any, source: Any, original: Any,
+                uploaded_at: datetime, data: Any) -> int:
+    """
+    Upsert metadata and replace the whole dataset of an upload. A list is stored as chunks;
+    anything else (the API never rejected non-list data) stays in [DataJson]. Returns the new version.
+    """
+    ensure_schema()
+    chunked = isinstance(data, list)
+    row_count = len(data) if chunked else 0
+    data_json = None if chunked else json.dumps(data, ensure_ascii=False)
+    storage = STORAGE_CHUNKS if chunked else None
+    cur.execute("""
+        IF EXISTS (SELECT 1 FROM dbo.Uploads WHERE [UploadId] = ?)
+            UPDATE dbo.Uploads
+               SET [Name] = ?, [Source] = ?, [Original] = ?, [UploadedAt] = ?, [RowCount] = ?,
+                   [IsSaved] = 1, [DataJson] = ?, [StorageFormat] = ?, [IsDeleted] = 0,
+                   [Version] = [Version] + 1
+             WHERE [UploadId] = ?;
+        ELSE
+            INSERT dbo.Uploads ([UploadId],[Name],[Source],[Original],[UploadedAt],[RowCount],
+                                [IsSaved],[DataJson],[StorageFormat])
+            VALUES (?,?,?,?,?,?,1,?,?);
+    """, (
+        uid,
+        name, source, original, uploaded_at, row_count, data_json, storage, uid,
+        uid, name, source, original, uploaded_at, row_count, data_json, storage,
+    ))
+    _rewrite_chunks(cur, uid, data if chunked else [])
+    cur.execute("SELECT [Version] FROM dbo.Uploads WHERE [UploadId] = ?", (uid,))
+    return int(cur.fetchone()[0])
+
+
+def _rewrite_chunks(cur, uid: str, rows: Sequence[Any]) -> None:
+    cur.execute("DELETE FROM dbo.UploadChunks WHERE UploadId = ?", (uid,))
+    _insert_chunks(cur, uid, rows, 0, 0)
+
+
+def _chunk_legacy(cur, uid: str, data_json: Optional[str]) -> int:
+    """Move one [DataJson] upload into chunks (content unchanged, version kept). Returns its row count."""
+    rows = json.loads(data_json) if data_json else []
+    if not isinstance(rows, list):
+        raise ValueError("Upload data is not a list of rows")
+    _rewrite_chunks(cur, uid, rows)
+    cur.execute("""
+        UPDATE dbo.Uploads
+           SET [DataJson] = NULL, [StorageFormat] = ?, [RowCount] = ?
+         WHERE [UploadId] = ?
+    """, (STORAGE_CHUNKS, len(rows), uid))
+    return len(rows)
+
+
+def append_rows(cur, uid: str, rows: Iterable[Any]) -> int:
+    """
+    Add rows after the last chunk (new chunks only; nothing existing is re-encoded).
+    `rows` may be any iterable: it is consumed UPLOAD_CHUNK_ROWS at a time, so a generator
+    never has more than one chunk in memory. Returns the new row count.
+    """
+    cur.execute(
+        "SELECT ISNULL(MAX(ChunkNo) + 1, 0), ISNULL(SUM(ChunkRows), 0) FROM dbo.UploadChunks WHERE UploadId = ?",
+        (uid,),
+    )
+    next_chunk, next_row = (int(v) for v in cur.fetchone())
+    batch: List[Any] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= UPLOAD_CHUNK_ROWS:
+            next_chunk += _insert_chunks(cur, uid, batch, next_chunk, next_row)
+            next_row += len(batch)
+            batch = []
+    _insert_chunks(cur, uid, batch, next_chunk, next_row)
+    return _sync_row_count(cur, uid)
+
+
+def load_chunk(cur, uid: str, chunk_no: int) -> Optional[List[Any]]:
+    cur.execute(
+        "SELECT Codec, Payload FROM dbo.UploadChunks WITH (UPDLOCK) WHERE UploadId = ? AND ChunkNo = ?",
+        (uid, chunk_no),
+    )
+    row = cur.fetchone()
+    return decode_chunk(row[0], row[1]) if row else None
+
+
+def replace_chunk(cur, uid: str, chunk_no: int, rows: Sequence[Any]) -> int:
+    """
+    Re-encode one chunk with new contents. FirstRow of the following chunks shifts when the
+    chunk grows or shrinks; an emptied chunk is removed. Rows beyond UPLOAD_CHUNK_ROWS spill
+    into new chunks numbered right after it, and the following chunks are renumbered past
+    them. Returns the new row count.
+    """
+    cur.execute(
+        "SELECT FirstRow, ChunkRows FROM dbo.UploadChunks WITH (UPDLOCK) WHERE UploadId = ? AND ChunkNo = ?",
+        (uid, chunk_no),
+    )
+    head = cur.fetchone()
+    if not head:
+        raise LookupError(f"Upload {uid} has no chunk {chunk_no}")
+    first_row = int(head[0])
+    delta = len(rows) - int(head[1])
+    spill = rows[UPLOAD_CHUNK_ROWS:]
+    rows = rows[:UPLOAD_CHUNK_ROWS]
+    extra = -(-len(spill) // UPLOAD_CHUNK_ROWS)
+    if rows:
+        codec, payload = encode_chunk(rows)
+        cur.execute(
+            "UPDATE dbo.UploadChunks SET ChunkRows = ?, Codec = ?, Payload = ? WHERE UploadId = ? AND ChunkNo = ?",
+            (len(rows), codec, payload, uid, chunk_no),
+        )
+    else:
+        cur.execute("DELETE FROM dbo.UploadChunks WHERE UploadId = ? AND ChunkNo = ?", (uid, chunk_no))
+    if delta or extra:
+        cur.execute(
+            "UPDATE dbo.UploadChunks SET ChunkNo = ChunkNo + ?, FirstRow = FirstRow + ? "
+            "WHERE UploadId = ? AND ChunkNo > ?",
+            (extra, delta, uid, chunk_no),
+        )
+    if spill:
+        _insert_chunks(cur, uid, spill, chunk_no + 1, first_row + len(rows))
+    return _sync_row_count(cur, uid)
+
+
+# ---------- row-level patch ----------
+
+def _index(value: Any, what: str, hi: int) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= hi:
+        raise ValueError(f"{what} must be an integer between 0 and {hi}")
+    return value
+
+
+def apply_patch(uid: str, version: int, updates: Sequence[Dict[str, Any]] = (),
+                deletes: Sequence[int] = (), inserts: Sequence[Dict[str, Any]] = ()) -> Optional[Dict[str, Any]]:
+    """
+    Apply row edits to an upload saved at `version`, all in one transaction.
+    Indexes refer to the rows as they were at that version:
+      updates: [{"index": i, "row": {...}}]    replace row i
+               [{"index": i, "set": {...}}]    merge keys into (dict) row i
+      deletes: [i, ...]
+      inserts: [{"row": {...}}]                append
+               [{"at": i, "row": {...}}]       insert before row i (i = rowCount appends)
+    Only chunks holding an edited row are decoded and re-encoded; appends add new chunks.
+    Returns {"id", "version", "rowCount"}, None if the upload does not exist.
+    Raises VersionConflict when `version` is stale and ValueError for malformed edits.
+    """
+    ensure_schema()
+    with db_cursor(commit=True) as (_conn, cur):
+        # bumping the version first also locks the upload until commit
+        cur.execute("""
+            UPDATE dbo.Uploads
+               SET [Version] = [Version] + 1
+            OUTPUT inserted.[Version], inserted.[StorageFormat], inserted.[DataJson]
+             WHERE [UploadId] = ? AND [IsDeleted] = 0 AND [Version] = ?
+        """, (uid, version))
+        row = cur.fetchone()
+        if not row:
+            cur.execute("SELECT [Version] FROM dbo.Uploads WHERE [UploadId] = ? AND [IsDeleted] = 0", (uid,))
+            current = cur.fetchone()
+            if not current:
+                return None
+            raise VersionConflict(int(current[0]))
+        new_version, storage, data_json = row
+        if not _is_chunked(storage):
+            _chunk_legacy(cur, uid, data_json)
+
+        cur.execute(
+            "SELECT ChunkNo, FirstRow, ChunkRows FROM dbo.UploadChunks WHERE UploadId = ? ORDER BY ChunkNo",
+            (uid,),
+        )
+        heads = [(int(n), int(first), int(count)) for n, first, count in cur.fetchall()]
+        starts = [first for _n, first, _c in heads]
+        total = sum(count for _n, _f, count in heads)
+
+        def locate(i: int) -> Tuple[int, int]:
+            n, first, _count = heads[bisect_right(starts, i) - 1]
+            return n, i - first
+
+        edits: Dict[int, Dict[str, Any]] = defaultdict(
+            lambda: {"updates": [], "deletes": set(), "inserts": defaultdict(list)})
+        appended: List[Any] = []
+
+        for u in updates:
+            if not isinstance(u, dict) or ("row" in u) == ("set" in u):
+                raise ValueError("each update needs an index and exactly one of row / set")
+            if "set" in u and not isinstance(u["set"], dict):
+                raise ValueError("update.set must be an object")
+            n, j = locate(_index(u.get("index"), "update.index", total - 1))
+            edits[n]["updates"].append((j, u))
+        for d in deletes:
+            n, j = locate(_index(d, "delete index", total - 1))
+            edits[n]["deletes"].add(j)
+        for ins in inserts:
+            if not isinstance(ins, dict) or "row" not in ins:
+                raise ValueError("each insert needs a row")
+            at = ins.get("at")
+            if at is None or _index(at, "insert.at", total) == total:
+                appended.append(ins["row"])
+            else:
+                n, j = locate(at)
+                edits[n]["inserts"][j].append(ins["row"])
+
+        # last chunk first: a chunk that spills renumbers only the chunks after it
+        for n, e in sorted(edits.items(), reverse=True):
+            rows = load_chunk(cur, uid, n) or []
+            for j, u in e["updates"]:
+                if "row" in u:
+                    rows[j] = u["row"]
+                elif isinstance(rows[j], dict):
+                    rows[j] = {**rows[j], **u["set"]}
+                else:
+                    raise ValueError("update.set needs an object row; send row instead")
+            out: List[Any] = []
+            for j, r in enumerate(rows):
+                out.extend(e["inserts"].get(j, ()))
+                if j not in e["deletes"]:
+                    out.append(r)
+            replace_chunk(cur, uid, n, out)
+
+        row_count = append_rows(cur, uid, appended) if appended else _sync_row_count(cur, uid)
+    print(f"[Uploads] patched {uid} -> v{new_version}: {len(updates)} updated, "
+          f"{len(deletes)} deleted, {len(inserts)} inserted")
+    return {"id": uid, "version": int(new_version), "rowCount": row_count}
+
+
+# ---------- read side ----------
+
+def _is_chunked(storage: Any) -> bool:
+    return str(storage or "").lower() == STORAGE_CHUNKS
+
+
+def iter_rows(cur, uid: str) -> Iterator[Any]:
+    """Every row of a chunked upload, decoding one chunk at a time."""
+    cur.execute("SELECT ChunkNo FROM dbo.UploadChunks WHERE UploadId = ? ORDER BY ChunkNo", (uid,))
+    for (chunk_no,) in cur.fetchall():
+        cur.execute("SELECT Codec, Payload FROM dbo.UploadChunks WHERE UploadId = ? AND ChunkNo = ?",
+                    (uid, chunk_no))
+        codec, payload = cur.fetchone()
+        yield from decode_chunk(codec, payload)
+
+
+def load_rows(cur, uid: str, storage: Any, data_json: Optional[str]) -> Any:
+    """The full dataset of one dbo.Uploads row, whichever format it is stored in."""
+    if _is_chunked(storage):
+        return list(iter_rows(cur, uid))
+    try:
+        return json.loads(data_json) if data_json else []
+    except Exception:
+        return data_json
+
+
+def _meta(row: Dict[str, Any]) -> Dict[str, Any]:
+    uploaded = row.get("UploadedAt")
+    return {
+        "id": str(row["UploadId"]),
+        "name": row.get("Name"),
+        "source": row.get("Source"),
+        "original": row.get("Original"),
+        "uploadedAt": uploaded.isoformat() if isinstance(uploaded, datetime) else uploaded,
+        "rowCount": int(row.get("RowCount") or 0),
+        "isSaved": bool(row.get("IsSaved")),
+    }
+
+
+def list_meta(limit: int, after: Optional[Tuple[str, str]] = None, descending: bool = True,
+              on_date: Optional[datetime] = None,
+              include_deleted: bool = False) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+    """
+    One page of upload metadata (no DataJson). `after` is the (uploadedAt, id) key of the
+    previous page's last item. Returns (items, next_key | None).
+    The key's time is SQL Server's own style-121 text and is converted back to [UploadedAt]'s
+    type, so a DATETIME column compares against exactly the stored value (a DATETIME2
+    parameter would repeat or skip rows that share the boundary time).
+    """
+    ensure_schema()
+    where: List[str] = []
+    params: List[Any] = []
+    if not include_deleted:
+        where.append("[IsDeleted] = 0")
+    if on_date is not None:
+        where.append("[UploadedAt] >= ? AND [UploadedAt] < DATEADD(day, 1, ?)")
+        params += [on_date, on_date]
+    cmp = "<" if descending else ">"
+    order = "DESC" if descending else "ASC"
+
+    with db_cursor() as (_conn, cur):
+        if after is not None:
+            uploaded_type = temporal_type("Uploads", "UploadedAt", cur)
+            where.append(
+                f"([UploadedAt] {cmp} CONVERT({uploaded_type}, ?, 121)"
+                f" OR ([UploadedAt] = CONVERT({uploaded_type}, ?, 121) AND [UploadId] {cmp} ?))"
+            )
+            after_at = after[0].replace("T", " ")   # keys issued before style 121 were isoformat()
+            params += [after_at, after_at, after[1]]
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+        cur.execute(f"""
+            SELECT TOP (?) [UploadId],[Name],[Source],[Original],[UploadedAt],[RowCount],[IsSaved],
+                   CONVERT(VARCHAR(27), [UploadedAt], 121) AS k_uploaded
+            FROM dbo.Uploads
+            {where_sql}
+            ORDER BY [UploadedAt] {order}, [UploadId] {order}
+        """, [limit + 1] + params)
+        cols = [c[0] for c in cur.description]
+        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    next_key = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_key = (last["k_uploaded"], str(last["UploadId"]))
+    return [_meta(r) for r in rows], next_key
+
+
+def _json_value(value: Optional[str], kind: int) -> Any:
+    """OPENJSON hands back strings unquoted; everything else is JSON text (type 0 = null)."""
+    if kind == 0 or value is None:
+        return None
+    if kind == 1:
+        return value
+    return json.loads(value)
+
+
+def read_rows(uid: str, offset: int, limit: int) -> Optional[Dict[str, Any]]:
+    """
+    {"id", "version", "offset", "limit", "total", "rows"} for rows [offset, offset + limit) of an
+    upload, or None if it does not exist. Chunked uploads decode only the overlapping
+    chunks; legacy [DataJson] uploads are sliced by OPENJSON inside SQL Server (or in
+    Python below compatibility level 130).
+    """
+    ensure_schema()
+    with db_cursor() as (_conn, cur):
+        cur.execute(
+            "SELECT [RowCount], [StorageFormat], [Version] FROM dbo.Uploads WHERE [UploadId] = ? AND [IsDeleted] = 0",
+            (uid,),
+        )
+        head = cur.fetchone()
+        if not head:
+            return None
+        if _is_chunked(head[1]):
+            rows = _read_chunked(cur, uid, offset, limit)
+            return {"id": uid, "version": int(head[2]), "offset": offset, "limit": limit,
+                    "total": int(head[0] or 0), "rows": rows}
+        try:
+            cur.execute("""
+                SELECT j.[value], j.[type]
+                FROM dbo.Uploads AS u
+                CROSS APPLY OPENJSON(u.[DataJson]) AS j
+                WHERE u.[UploadId] = ?
+                ORDER BY CAST(j.[key] AS INT)
+                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+            """, (uid, offset, limit))
+            rows = [_json_value(value, kind) for value, kind in cur.fetchall()]
+        except pyodbc.Error as ex:
+            print(f"[Uploads] OPENJSON slice unavailable ({ex}); slicing in Python")
+            cur.execute("SELECT [DataJson] FROM dbo.Uploads WHERE [UploadId] = ?", (uid,))
+            data = json.loads(cur.fetchone()[0] or "[]")
+            rows = data[offset:offset + limit] if isinstance(data, list) else []
+
+    return {"id": uid, "version": int(head[2]), "offset": offset, "limit": limit,
+            "total": int(head[0] or 0), "rows": rows}
+
+
+def _read_chunked(cur, uid: str, offset: int, limit: int) -> List[Any]:
+    cur.execute("""
+        SELECT FirstRow, Codec, Payload
+        FROM dbo.UploadChunks
+        WHERE UploadId = ? AND FirstRow < ? AND FirstRow + ChunkRows > ?
+        ORDER BY ChunkNo
+    """, (uid, offset + limit, offset))
+    out: List[Any] = []
+    for first_row, codec, payload in cur.fetchall():
+        rows = decode_chunk(codec, payload)
+        lo = max(0, offset - first_row)
+        hi = max(0, offset + limit - first_row)
+        out.extend(rows[lo:hi])
+    return out
+
+
+# ---------- migration ----------
+
+def compact_legacy(batch: int = 50) -> int:
+    """Move every list-valued [DataJson] upload into chunks, `batch` uploads per transaction. Returns uploads converted."""
+    ensure_schema()
+    converted = 0
+    while True:
+        with db_cursor(commit=True) as (_conn, cur):
+            cur.execute("""
+                SELECT TOP (?) [UploadId], [DataJson]
+                FROM dbo.Uploads WITH (UPDLOCK, READPAST)
+                WHERE [StorageFormat] IS NULL AND [DataJson] IS NOT NULL AND ISJSON([DataJson]) = 1
+                  AND LEFT(LTRIM([DataJson]), 1) = '['
+            """, (batch,))
+            todo = cur.fetchall()
+            for uid, data_json in todo:
+                _chunk_legacy(cur, str(uid), data_json)
+        converted += len(todo)
+        if len(todo) < batch:
+            return converted
@@ -0,0 +1,36 @@
+# Standalone delivery worker: drains dbo.DeliveryOutbox outside the web processes.
+#   python delivery_worker.py
+# Run with DELIVERY_IN_PROCESS=0 on the web tier if you want all sending to happen here;
+# in that setup this process is required, nothing else drains the outbox.
+import os, sys, signal, time
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from app.services import delivery_service
+
+
+def main():
+    pool = delivery_service.DeliveryWorkerPool(
+        workers=int(os.getenv("DELIVERY_WORKER_THREADS", str(max(1, delivery_service.DELIVERY_WORKERS)))),
+    )
+    delivery_service.ensure_schema()
+    pool.start()
+
+    stop = {"flag": False}
+
+    def _shutdown(signum, frame):
+        stop["flag"] = True
+        pool.wake()
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    while not stop["flag"] and pool.running:
+        time.sleep(1)
+
+    pool.stop()
+
+
+if __name__ == "__main__":
+    main()
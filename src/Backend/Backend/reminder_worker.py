@@ -0,0 +1,40 @@
+# Standalone reminder scheduler: queues appointment reminders into dbo.DeliveryOutbox.
+#   python reminder_worker.py            # tick every REMINDER_TICK_SECS until stopped
+#   python reminder_worker.py --once     # single tick (cron-friendly)
+# Continuous mode: queued reminders are sent by the delivery workers (this process starts its own
+# unless DELIVERY_IN_PROCESS=0). --once sends what it queued itself before exiting, for up to
+# REMINDER_DRAIN_SECS; anything left (e.g. retries scheduled later) needs a running delivery worker.
+import os, sys, signal, time
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from app.services import delivery_service, reminder_service
+
+
+def main():
+    if "--once" in sys.argv[1:]:
+        reminder_service.run_tick()
+        delivery_service.drain_until_empty(reminder_service.REMINDER_DRAIN_SECS)
+        return
+
+    delivery_service.start_workers()
+    scheduler = reminder_service.ReminderScheduler()
+    scheduler.start()
+
+    stop = {"flag": False}
+
+    def _shutdown(signum, frame):
+        stop["flag"] = True
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    while not stop["flag"] and scheduler.running:
+        time.sleep(1)
+
+    scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()